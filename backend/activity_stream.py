@@ -0,0 +1,104 @@
+"""
+Push-based delivery of AgentLogger entries to streaming clients.
+
+AgentLogger.log may be called from any thread (CrewAI callbacks run on worker
+threads), so the broadcaster only wakes subscribers with call_soon_threadsafe.
+Each subscriber then reads everything after its own sequence cursor from the
+ring buffer, which makes resume-from-cursor and batching the same code path.
+
+Sequence ids restart at 1 when the backend restarts, so a cursor is only
+meaningful together with the epoch of the process that issued it. Frames carry
+the broadcaster's epoch (random per process) and clients resume with both. A
+subscription whose epoch does not match starts from the oldest entry and is
+flagged reset; the client then drops what it has and takes the replay. Clients
+that send no epoch are reset when their seq is past the newest entry.
+"""
+import asyncio
+import os
+import threading
+import uuid
+from typing import Any, Dict, List
+
+from logger import AgentLogger, agent_logger
+
+# Default time to wait after a wake-up before sending, so bursts go out as one frame
+DEFAULT_COALESCE_MS = int(os.getenv("ACTIVITY_COALESCE_MS", "50"))
+
+
+class ActivitySubscription:
+    def __init__(self, broadcaster: "ActivityBroadcaster", after_seq: int, coalesce_ms: int, reset: bool = False):
+        self._broadcaster = broadcaster
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+        self.cursor = after_seq
+        self.coalesce_ms = max(0, coalesce_ms)
+        # The client's cursor came from an earlier process (see module docstring)
+        self.reset = reset
+
+    def wake(self):
+        self._loop.call_soon_threadsafe(self._event.set)
+
+    async def next_batch(self) -> List[Dict[str, Any]]:
+        """Wait until entries newer than the cursor exist and return them in one batch."""
+        logs = self._broadcaster.logger.get_logs(after_seq=self.cursor)
+        while not logs:
+            await self._event.wait()
+            self._event.clear()
+            if self.coalesce_ms:
+                await asyncio.sleep(self.coalesce_ms / 1000)
+            logs = self._broadcaster.logger.get_logs(after_seq=self.cursor)
+        self.cursor = logs[-1]["seq"]
+        return logs
+
+    def close(self):
+        self._broadcaster.unsubscribe(self)
+
+
+class ActivityBroadcaster:
+    """Fans out AgentLogger writes to any number of asyncio subscribers."""
+
+    def __init__(self, logger: AgentLogger):
+        self.logger = logger
+        # Identifies this process's sequence numbering (see module docstring)
+        self.epoch = uuid.uuid4().hex[:12]
+        self._subscribers: set = set()
+        self._lock = threading.Lock()
+        logger.add_listener(self._on_log)
+
+    def subscribe(self, after_seq: int = None, coalesce_ms: int = DEFAULT_COALESCE_MS,
+                  epoch: str = None) -> ActivitySubscription:
+        """Must be called from inside the event loop that will consume the subscription."""
+        if after_seq is None:
+            reset = False
+        elif epoch is not None:
+            reset = epoch != self.epoch
+        else:
+            reset = after_seq > self.logger.last_seq
+        if after_seq is None or reset:
+            after_seq = 0
+        subscription = ActivitySubscription(self, after_seq, coalesce_ms, reset)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: ActivitySubscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def _on_log(self, entry: Dict[str, Any]):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.wake()
+            except RuntimeError:
+                # Event loop already closed; drop the stale subscriber
+                self.unsubscribe(subscription)
+
+
+# Global instance
+activity_broadcaster = ActivityBroadcaster(agent_logger)
@@ -1,129 +1,226 @@
 from crewai import Agent, LLM
 import os
+import threading
 from dotenv import load_dotenv
-from safe_tools import SafeFileWriterTool, SafeFileReaderTool
+from providers import EnvWatcher, env_path, provider_fingerprint, select_provider
+from safe_tools import SafeDirectoryListTool, SafeFileWriterTool, SafeFileReaderTool, SafeMultiFileWriterTool
 from logger import agent_logger
+from llm_cache import cached_llm
+from token_stream import STREAM_ENABLED
 
 # Define workspace path (ensure it matches main.py)
 # Define workspace path (ensure it is absolute and relative to this file)
 base_dir = os.path.dirname(os.path.abspath(__file__))
 workspace_path = os.path.join(base_dir, "workspace")
 
-# Instantiate SAFE tools that enforce workspace-only access
-file_read_tool = SafeFileReaderTool(workspace_path=workspace_path)
-file_write_tool = SafeFileWriterTool(workspace_path=workspace_path)
+# SAFE tools that enforce workspace-only access, bound to the shared workspace; built on first use
+_shared_tools = None
 
-def create_agents():
-    # Helper to create LLM - Priority: ZhiPu AI GLM > Google Gemini > OpenAI
-    llm = None
-    
-    # Force reload environment variables from the same directory
-    env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
-    load_dotenv(env_path, override=True)
-    
-    zhipuai_key = os.getenv("ZHIPUAI_API_KEY")
-    google_key = os.getenv("GOOGLE_API_KEY")
-    
-    # Log the selected provider to the System log for debugging
-    if zhipuai_key and not str(zhipuai_key).startswith("#"):
-        agent_logger.log("System", "LLM Provider selected: ZhiPu AI (GLM)", "info")
-    elif google_key:
-        agent_logger.log("System", "LLM Provider selected: Google Gemini", "info")
-    else:
-        agent_logger.log("System", "LLM Provider not found, defaulting to OpenAI (may fail if key missing)", "warning")
-    
-    if zhipuai_key and not str(zhipuai_key).startswith("#"):
-        # Use ZhiPu AI GLM via OpenAI-compatible API
-        llm = LLM(
-            model="GLM-4.5-Flash",
-            api_key=zhipuai_key,
-            base_url="https://open.bigmodel.cn/api/paas/v4/"
-        )
-        
-    elif google_key:
-        # Use Google Gemini as fallback
-        llm = "gemini/gemini-2.0-flash"
-        
-    elif os.getenv("OPENAI_API_KEY"):
-        # CrewAI default (OpenAI)
-        pass
-    
-    # Common config (Explicitly disable memory to prevent OpenAI dependency)
-    agent_config = {"llm": llm, "memory": False} if llm else {}
-
-    return {
-        "architect": Agent(
-            role="Architect", 
-            goal="ユーザーの要望を技術的なタスク（DB設計、API実装、UI実装など）に分解し、ファイル構成を設計する。", 
-            backstory=(
-                "あなたは熟練したソフトウェアアーキテクトです。"
-                "ユーザーの曖昧な要望を明確な技術仕様とタスクに変換する責任があります。\n\n"
-                "【重要ルール】\n"
-                "- File Reader Tool でワークスペース内の既存ファイルを確認できます。\n"
-                "- 設計書はチャットに出力するだけで構いません（ファイル保存は不要）。\n"
-                "- 必要なファイル名と構成を明確にリストアップしてください。"
-            ),
-            tools=[file_read_tool, file_write_tool],
-            **agent_config
+# Role definitions. tools names map to the workspace-bound file tools in _build_agent.
+AGENT_SPECS = {
+    "architect": dict(
+        role="Architect", 
+        goal="ユーザーの要望を技術的なタスク（DB設計、API実装、UI実装など）に分解し、ファイル構成を設計する。", 
+        backstory=(
+            "あなたは熟練したソフトウェアアーキテクトです。"
+            "ユーザーの曖昧な要望を明確な技術仕様とタスクに変換する責任があります。\n\n"
+            "【重要ルール】\n"
+            "- Workspace List Tool でファイル一覧を、File Reader Tool (mode: 'outline') で既存ファイルの構成を確認できます。\n"
+            "- 設計書はチャットに出力するだけで構いません（ファイル保存は不要）。\n"
+            "- 必要なファイル名と構成を明確にリストアップしてください。"
         ),
-        "coder": Agent(
-            role="Coder", 
-            goal="与えられた設計に基づいて実行可能なコードを書き、必ずFile Writer Toolでワークスペースにファイルとして保存する。", 
-            backstory=(
-                "あなたは様々なプログラミング言語に精通したポリグロットプログラマーです。\n\n"
-                "【最重要ルール - 必ず守ること】\n"
-                "コードをチャットに貼り付けるだけでは絶対にダメです。\n"
-                "必ず File Writer Tool を使って、すべてのコードをファイルに保存してください。\n"
-                "ファイルに保存しなかったコードは無意味です。\n\n"
-                "【File Writer Tool の使い方】\n"
-                "- filename: ファイル名（例: 'example.py'）\n"
-                "- content: ファイルの全内容\n"
-                "- overwrite: 'true'（上書き許可）\n"
-                "- directory: サブディレクトリ（省略可、ワークスペース直下に保存）\n\n"
-                "【作業手順】\n"
-                "1. 設計書を読む\n"
-                "2. コードを考える\n"
-                "3. File Writer Tool でファイルに保存する（この手順を飛ばさないこと！）\n"
-                "4. 保存したファイル名を最終出力に記載する"
-            ),
-            tools=[file_read_tool, file_write_tool],
-            **agent_config
+        tools=("read", "write", "list"),
+    ),
+    "coder": dict(
+        role="Coder", 
+        goal="与えられた設計に基づいて実行可能なコードを書き、必ずFile Writer Toolでワークスペースにファイルとして保存する。", 
+        backstory=(
+            "あなたは様々なプログラミング言語に精通したポリグロットプログラマーです。\n\n"
+            "【最重要ルール - 必ず守ること】\n"
+            "コードをチャットに貼り付けるだけでは絶対にダメです。\n"
+            "必ず File Writer Tool を使って、すべてのコードをファイルに保存してください。\n"
+            "ファイルに保存しなかったコードは無意味です。\n\n"
+            "【File Writer Tool の使い方】\n"
+            "- filename: ファイル名（例: 'example.py'）\n"
+            "- content: ファイルの全内容\n"
+            "- overwrite: 'true'（上書き許可）\n"
+            "- directory: サブディレクトリ（省略可、ワークスペース直下に保存）\n\n"
+            "【複数ファイルを保存する場合】\n"
+            "- Multi File Writer Tool で files: [{path, content}, ...] を一度に保存できます。\n"
+            "- 内容が変わっていないファイルは書き換えられません。\n\n"
+            "【作業手順】\n"
+            "1. 設計書を読む\n"
+            "2. コードを考える\n"
+            "3. File Writer Tool でファイルに保存する（この手順を飛ばさないこと！）\n"
+            "4. 保存したファイル名を最終出力に記載する"
         ),
-        "critic": Agent(
-            role="Critic",
-            goal="コードの品質、セキュリティ、ベストプラクティスをレビューする",
-            backstory=(
-                "あなたは厳格なコードレビュアーです。\n"
-                "セキュリティの脆弱性や非効率なコードを見逃さず、常に改善案を提示します。\n"
-                "レビュー結果はチャットに出力してください。"
-            ),
-            **agent_config
+        tools=("read", "write", "write_many", "list"),
+    ),
+    "critic": dict(
+        role="Critic",
+        goal="コードの品質、セキュリティ、ベストプラクティスをレビューする",
+        backstory=(
+            "あなたは厳格なコードレビュアーです。\n"
+            "セキュリティの脆弱性や非効率なコードを見逃さず、常に改善案を提示します。\n"
+            "レビュー結果はチャットに出力してください。"
         ),
-        "tester": Agent(
-            role="Tester",
-            goal="コードをレビューし、品質を検証する。問題があれば改善案を提示する。",
-            backstory=(
-                "あなたは品質保証のスペシャリストです。\n"
-                "コードの論理的な誤り、エッジケース、セキュリティの問題を精査します。\n\n"
-                "【ルール】\n"
-                "- File Reader Tool でワークスペース内のコードを読んでレビューしてください。\n"
-                "- レビュー結果と改善提案をテキストで出力してください。"
-            ),
-            tools=[file_read_tool],
-            **agent_config
+    ),
+    "tester": dict(
+        role="Tester",
+        goal="コードをレビューし、品質を検証する。問題があれば改善案を提示する。",
+        backstory=(
+            "あなたは品質保証のスペシャリストです。\n"
+            "コードの論理的な誤り、エッジケース、セキュリティの問題を精査します。\n\n"
+            "【ルール】\n"
+            "- Workspace List Tool でファイル一覧を確認し、File Reader Tool でコードを読んでレビューしてください。\n"
+            "- 大きなファイルは start_line/end_line や mode: 'outline' で必要な部分だけ読んでください。\n"
+            "- レビュー結果と改善提案をテキストで出力してください。"
         ),
-        "librarian": Agent(
-            role="Librarian",
-            goal="プロジェクトのドキュメントを整備し、常に最新の状態に保つ。",
-            backstory=(
-                "あなたは几帳面なドキュメント管理者です。\n"
-                "READMEやAPIドキュメントが、実際のコードと乖離しないように監視・更新します。\n\n"
-                "【重要ルール】\n"
-                "- 必ず File Writer Tool を使ってドキュメントファイルを保存してください。\n"
-                "- ファイル名の例: 'README.md'\n"
-                "- overwrite: 'true' で上書き保存してください。"
-            ),
-            tools=[file_read_tool, file_write_tool],
-            **agent_config
-        )
+        tools=("read", "list"),
+    ),
+    "librarian": dict(
+        role="Librarian",
+        goal="プロジェクトのドキュメントを整備し、常に最新の状態に保つ。",
+        backstory=(
+            "あなたは几帳面なドキュメント管理者です。\n"
+            "READMEやAPIドキュメントが、実際のコードと乖離しないように監視・更新します。\n\n"
+            "【重要ルール】\n"
+            "- 必ず File Writer Tool を使ってドキュメントファイルを保存してください。\n"
+            "- ファイル名の例: 'README.md'\n"
+            "- overwrite: 'true' で上書き保存してください。"
+        ),
+        tools=("read", "write", "list"),
+    )
+}
+
+
+def _log_provider(provider: dict, logger):
+    # Log the selected provider to the System log for debugging
+    if provider["model"] is None:
+        logger.log("System", "LLM Provider not found, defaulting to OpenAI (may fail if key missing)", "warning")
+    else:
+        logger.log("System", f"LLM Provider selected: {provider['label']}", "info")
+
+
+def _make_tools(workspace: str) -> dict:
+    return {
+        "read": SafeFileReaderTool(workspace_path=workspace),
+        "write": SafeFileWriterTool(workspace_path=workspace),
+        "write_many": SafeMultiFileWriterTool(workspace_path=workspace),
+        "list": SafeDirectoryListTool(workspace_path=workspace),
     }
+
+
+def _workspace_tools(workspace: str = None):
+    global _shared_tools
+    # Jobs run in their own workspace, so their tools must be bound to it
+    if workspace is None or os.path.abspath(workspace) == os.path.abspath(workspace_path):
+        if _shared_tools is None:
+            _shared_tools = _make_tools(workspace_path)
+        return _shared_tools
+    return _make_tools(workspace)
+
+
+def _build_agent(name: str, llm, tools: dict):
+    spec = dict(AGENT_SPECS[name])
+    tool_names = spec.pop("tools", None)
+    if tool_names:
+        spec["tools"] = [tools[t] for t in tool_names]
+    # Common config (Explicitly disable memory to prevent OpenAI dependency)
+    agent_config = {"llm": llm, "memory": False} if llm else {}
+    agent = Agent(**spec, **agent_config)
+    # Also covers the default LLM CrewAI builds when none is passed
+    cached_llm(agent.llm)
+    return agent
+
+
+def create_agents(workspace: str = None, logger=agent_logger):
+    """
+    Build the whole agent team from scratch.
+    workspace: directory the file tools are confined to (defaults to backend/workspace).
+    Request handling should go through agent_registry, which caches the LLM client.
+    """
+    # Force reload environment variables from the same directory
+    load_dotenv(env_path, override=True)
+
+    provider = select_provider()
+    _log_provider(provider, logger)
+
+    llm = None
+    if provider.get("base_url"):
+        llm = LLM(model=provider["model"], api_key=provider["api_key"], base_url=provider["base_url"])
+    elif provider["model"]:
+        llm = provider["model"]
+
+    tools = _workspace_tools(workspace)
+    return {name: _build_agent(name, llm, tools) for name in AGENT_SPECS}
+
+
+class AgentRegistry:
+    """
+    Agents backed by a cached LLM client.
+
+    The LLM object (and with it the provider SDK's pooled HTTP client) is built once
+    per provider fingerprint. .env is only re-read when its mtime/size change, and the
+    cache is only dropped when the re-read content actually changes the provider.
+    Agents are cheap next to the client and hold per-run state (tools bound to the
+    job's workspace, which is deleted afterwards), so each get_agent() builds a new one.
+    """
+
+    def __init__(self, env_file: str = env_path):
+        self._env = EnvWatcher(env_file)
+        self._provider = None
+        self._fingerprint = None
+        self._llm = None
+        self._lock = threading.RLock()
+
+    def refresh_env(self) -> bool:
+        """Reload .env if it changed on disk. Returns True when the provider changed."""
+        with self._lock:
+            self._env.refresh()
+            provider = select_provider()
+            fingerprint = provider_fingerprint(provider)
+            if fingerprint == self._fingerprint:
+                return False
+            self._provider = provider
+            self._fingerprint = fingerprint
+            self._llm = None
+            return True
+
+    @property
+    def provider(self) -> dict:
+        self.refresh_env()
+        return self._provider
+
+    def get_llm(self, logger=agent_logger):
+        with self._lock:
+            self.refresh_env()
+            if self._llm is None and self._provider["model"] is not None:
+                _log_provider(self._provider, logger)
+                self._llm = LLM(
+                    model=self._provider["model"],
+                    api_key=self._provider["api_key"],
+                    # Tokens are forwarded to the activity log as they arrive (token_stream.py)
+                    stream=STREAM_ENABLED,
+                    **({"base_url": self._provider["base_url"]} if self._provider.get("base_url") else {}),
+                )
+            return self._llm
+
+    def get_agent(self, name: str, workspace: str = None, logger=agent_logger):
+        """
+        A new agent for name with its file tools bound to workspace, sharing the
+        cached LLM client. Each call returns its own instance, so one role can work
+        on several tasks at once.
+        """
+        llm = self.get_llm(logger)
+        return _build_agent(name, llm, _workspace_tools(workspace))
+
+    def clear(self):
+        with self._lock:
+            self._env.reset()
+            self._fingerprint = None
+            self._llm = None
+
+
+# Global instance
+agent_registry = AgentRegistry()
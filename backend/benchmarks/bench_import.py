@@ -0,0 +1,85 @@
+"""
+Import-time benchmark for the API module.
+
+Runs `python -X importtime -c "import main"` in a fresh interpreter and reads
+the per-module timings it prints to stderr. Prints the slowest top-level imports,
+and exits non-zero when:
+- the cumulative import time of main is over the budget, or
+- a module that must load lazily (crewai, agents, crew_runner by default) is
+  imported by main
+
+The first run after a code change compiles .pyc files. Take the best of several
+runs so that compilation and a cold disk cache do not count.
+
+Usage (from backend/):
+    python benchmarks/bench_import.py --budget-ms 800 --repeat 5
+"""
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+# Modules that only the /api/chat path may load
+DEFAULT_LAZY = ["crewai", "agents", "crew_runner"]
+
+
+def import_times(module: str) -> dict:
+    """{module name: (self_us, cumulative_us, depth)} for one import of module in a fresh interpreter."""
+    env = dict(os.environ, PYTHONPATH=str(BACKEND) + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        sys.exit(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    times = {}
+    for line in proc.stderr.splitlines():
+        # import time:   self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        times[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "1000")))
+    parser.add_argument("--lazy", nargs="*", default=DEFAULT_LAZY, help="modules that must not be imported")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="slowest top-level imports to show")
+    args = parser.parse_args()
+
+    best = None
+    for _ in range(args.repeat):
+        times = import_times(args.module)
+        if best is None or times[args.module][1] < best[args.module][1]:
+            best = times
+
+    total_ms = best[args.module][1] / 1000
+    # Direct children of the measured module and the other top-level imports
+    top = sorted(((name, t) for name, t in best.items() if t[2] <= 1 and name != args.module),
+                 key=lambda item: item[1][1], reverse=True)[:args.top]
+    print(f"{'module':<40} {'cumulative':>11} {'self':>9}")
+    for name, (self_us, cumulative_us, _) in top:
+        print(f"{name:<40} {cumulative_us / 1000:>9.1f}ms {self_us / 1000:>7.1f}ms")
+    print(f"{args.module:<40} {total_ms:>9.1f}ms  (budget {args.budget_ms:.0f}ms)")
+
+    failures = []
+    if total_ms > args.budget_ms:
+        failures.append(f"import {args.module} took {total_ms:.1f}ms, over the {args.budget_ms:.0f}ms budget")
+    loaded = sorted(name for name in args.lazy if name in best)
+    if loaded:
+        failures.append(f"import {args.module} loaded {', '.join(loaded)}, which must stay lazy")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
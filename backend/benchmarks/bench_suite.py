@@ -0,0 +1,274 @@
+"""
+Benchmark suite for the backend hot paths, on synthetic fixtures.
+
+Cases (fixture sizes at --scale 1):
+- logger.*     AgentLogger.log and get_logs on 100,000 entries: full read,
+               tail after a seq cursor, and the timestamp cursor of older clients
+- extract.*    iter_code_blocks and extract_and_save_code_blocks on a ~3.4MB
+               Coder output with 500 fenced blocks, into a fresh workspace and
+               again with every file unchanged
+- tools.*      the path handling behind SafeFileWriterTool and SafeFileReaderTool
+               (resolve_in_workspace, write_file, the shared workspace reader) on
+               10,000 paths, a tenth of them trying to escape the workspace
+- files.*      the workspace index behind /api/files over 10,000 files: initial
+               scan, cached listing, and listing after one file changed
+- run.*        /api/run overhead: CodeExecutor.run of a trivial snippet in a
+               warm worker process
+
+Each case reports the best of --repeat runs. --json writes the results as JSON
+for CI or later comparison. With --baseline (a file written earlier by --json),
+the suite exits non-zero when a case is slower than its baseline by more than
+--max-regression (a fraction, default 0.25), plus --noise-ms for very short
+cases. Baselines are only comparable at the same --scale.
+
+Usage (from backend/):
+    python benchmarks/bench_suite.py --json bench.json
+    python benchmarks/bench_suite.py --baseline bench.json --max-regression 0.2
+    python benchmarks/bench_suite.py --scale 0.1 --only logger extract
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_code_extractor import best_of, make_llm_output  # noqa: E402
+from code_extractor import extract_and_save_code_blocks, iter_code_blocks  # noqa: E402
+from executor import CodeExecutor  # noqa: E402
+from file_writer import resolve_in_workspace, write_file  # noqa: E402
+from logger import AgentLogger  # noqa: E402
+from workspace_index import WorkspaceIndex  # noqa: E402
+from workspace_reader import WorkspaceReader  # noqa: E402
+
+CASES = {}
+
+
+def case(group):
+    """Register a fixture builder. It returns [(name, ops, func)] to time, all sharing the fixture."""
+    def register(builder):
+        CASES[group] = builder
+        return builder
+    return register
+
+
+@case("logger")
+def logger_cases(scale: float, tmp: Path):
+    entries = max(1, int(100_000 * scale))
+    logger = AgentLogger(capacity=entries)
+    roles = ["Architect", "Coder", "Tester", "System"]
+
+    def fill(target: AgentLogger):
+        for i in range(entries):
+            target.log(roles[i % 4], f"step {i}: writing module_{i % 50}.py", "thought" if i % 3 == 0 else "info",
+                       job_id=f"job-{i // 1000}")
+
+    fill(logger)
+    middle = logger.get_logs()[entries // 2]["timestamp"]
+    tail = max(0, logger.last_seq - 100)
+    return [
+        ("logger.log", entries, lambda: fill(AgentLogger(capacity=entries))),
+        ("logger.get_logs_all", entries, logger.get_logs),
+        ("logger.get_logs_after_seq", 100, lambda: logger.get_logs(after_seq=tail)),
+        ("logger.get_logs_after_timestamp", entries - entries // 2, lambda: logger.get_logs(after_timestamp=middle)),
+    ]
+
+
+@case("extract")
+def extract_cases(scale: float, tmp: Path):
+    blocks = max(1, int(500 * scale))
+    text = make_llm_output(blocks, filler=40)
+    logger = AgentLogger(capacity=10_000)
+    runs = iter(range(1_000_000))
+
+    def save_fresh():
+        extract_and_save_code_blocks(text, tmp / f"extract-{next(runs)}", logger)
+
+    unchanged = tmp / "extract-unchanged"
+    extract_and_save_code_blocks(text, unchanged, logger)
+    return [
+        ("extract.iter_code_blocks", blocks, lambda: list(iter_code_blocks(text))),
+        ("extract.save_fresh", blocks, save_fresh),
+        ("extract.save_unchanged", blocks, lambda: extract_and_save_code_blocks(text, unchanged, logger)),
+    ]
+
+
+def make_workspace(root: Path, files: int, per_dir: int = 100) -> list:
+    """A tree of small Python files, per_dir to a directory. Returns the relative paths."""
+    paths = []
+    for i in range(files):
+        rel = f"pkg_{i // per_dir}/module_{i % per_dir}.py"
+        path = root / rel
+        if i % per_dir == 0:
+            path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f"def handler_{i}():\n    return {i}\n" * 5, encoding="utf-8")
+        paths.append(rel)
+    return paths
+
+
+@case("tools")
+def tool_cases(scale: float, tmp: Path):
+    files = max(10, int(10_000 * scale))
+    workspace = tmp / "tools"
+    paths = make_workspace(workspace, files)
+    # What agents send: relative, absolute-looking, Windows-style, and traversal attempts
+    requested = []
+    for i, rel in enumerate(paths):
+        if i % 10 == 0:
+            requested.append(f"../../etc/passwd_{i}" if i % 20 else f"{rel}/../../../outside_{i}.py")
+        elif i % 10 == 1:
+            requested.append("/" + rel)
+        elif i % 10 == 2:
+            requested.append("C:\\" + rel.replace("/", "\\"))
+        else:
+            requested.append(rel)
+    sample = paths[: max(1, files // 10)]
+    contents = {rel: (workspace / rel).read_text(encoding="utf-8") for rel in sample}
+    reader = WorkspaceReader(workspace)
+
+    def resolve_all():
+        for name in requested:
+            resolve_in_workspace(workspace, name)
+
+    def write_unchanged():
+        for rel in sample:
+            write_file(workspace, rel, contents[rel], overwrite=True)
+
+    def write_blocked():
+        for i in range(len(sample)):
+            write_file(workspace, f"../outside_{i}.py", "x", overwrite=True)
+
+    def read_all():
+        for rel in sample:
+            reader.read(reader.relative(resolve_in_workspace(workspace, rel)))
+
+    return [
+        ("tools.resolve", len(requested), resolve_all),
+        ("tools.write_unchanged", len(sample), write_unchanged),
+        ("tools.write_blocked", len(sample), write_blocked),
+        ("tools.read", len(sample), read_all),
+    ]
+
+
+@case("files")
+def file_cases(scale: float, tmp: Path):
+    files = max(10, int(10_000 * scale))
+    workspace = tmp / "files"
+    paths = make_workspace(workspace, files)
+    index = WorkspaceIndex(workspace)
+    index.rescan()
+    touched = workspace / paths[len(paths) // 2]
+    edits = iter(range(1_000_000))
+
+    def listing_after_change():
+        touched.write_text(f"VALUE = {next(edits)}\n", encoding="utf-8")
+        index.refresh_path(touched)
+        index.listing_json()
+
+    def full_scan():
+        WorkspaceIndex(workspace).listing_json()
+
+    return [
+        ("files.scan", files, full_scan),
+        ("files.rescan_unchanged", files, index.rescan),
+        ("files.listing_cached", 1, index.listing_json),
+        ("files.listing_after_change", 1, listing_after_change),
+    ]
+
+
+@case("run")
+def run_cases(scale: float, tmp: Path):
+    workspace = tmp / "run"
+    workspace.mkdir()
+    executor = CodeExecutor(workspace, size=1)
+    executor.start()
+    runs = max(1, int(50 * scale))
+    # The first run waits for the worker to finish starting
+    result = executor.run("print('ready')")
+    if result["status"] != "success":
+        raise RuntimeError(f"executor failed: {result['output']}")
+
+    def run_many():
+        for _ in range(runs):
+            executor.run("print(sum(range(100)))")
+
+    return [("run.trivial", runs, run_many)], executor.shutdown
+
+
+def run_suite(groups, scale: float, repeat: int) -> dict:
+    results = {}
+    for group in groups:
+        tmp = Path(tempfile.mkdtemp(prefix=f"bench-{group}-"))
+        cleanup = None
+        try:
+            cases = CASES[group](scale, tmp)
+            if isinstance(cases, tuple):
+                cases, cleanup = cases
+            for name, ops, func in cases:
+                seconds = best_of(func, repeat)
+                results[name] = {"seconds": seconds, "ops": ops, "us_per_op": seconds / ops * 1e6}
+                print(f"{name:<34} {seconds * 1000:>10.2f}ms {ops:>8} ops {seconds / ops * 1e6:>10.2f}us/op")
+        finally:
+            if cleanup is not None:
+                cleanup()
+            shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+
+def regressions(report: dict, baseline: dict, max_regression: float, noise_ms: float) -> list:
+    """Messages for the cases slower than baseline * (1 + max_regression) + noise."""
+    if baseline.get("scale") != report["scale"]:
+        return [f"baseline was recorded at scale {baseline.get('scale')}, not {report['scale']}"]
+    failures = []
+    for name, result in report["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            continue
+        limit = before["seconds"] * (1 + max_regression) + noise_ms / 1000
+        if result["seconds"] > limit:
+            failures.append(
+                f"{name}: {result['seconds'] * 1000:.2f}ms vs {before['seconds'] * 1000:.2f}ms baseline "
+                f"(+{(result['seconds'] / before['seconds'] - 1) * 100:.0f}%)"
+            )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--scale", type=float, default=1.0, help="fixture size relative to the defaults")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", type=Path, help="write the results to this file")
+    parser.add_argument("--baseline", type=Path, help="results of an earlier --json run to compare against")
+    parser.add_argument("--max-regression", type=float, default=float(os.getenv("BENCH_MAX_REGRESSION", "0.25")))
+    parser.add_argument("--noise-ms", type=float, default=1.0, help="absolute slack for very short cases")
+    args = parser.parse_args()
+
+    report = {
+        "scale": args.scale,
+        "repeat": args.repeat,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": run_suite(args.only, args.scale, args.repeat),
+    }
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+
+    if args.baseline:
+        failures = regressions(report, json.loads(args.baseline.read_text(encoding="utf-8")),
+                               args.max_regression, args.noise_ms)
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        if failures:
+            sys.exit(1)
+        print(f"No case more than {args.max_regression * 100:.0f}% slower than {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
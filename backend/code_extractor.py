@@ -0,0 +1,232 @@
+"""
+Extract fenced code blocks from agent text output and save them as workspace files.
+
+This is a fallback for when agents output code as text instead of using the
+File Writer Tool. The text is tokenized in a single left-to-right pass: headings
+and "save as" hints are remembered as they are passed, so naming a block never
+re-scans the text before it.
+"""
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+from logger import AgentLogger, agent_logger
+from file_writer import CHANGED_STATES, UNCHANGED, write_files
+
+# Map of language to file extension
+EXT_MAP = {
+    'python': '.py',
+    'py': '.py',
+    'javascript': '.js',
+    'js': '.js',
+    'typescript': '.ts',
+    'ts': '.ts',
+    'html': '.html',
+    'css': '.css',
+    'json': '.json',
+    'yaml': '.yaml',
+    'yml': '.yml',
+    'markdown': '.md',
+    'md': '.md',
+    'txt': '.txt',
+    'sh': '.sh',
+    'bash': '.sh',
+    'sql': '.sql',
+}
+
+# How far before a block a "save as X" hint may appear
+SAVE_HINT_WINDOW = 200
+
+# One scanner for everything that matters, tried in this order at each position:
+# a fenced block, a markdown heading naming a file, or a "file/save/create X" hint.
+# Headings and hints inside a fenced block are consumed with the block.
+_TOKEN_RE = re.compile(
+    r'(?P<fence>```(?P<lang>\w+)?\n(?P<body>.*?)```)'
+    r'|(?P<heading>#+\s+(?:\d+\.?\d*\s+)?(?P<heading_name>\w[\w\-]*\.\w+))'
+    r'|(?P<hint>(?:file|save|create|ファイル)[\s:]*[`"]?(?P<hint_name>\w[\w\-]*\.\w+))',
+    re.DOTALL | re.IGNORECASE,
+)
+# e.g. "# filename: calculator.py" or "# calculator.py" in the first lines of a block
+_COMMENT_NAME_RE = re.compile(r'#\s*(?:filename:\s*)?(\w[\w\-]*\.\w+)', re.IGNORECASE)
+_CLASS_RE = re.compile(r'class\s+(\w+)')
+_DEF_RE = re.compile(r'def\s+(\w+)')
+_CAMEL_RE = re.compile(r'(?<!^)(?=[A-Z])')
+_OPEN_FENCE_RE = re.compile(r'```\w*\n')
+_PREFIX_RE = re.compile(r'^(\./|/|workspace/|/workspace/)', re.IGNORECASE)
+
+
+class CodeBlock(NamedTuple):
+    lang: str
+    content: str
+    filename: str
+
+
+def _name_from_content(content: str) -> Optional[str]:
+    # Method 1: Look for filename in comments at the top
+    for line in content.split('\n', 5)[:5]:
+        fname_match = _COMMENT_NAME_RE.search(line)
+        if fname_match:
+            return fname_match.group(1)
+    return None
+
+
+def _fallback_name(content: str, ext: str, index: int) -> str:
+    # Try to detect from class/function names
+    if ext == '.py':
+        class_match = _CLASS_RE.search(content)
+        if class_match:
+            # CamelCase to snake_case
+            return f"{_CAMEL_RE.sub('_', class_match.group(1)).lower()}{ext}"
+        func_match = _DEF_RE.search(content)
+        if func_match and func_match.group(1) == 'main':
+            return f"main{ext}"
+    return f"code_{index}{ext}"
+
+
+def clean_filename(filename: str) -> str:
+    """Strip absolute paths, current dir prefix and "workspace/" prefix; never allow traversal."""
+    filename = filename.replace('\\', '/')
+    filename = _PREFIX_RE.sub('', filename)
+    # Ensure it's just a relative path now
+    filename = os.path.normpath(filename).replace('\\', '/')
+    if filename.startswith('../') or filename.startswith('/'):
+        filename = os.path.basename(filename)  # Safety: no traversal
+    return filename
+
+
+class IncrementalCodeExtractor:
+    """
+    Tokenizer state machine that can be fed text in pieces (e.g. step outputs or
+    streamed tokens). A block is emitted as soon as its closing fence arrives.
+    Only complete lines are tokenized, and text from an unclosed fence onwards is
+    held back until more input arrives.
+    """
+
+    # Upper bound for text held back while waiting for a closing fence
+    MAX_PENDING_CHARS = 2 * 1024 * 1024
+
+    def __init__(self):
+        self._buffer = ""
+        self._offset = 0  # absolute position of _buffer[0] in the whole stream
+        self._last_heading = None
+        self._hints: List[tuple] = []  # (absolute position, name) of recent "save as" hints
+        self._block_index = 0
+
+    def feed(self, text: str) -> List[CodeBlock]:
+        """Add text and return the blocks completed by it."""
+        self._buffer += text
+        return self._scan(self._buffer.rfind('\n') + 1)
+
+    def close(self) -> List[CodeBlock]:
+        """Flush: tokenize whatever is left, including an unterminated last line."""
+        return self._scan(len(self._buffer))
+
+    def _scan(self, limit: int) -> List[CodeBlock]:
+        blocks = []
+        buf = self._buffer
+        pos = 0
+        next_open = -1  # start of the next opening fence at/after pos (limit if none)
+        while True:
+            match = _TOKEN_RE.search(buf, pos, limit)
+            if next_open < pos:
+                opening = _OPEN_FENCE_RE.search(buf, pos, limit)
+                next_open = opening.start() if opening else limit
+            if next_open < limit and (match is None or next_open < match.start()):
+                # A fence that is not closed yet: wait for the rest of the block
+                pos = next_open
+                break
+            if match is None:
+                pos = limit
+                break
+            block = self._handle(match)
+            if block is not None:
+                blocks.append(block)
+            pos = match.end()
+
+        self._buffer = buf[pos:]
+        self._offset += pos
+        if len(self._buffer) > self.MAX_PENDING_CHARS:
+            # Never closed; give up on it rather than growing without bound
+            self._offset += len(self._buffer)
+            self._buffer = ""
+        return blocks
+
+    def _handle(self, match) -> Optional[CodeBlock]:
+        kind = match.lastgroup
+        if kind == 'heading':
+            self._last_heading = match.group('heading_name')
+            return None
+        if kind == 'hint':
+            self._hints.append((self._offset + match.start(), match.group('hint_name')))
+            return None
+
+        self._block_index += 1
+        window_start = self._offset + match.start() - SAVE_HINT_WINDOW
+        hint = next((name for pos, name in self._hints if pos >= window_start), None)
+        self._hints.clear()
+
+        lang = (match.group('lang') or '').lower()
+        content = match.group('body').strip()
+        # Skip non-code blocks (e.g. file structure diagrams)
+        if not content or lang not in EXT_MAP:
+            return None
+        ext = EXT_MAP[lang]
+
+        filename = (
+            _name_from_content(content)
+            or self._last_heading
+            or hint
+            or _fallback_name(content, ext, self._block_index)
+        )
+        return CodeBlock(lang, content, clean_filename(filename))
+
+
+def iter_code_blocks(text: str) -> Iterator[CodeBlock]:
+    """Yield savable code blocks with their resolved filenames, in order."""
+    extractor = IncrementalCodeExtractor()
+    yield from extractor.feed(text)
+    yield from extractor.close()
+
+
+def save_code_blocks(blocks, workspace_path: Path, logger: AgentLogger = agent_logger) -> list:
+    """
+    Write blocks to the workspace in one batch. Returns list of saved filenames.
+    When several blocks name the same file, the longest one wins (first on ties),
+    as with sequential writes.
+    """
+    pending: Dict[str, str] = {}
+    for block in blocks:
+        current = pending.get(block.filename)
+        if current is None or len(block.content) > len(current):
+            pending[block.filename] = block.content
+
+    to_write = []
+    for filename, content in pending.items():
+        # Don't overwrite if file already exists and has more content
+        filepath = Path(workspace_path) / filename
+        try:
+            existing_size = filepath.stat().st_size
+        except OSError:
+            existing_size = 0
+        if existing_size > 0 and existing_size >= len(content):
+            continue  # Skip - existing file is larger or equal
+        to_write.append((filename, content))
+
+    saved_files = []
+    for result in write_files(workspace_path, to_write):
+        if result.status in CHANGED_STATES:
+            saved_files.append(result.path)
+        elif result.status != UNCHANGED:
+            logger.log("System", f"Failed to auto-save {result.path}: {result.detail}", "error")
+
+    return saved_files
+
+
+def extract_and_save_code_blocks(text: str, workspace_path: Path, logger: AgentLogger = agent_logger) -> list:
+    """
+    Extract code blocks from agent text output and save them as files.
+
+    Returns list of saved filenames.
+    """
+    return save_code_blocks(iter_code_blocks(text), workspace_path, logger)
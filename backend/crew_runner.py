@@ -0,0 +1,335 @@
+"""
+Runs the CrewAI agent team for a job.
+
+Importing CrewAI (with litellm, the provider SDKs and their pydantic models)
+takes seconds, so main.py only imports this module when the first agent job
+runs, or from the background pre-warm at startup (see CREW_PREWARM). Nothing
+else in the API depends on it.
+"""
+import asyncio
+import re
+from pathlib import Path
+
+from crewai import Crew, Process, Task
+
+from agents import agent_registry, workspace_path as default_workspace
+from code_extractor import IncrementalCodeExtractor, extract_and_save_code_blocks, save_code_blocks
+from demo import run_demo
+from jobs import JobCancelledError
+from llm_cache import bypass_cache
+from logger import AgentLogger, agent_logger
+from metrics import mark, reset_marks, span, usage_counters
+from providers import is_demo_mode
+from task_graph import (
+    DEFAULT_MAX_PARALLEL, DEFAULT_PROCESS, PROCESS_GRAPH, AgentPool, TaskFailedError, TaskGraph,
+    group_files, parse_file_plan,
+)
+from token_stream import token_router
+
+
+def run_agents(message: str, logger: AgentLogger = agent_logger, workspace_path: Path = Path(default_workspace),
+               check_cancelled=None, use_cache: bool = True, process: str = DEFAULT_PROCESS):
+    """
+    Run CrewAI agents in background.
+    check_cancelled is called at step/task boundaries and raises JobCancelledError to stop the crew.
+    use_cache=False sends every LLM call to the provider (see llm_cache.py).
+    process is "sequential" (one crew) or "graph" (per-file tasks in parallel, see task_graph.py).
+    Returns the final output of the crew (None in demo mode).
+    """
+    check_cancelled = check_cancelled or (lambda: None)
+    try:
+        logger.log("System", f"Starting agents with message: {message}", "info")
+
+        if is_demo_mode():
+            # Mock execution if no key is found to demonstrate UI
+            # (/api/chat schedules demo jobs on the event loop instead of calling this)
+            logger.log("System", "Note: No API Key found in environment. Running in Demo Mode.", "warning")
+            asyncio.run(run_demo(message, logger))
+            return
+
+        # Tasks run in this order; task callbacks advance the current phase
+        phases = ["Architect", "Coder", "Tester"]
+        current_phase = phases[0]
+        # Coder steps are scanned as they arrive so files and editor content show up early
+        code_stream = IncrementalCodeExtractor()
+
+        def handle_streamed_blocks(blocks):
+            if not blocks:
+                return
+            with span("autosave", "stream") as attrs:
+                saved = attrs["files"] = save_code_blocks(blocks, workspace_path, logger)
+            if saved:
+                logger.log("System", f"Auto-saved {len(saved)} file(s) while Coder is working: {', '.join(saved)}", "success")
+            for block in blocks:
+                if block.lang in ("python", "py"):
+                    logger.log("System", block.content, "code")
+
+        # Custom callback for steps
+        def step_callback(step_output):
+            check_cancelled()
+            mark("step", current_phase)
+            thought = getattr(step_output, 'thought', '')
+            result = getattr(step_output, 'result', '')
+
+            if current_phase == "Coder":
+                text = getattr(step_output, 'text', '') or result or getattr(step_output, 'output', '')
+                if text:
+                    handle_streamed_blocks(code_stream.feed(str(text) + "\n"))
+            
+            if thought:
+                logger.log("Agent", f"Thinking: {thought}", "thought")
+            if result:
+                logger.log("Agent", f"Action: {result}", "info")
+            if not thought and not result:
+                logger.log("Agent", f"Working... {str(step_output)}", "info")
+
+        # Task callback - fires when each task completes
+        def make_task_callback(task_name):
+            def task_callback(output):
+                nonlocal current_phase
+                check_cancelled()
+                mark("task", task_name)
+                logger.log(task_name, f"Task completed: {str(output)}", "success")
+                if task_name in phases[:-1]:
+                    current_phase = phases[phases.index(task_name) + 1]
+                
+                # Post-process Coder output: extract code blocks and save to workspace
+                if task_name == "Coder":
+                    handle_streamed_blocks(code_stream.close())
+                    with span("autosave", "output") as attrs:
+                        saved = attrs["files"] = extract_and_save_code_blocks(str(output), workspace_path, logger)
+                    if saved:
+                        logger.log("System", 
+                            f"Auto-saved {len(saved)} file(s) from Coder output: {', '.join(saved)}", 
+                            "success")
+                    else:
+                        logger.log("System", 
+                            "Note: No new files auto-saved (files may already exist from Tool usage).", 
+                            "info")
+            return task_callback
+
+        # Define Agents
+        # Only the roles used by the crew are built; cached across requests
+        architect = agent_registry.get_agent("architect", str(workspace_path), logger)
+        if process != PROCESS_GRAPH:
+            coder = agent_registry.get_agent("coder", str(workspace_path), logger)
+            tester = agent_registry.get_agent("tester", str(workspace_path), logger)
+
+        # Define Tasks
+        # 1. Architect: Design the solution
+        logger.log("Architect", "Starting design phase...", "info")
+        design_task = Task(
+            description=(
+                f"ユーザーの要望: '{message}'\n\n"
+                "この要望を満たすために必要なファイル構成と実装方針を設計してください。\n\n"
+                "【重要】シンプルさを最優先すること。\n"
+                "- シンプルな要望には1〜2ファイルで十分です。過剰な設計は不要です。\n"
+                "- config.py, utils.py, tests/ などは本当に必要な場合のみ含めてください。\n"
+                "- 「シンプルなコード」と言われたら、1ファイルで完結させてください。\n\n"
+                "出力には以下を含めてください：\n"
+                "- 作成すべきファイル名の一覧\n"
+                "- 各ファイルの役割と概要"
+            ),
+            expected_output="ファイル構成と実装詳細を含む簡潔な設計書",
+            agent=architect,
+            callback=make_task_callback("Architect")
+        )
+
+        if process == PROCESS_GRAPH:
+            # Per-file coding and review tasks run concurrently (task_graph.py)
+            with bypass_cache(not use_cache):
+                result = run_task_graph(design_task, step_callback, logger, workspace_path, check_cancelled)
+        else:
+            # 2. Coder: Implement the code
+            logger.log("System", "Starting coding phase...", "info")
+            coding_task = Task(
+                description=(
+                    "アーキテクトの設計に基づいて、実際に動作するコードを実装してください。\n\n"
+                    "【絶対に守るルール】\n"
+                    "コードは必ず File Writer Tool を使ってファイルに保存してください。\n"
+                    "チャットにコードを貼り付けるだけでは不十分です。\n\n"
+                    "【手順】\n"
+                    "1. 設計書を確認する\n"
+                    "2. 各ファイルのコードを作成する\n"
+                    "3. File Writer Tool で各ファイルを保存する（filename, content, overwrite='true' を指定）\n"
+                    "4. 最終出力に、保存したファイル名の一覧を記載する\n\n"
+                    "【出力例】\n"
+                    "以下のファイルをワークスペースに保存しました：\n"
+                    "- example.py: メインプログラム\n"
+                    "- utils.py: ユーティリティ関数"
+                ),
+                expected_output="File Writer Toolで保存したファイル名一覧と実装内容の要約",
+                agent=coder,
+                context=[design_task],
+                callback=make_task_callback("Coder")
+            )
+
+            # 3. Tester: Review the code
+            logger.log("System", "Starting testing phase...", "info")
+            testing_task = Task(
+                description=(
+                    "コーダーが作成したコードをレビューしてください。\n\n"
+                    "【手順】\n"
+                    "1. File Reader Tool でワークスペース内のファイルを読み込む\n"
+                    "2. コードの論理的な誤り、セキュリティの問題、改善点を確認する\n"
+                    "3. レビュー結果を出力する"
+                ),
+                expected_output="コードレビューレポートと改善提案",
+                agent=tester,
+                context=[coding_task],
+                callback=make_task_callback("Tester")
+            )
+
+            # Create Crew
+            crew = Crew(
+                agents=[architect, coder, tester],
+                tasks=[design_task, coding_task, testing_task],
+                process=Process.sequential,
+                verbose=True,
+                step_callback=step_callback,
+                memory=False
+            )
+        
+            logger.log("System", "Crew assembling...", "info")
+            # Partial LLM output shows up in the activity log as "delta" entries
+            with bypass_cache(not use_cache), token_router.stream_to([architect, coder, tester], logger):
+                # Task and step spans run from the previous callback (see metrics.py)
+                reset_marks("task", "step")
+                with span("kickoff", "crew") as attrs:
+                    result = crew.kickoff()
+                    attrs.update(usage_counters(getattr(crew, "usage_metrics", None)))
+        logger.log("System", f"Workflow complete!", "success")
+        logger.log("Final Output", str(result), "success")
+        
+        # List workspace files as summary
+        if workspace_path.exists():
+            with span("scan", "workspace"):
+                ws_files = [f.name for f in workspace_path.iterdir() if f.is_file() and f.stat().st_size > 0]
+            if ws_files:
+                logger.log("System", f"Workspace files: {', '.join(ws_files)}", "info")
+        
+        # Send first Python code block to editor (from any task output)
+        result_str = str(result)
+        code_match = re.search(r'```python\n(.*?)```', result_str, re.DOTALL)
+        if code_match:
+            code = code_match.group(1).strip()
+            logger.log("System", code, "code")
+            logger.log("System", "Code extracted and sent to editor.", "success")
+        return result_str
+
+    except JobCancelledError:
+        raise
+    except Exception as e:
+        import traceback
+        logger.log("System", f"Error during execution: {str(e)}\n{traceback.format_exc()}", "error")
+        raise
+
+
+def run_task_graph(design_task: Task, step_callback, logger: AgentLogger, workspace_path: Path, check_cancelled):
+    """
+    Graph mode: run the design, then one coding task per planned file on a pool of
+    Coder agents, each followed by its own review as soon as the file is written.
+    Returns the combined review text.
+    """
+    workspace = str(workspace_path)
+    architect = design_task.agent
+    with token_router.stream_to([architect], logger), span("kickoff", "design") as attrs:
+        reset_marks("task", "step")
+        crew = Crew(agents=[architect], tasks=[design_task], process=Process.sequential,
+                    step_callback=step_callback, memory=False)
+        crew.kickoff()
+        attrs.update(usage_counters(getattr(crew, "usage_metrics", None)))
+    design = design_task.output.raw if design_task.output else ""
+
+    # Files the Architect did not name still get written: one task then covers the whole design
+    groups = group_files(parse_file_plan(design)) or [[]]
+    logger.log("System", f"Planned {len(groups)} coding task(s): "
+               f"{', '.join('/'.join(group) or 'all files' for group in groups)}", "info")
+    slots = min(DEFAULT_MAX_PARALLEL, len(groups))
+    coders = AgentPool(agent_registry.get_agent("coder", workspace, logger) for _ in range(slots))
+    testers = AgentPool(agent_registry.get_agent("tester", workspace, logger) for _ in range(slots))
+
+    def log_step(step_output):
+        check_cancelled()
+        thought = getattr(step_output, 'thought', '')
+        result = getattr(step_output, 'result', '')
+        if thought:
+            logger.log("Agent", f"Thinking: {thought}", "thought")
+        if result:
+            logger.log("Agent", f"Action: {result}", "info")
+
+    def run_single(agent, role: str, files, description: str, expected_output: str, callback) -> str:
+        label = f"{role} ({', '.join(files)})" if files else role
+        task = Task(description=description, expected_output=expected_output, agent=agent, callback=callback)
+        # Spans are named by role: the metrics registry keeps a series per name for the
+        # life of the process, so the file names only go into the job's timeline
+        file_attrs = {"files": list(files)} if files else {}
+
+        def on_step(step_output):
+            # Parallel tasks keep separate step marks
+            mark("step", role, scope=label, **file_attrs)
+            log_step(step_output)
+
+        with token_router.stream_to([agent], logger, role=label), span("task", role, **file_attrs) as attrs:
+            reset_marks(label)
+            crew = Crew(agents=[agent], tasks=[task], process=Process.sequential,
+                        step_callback=on_step, memory=False)
+            crew.kickoff()
+            attrs.update(usage_counters(getattr(crew, "usage_metrics", None)))
+        return task.output.raw if task.output else ""
+
+    def code(files):
+        label = f"Coder ({', '.join(files)})" if files else "Coder"
+        target = f"次のファイルだけを実装してください: {', '.join(files)}\n他のファイルは別のコーダーが同時に実装します。\n\n" if files else ""
+
+        def on_done(output):
+            check_cancelled()
+            logger.log(label, f"Task completed: {str(output)}", "success")
+            with span("autosave", "output") as attrs:
+                saved = attrs["files"] = extract_and_save_code_blocks(str(output), workspace_path, logger)
+            if saved:
+                logger.log("System", f"Auto-saved {len(saved)} file(s) from Coder output: {', '.join(saved)}", "success")
+
+        def node(inputs):
+            with coders.acquire() as coder:
+                return run_single(coder, "Coder", files, (
+                    f"アーキテクトの設計:\n{design}\n\n{target}"
+                    "コードは必ず File Writer Tool を使ってファイルに保存してください"
+                    "（filename, content, overwrite='true' を指定）。\n"
+                    "最終出力に、保存したファイル名の一覧を記載してください。"
+                ), "File Writer Toolで保存したファイル名一覧と実装内容の要約", on_done)
+        return node
+
+    def review(files):
+        label = f"Tester ({', '.join(files)})" if files else "Tester"
+        target = ", ".join(files) if files else "ワークスペース内のファイル"
+
+        def node(inputs):
+            with testers.acquire() as tester:
+                return run_single(tester, "Tester", files, (
+                    f"コーダーが作成した {target} をレビューしてください。\n\n"
+                    "【手順】\n"
+                    "1. File Reader Tool でファイルを読み込む\n"
+                    "2. コードの論理的な誤り、セキュリティの問題、改善点を確認する\n"
+                    "3. レビュー結果を出力する"
+                ), "コードレビューレポートと改善提案",
+                    lambda output: logger.log(label, f"Task completed: {str(output)}", "success"))
+        return node
+
+    graph = TaskGraph(max_parallel=2 * slots)
+    for i, files in enumerate(groups):
+        graph.add(f"code:{i}", code(files))
+        graph.add(f"review:{i}", review(files), deps=[f"code:{i}"])
+    try:
+        results = graph.run(check_cancelled)
+    except TaskFailedError as e:
+        check_cancelled()
+        for node, error in e.errors.items():
+            logger.log("System", f"Task {node} failed: {error}", "error")
+        results = e.results
+
+    reviews = []
+    for i, files in enumerate(groups):
+        if f"review:{i}" in results:
+            reviews.append(f"## {', '.join(files) or 'Review'}\n{results[f'review:{i}']}")
+    return "\n\n".join(reviews)
@@ -0,0 +1,149 @@
+"""
+Demo mode: timer-driven scripts that imitate an agent run without any LLM.
+
+Scripts are lists of DemoStep and run on the event loop with asyncio.sleep, so a
+demo job costs no worker thread. Recorded runs (the JSONL spill segment, or the
+"logs" array of /api/activity saved as JSON) can be replayed at any speed, which
+also makes demo jobs usable as a load generator for the logging and streaming paths:
+
+    python demo.py --jobs 300 --speed 20 --subscribers 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, NamedTuple, Optional
+
+from logger import AgentLogger, agent_logger
+from log_payloads import payload_store
+
+# Replay speed multiplier for demo jobs (2.0 = twice as fast)
+DEFAULT_SPEED = float(os.getenv("DEMO_SPEED", "1.0"))
+# Optional recorded transcript replayed instead of the built-in script
+DEFAULT_TRANSCRIPT = os.getenv("DEMO_TRANSCRIPT")
+
+
+class DemoStep(NamedTuple):
+    delay: float  # seconds to wait before logging this entry
+    role: str
+    message: str
+    type: str = "info"
+
+
+DEMO_SCRIPT = [
+    DemoStep(1, "Architect", "Analyzing request: '{message}'", "thought"),
+    DemoStep(2, "Architect", "Identifying necessary components...", "thought"),
+    DemoStep(2, "Architect", "Drafting architecture diagram...", "thought"),
+    DemoStep(2, "Architect", "Decision: Use Python/FastAPI for backend.", "info"),
+    DemoStep(1, "Architect", "Decision: Use React for frontend.", "info"),
+    DemoStep(1, "System", "All tasks completed (Demo).", "success"),
+]
+
+
+def load_transcript(path: Path, max_delay: float = 5.0) -> List[DemoStep]:
+    """
+    Turn recorded log entries into a script. Delays come from the recorded
+    timestamps, capped at max_delay so long LLM waits do not stall a replay.
+    """
+    text = Path(path).read_text(encoding="utf-8")
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        # JSONL: one entry per line
+        data = [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(data, dict):
+        data = data.get("logs", [data])
+    entries = data
+
+    steps = []
+    previous = None
+    for entry in entries:
+        ts = datetime.fromisoformat(entry["timestamp"])
+        delay = 0.0 if previous is None else min(max((ts - previous).total_seconds(), 0.0), max_delay)
+        previous = ts
+        message = entry["message"]
+        if entry.get("payload"):
+            # Recorded large messages are previews; replay the full text while it is still stored
+            message = payload_store.get(entry["payload"]["id"]) or message
+        steps.append(DemoStep(delay, entry["role"], message, entry.get("type", "info")))
+    return steps
+
+
+async def run_script(
+    steps: List[DemoStep],
+    logger: AgentLogger = agent_logger,
+    speed: float = DEFAULT_SPEED,
+    message: str = "",
+    check_cancelled: Optional[Callable[[], None]] = None,
+):
+    """Play a script into a logger. {message} in step text is replaced by the user request."""
+    for step in steps:
+        if step.delay > 0:
+            await asyncio.sleep(step.delay / speed)
+        if check_cancelled:
+            check_cancelled()
+        logger.log(step.role, step.message.replace("{message}", message), step.type)
+
+
+async def run_demo(message: str, logger: AgentLogger = agent_logger, speed: float = DEFAULT_SPEED,
+                   transcript: Optional[str] = DEFAULT_TRANSCRIPT,
+                   check_cancelled: Optional[Callable[[], None]] = None):
+    """Simulate agent activity for demo purposes."""
+    steps = load_transcript(Path(transcript)) if transcript else DEMO_SCRIPT
+    await run_script(steps, logger, speed, message, check_cancelled)
+
+
+async def run_load(jobs: int, speed: float, subscribers: int = 0, steps: Optional[List[DemoStep]] = None) -> dict:
+    """
+    Run many fake jobs concurrently against a fresh logger, with optional streaming
+    subscribers draining it like connected IDE tabs. Returns throughput figures.
+    """
+    from activity_stream import ActivityBroadcaster
+
+    steps = steps or DEMO_SCRIPT
+    logger = AgentLogger(capacity=max(1000, jobs * len(steps)))
+    broadcaster = ActivityBroadcaster(logger)
+    expected = jobs * len(steps)
+    received = [0] * subscribers
+
+    async def consume(index: int):
+        subscription = broadcaster.subscribe(after_seq=0)
+        try:
+            while received[index] < expected:
+                received[index] += len(await subscription.next_batch())
+        finally:
+            subscription.close()
+
+    consumers = [asyncio.create_task(consume(i)) for i in range(subscribers)]
+    started = time.perf_counter()
+    await asyncio.gather(*(run_script(steps, logger, speed, f"load job {i}") for i in range(jobs)))
+    produced = time.perf_counter() - started
+    await asyncio.gather(*consumers)
+    drained = time.perf_counter() - started
+    return {
+        "jobs": jobs,
+        "entries": expected,
+        "produce_seconds": round(produced, 3),
+        "drain_seconds": round(drained, 3),
+        "entries_per_second": round(expected / drained, 1),
+        "subscribers": subscribers,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run concurrent fake agent jobs as a load generator.")
+    parser.add_argument("--jobs", type=int, default=100)
+    parser.add_argument("--speed", type=float, default=10.0)
+    parser.add_argument("--subscribers", type=int, default=1)
+    parser.add_argument("--transcript", help="recorded JSONL/JSON log to replay instead of the built-in script")
+    args = parser.parse_args()
+
+    steps = load_transcript(Path(args.transcript)) if args.transcript else None
+    print(json.dumps(asyncio.run(run_load(args.jobs, args.speed, args.subscribers, steps)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""
+Process-isolated executor for /api/run.
+
+User code runs in a pool of pre-spawned worker processes instead of exec() inside
+the API process. Each worker has the workspace on sys.path, applies rlimits on
+POSIX, and is recycled after a fixed number of runs or whenever a run exceeds its
+limits. Workers are independent, so runs proceed in parallel without sharing
+stdin/stdout or sys.path.
+"""
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+from io import StringIO, TextIOBase
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+try:
+    import resource  # POSIX only
+except ImportError:
+    resource = None
+
+DEFAULT_POOL_SIZE = int(os.getenv("RUN_POOL_SIZE", "2"))
+DEFAULT_MAX_RUNS_PER_WORKER = int(os.getenv("RUN_MAX_RUNS_PER_WORKER", "50"))
+DEFAULT_TIMEOUT = float(os.getenv("RUN_TIMEOUT_SECONDS", "10"))
+DEFAULT_CPU_SECONDS = int(os.getenv("RUN_CPU_SECONDS", "10"))
+DEFAULT_MEMORY_MB = int(os.getenv("RUN_MEMORY_MB", "512"))
+# How long a request waits for a free worker before giving up
+DEFAULT_ACQUIRE_TIMEOUT = float(os.getenv("RUN_ACQUIRE_TIMEOUT_SECONDS", "30"))
+# Output beyond this many characters per run is dropped and replaced by a marker
+DEFAULT_MAX_OUTPUT_CHARS = int(os.getenv("RUN_MAX_OUTPUT_CHARS", str(1024 * 1024)))
+# Output is sent to the API process in chunks of at most this size / this latency
+CHUNK_CHARS = 8192
+FLUSH_INTERVAL = 0.05
+
+TRUNCATION_MARKER = "\n[output truncated: limit of {limit} characters reached]\n"
+
+
+def _apply_memory_limit(memory_mb: int):
+    if resource is None or not memory_mb:
+        return
+    limit = memory_mb * 1024 * 1024
+    try:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def _apply_cpu_limit(cpu_seconds: int):
+    """RLIMIT_CPU counts the whole process lifetime, so set it relative to what is used so far."""
+    if resource is None or not cpu_seconds:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = int(usage.ru_utime + usage.ru_stime) + cpu_seconds
+    try:
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    except (ValueError, OSError):
+        pass
+
+
+class _ChunkedOutput:
+    """
+    Shared output state of one run: collects writes from stdout/stderr and sends
+    them to the API process as {"type": "stdout"|"stderr", "data": ...} frames.
+    Frames go out once CHUNK_CHARS accumulate or FLUSH_INTERVAL passes.
+    """
+
+    def __init__(self, conn, max_chars: int):
+        self._conn = conn
+        self._max_chars = max_chars
+        self._lock = threading.Lock()
+        self._pending = []  # [stream, text] pairs not yet sent
+        self._pending_chars = 0
+        self._total_chars = 0
+        self.truncated = False
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._flusher.start()
+
+    def write(self, stream: str, text: str):
+        with self._lock:
+            if self.truncated:
+                return
+            remaining = self._max_chars - self._total_chars
+            if len(text) > remaining:
+                text = text[:remaining]
+                self.truncated = True
+            self._total_chars += len(text)
+            if self._pending and self._pending[-1][0] == stream:
+                self._pending[-1][1] += text
+            elif text:
+                self._pending.append([stream, text])
+            self._pending_chars += len(text)
+            if self.truncated:
+                self._pending.append(["stderr", TRUNCATION_MARKER.format(limit=self._max_chars)])
+            if self._pending_chars >= CHUNK_CHARS or self.truncated:
+                self._send_pending()
+
+    def close(self):
+        self._stop.set()
+        self._flusher.join()
+        with self._lock:
+            self._send_pending()
+
+    def _flush_periodically(self):
+        while not self._stop.wait(FLUSH_INTERVAL):
+            with self._lock:
+                self._send_pending()
+
+    def _send_pending(self):
+        for stream, text in self._pending:
+            self._conn.send({"type": stream, "data": text})
+        self._pending = []
+        self._pending_chars = 0
+
+
+class _StreamWriter(TextIOBase):
+    def __init__(self, output: _ChunkedOutput, stream: str):
+        self._output = output
+        self._stream = stream
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        self._output.write(self._stream, text)
+        return len(text)
+
+
+def _in_workspace(module, workspace_real: str) -> bool:
+    """True if module was loaded from a file (or is a package directory) under the workspace."""
+    file = getattr(module, "__file__", None)
+    locations = [file] if file else list(getattr(module, "__path__", None) or [])
+    return any(os.path.realpath(location).startswith(workspace_real + os.sep) for location in locations)
+
+
+def _worker_main(conn, workspace: str, memory_mb: int):
+    """Entry point of a worker process: run requests from conn until told to stop."""
+    sys.path.insert(0, workspace)
+    if os.path.isdir(workspace):
+        os.chdir(workspace)
+    _apply_memory_limit(memory_mb)
+    baseline_modules = set(sys.modules)
+    workspace_real = os.path.realpath(workspace)
+
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            break
+        if request is None:
+            break
+
+        _apply_cpu_limit(request.get("cpu_seconds"))
+        output = _ChunkedOutput(conn, request.get("max_output_chars") or DEFAULT_MAX_OUTPUT_CHARS)
+        sys.stdin = StringIO(request.get("input", ""))
+        sys.stdout = _StreamWriter(output, "stdout")
+        sys.stderr = _StreamWriter(output, "stderr")
+        status = "success"
+        try:
+            exec(compile(request["code"], "<main>", "exec"), {"__name__": "__main__"})
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                status = "error"
+        except BaseException as e:
+            status = "error"
+            # Skip this module's frame so the traceback starts in user code
+            sys.stderr.write("".join(traceback.format_exception(type(e), e, e.__traceback__.tb_next)))
+        finally:
+            sys.stdin, sys.stdout, sys.stderr = sys.__stdin__, sys.__stdout__, sys.__stderr__
+            # Drop workspace modules imported by this run so edits are seen next time.
+            # Others stay loaded: C extensions (numpy, ...) cannot be imported twice per process.
+            for name in set(sys.modules) - baseline_modules:
+                if _in_workspace(sys.modules[name], workspace_real):
+                    del sys.modules[name]
+
+        try:
+            output.close()
+            conn.send({"type": "exit", "status": status, "truncated": output.truncated})
+        except (BrokenPipeError, OSError):
+            break
+
+
+class _Worker:
+    def __init__(self, ctx, workspace: str, memory_mb: int):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main, args=(child_conn, workspace, memory_mb), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.runs = 0
+
+    def stop(self, graceful: bool = True):
+        if graceful and self.process.is_alive():
+            try:
+                self.conn.send(None)
+                self.process.join(0.5)
+            except (BrokenPipeError, OSError):
+                pass
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(1)
+        self.conn.close()
+
+
+class CodeExecutor:
+    """Pool of warm worker processes that run untrusted snippets with limits."""
+
+    def __init__(
+        self,
+        workspace: Path,
+        size: int = DEFAULT_POOL_SIZE,
+        max_runs_per_worker: int = DEFAULT_MAX_RUNS_PER_WORKER,
+        timeout: float = DEFAULT_TIMEOUT,
+        cpu_seconds: int = DEFAULT_CPU_SECONDS,
+        memory_mb: int = DEFAULT_MEMORY_MB,
+        acquire_timeout: float = DEFAULT_ACQUIRE_TIMEOUT,
+    ):
+        self.workspace = str(Path(workspace).resolve())
+        self.size = size
+        self.max_runs_per_worker = max_runs_per_worker
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.acquire_timeout = acquire_timeout
+        # spawn everywhere: forking a threaded server process is unsafe
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._started = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Pre-spawn the pool. Called lazily by run() if not done at startup."""
+        with self._lock:
+            if self._started:
+                return
+            for _ in range(self.size):
+                self._idle.put(self._spawn())
+            self._started = True
+
+    def shutdown(self):
+        with self._lock:
+            self._started = False
+            while True:
+                try:
+                    self._idle.get_nowait().stop()
+                except queue.Empty:
+                    break
+
+    def run(self, code: str, input_str: str = "", timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Run code in a worker. Returns {"status": "success"|"error", "output": str}."""
+        chunks = []
+        result = {"status": "error", "output": ""}
+        for frame in self.run_stream(code, input_str, timeout):
+            if frame["type"] in ("stdout", "stderr"):
+                chunks.append(frame["data"])
+            elif frame["type"] == "exit":
+                result = {"status": frame["status"], "output": "".join(chunks)}
+                if frame.get("error"):
+                    result["output"] += frame["error"]
+                result["duration_ms"] = frame["duration_ms"]
+                result["truncated"] = frame.get("truncated", False)
+        return result
+
+    def run_stream(self, code: str, input_str: str = "", timeout: Optional[float] = None,
+                   max_output_chars: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Run code in a worker and yield output frames as they arrive:
+        {"type": "stdout"|"stderr", "data": str} ... then one
+        {"type": "exit", "status": ..., "duration_ms": ..., "truncated": bool, "error"?: str}.
+        Closing the generator early kills the run.
+        """
+        self.start()
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            worker = self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            yield {"type": "exit", "status": "error", "duration_ms": 0,
+                   "error": "All execution workers are busy. Please retry."}
+            return
+
+        started = time.monotonic()
+        finished = False
+        try:
+            worker.conn.send({
+                "code": code,
+                "input": input_str,
+                "cpu_seconds": self.cpu_seconds,
+                "max_output_chars": max_output_chars,
+            })
+            while True:
+                remaining = timeout - (time.monotonic() - started)
+                if remaining <= 0 or not worker.conn.poll(remaining):
+                    finished = True
+                    self._replace(worker)
+                    yield self._exit_frame(started, error=f"Execution timed out after {timeout:g} seconds.")
+                    return
+                try:
+                    frame = worker.conn.recv()
+                except (EOFError, OSError):
+                    finished = True
+                    error = self._describe_exit(worker)
+                    self._replace(worker)
+                    yield self._exit_frame(started, error=error)
+                    return
+                if frame["type"] == "exit":
+                    finished = True
+                    frame["duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+                    self._release(worker)
+                    yield frame
+                    return
+                yield frame
+        finally:
+            if not finished:
+                # Consumer went away mid-run (e.g. client disconnected)
+                self._replace(worker)
+
+    def _exit_frame(self, started: float, error: str) -> Dict[str, Any]:
+        return {
+            "type": "exit",
+            "status": "error",
+            "duration_ms": round((time.monotonic() - started) * 1000, 1),
+            "error": error,
+        }
+
+    def _release(self, worker: _Worker):
+        worker.runs += 1
+        if worker.runs >= self.max_runs_per_worker:
+            self._replace(worker)
+        else:
+            self._idle.put(worker)
+
+    def _spawn(self) -> _Worker:
+        return _Worker(self._ctx, self.workspace, self.memory_mb)
+
+    def _replace(self, worker: _Worker):
+        worker.stop(graceful=False)
+        if self._started:
+            self._idle.put(self._spawn())
+
+    def _describe_exit(self, worker: _Worker) -> str:
+        worker.process.join(1)
+        code = worker.process.exitcode
+        if resource is not None and code is not None and code < 0:
+            import signal
+            if -code == getattr(signal, "SIGXCPU", None):
+                return f"CPU time limit of {self.cpu_seconds} seconds exceeded."
+            if -code == signal.SIGKILL:
+                return "Process was killed (likely exceeded the memory limit)."
+        return f"Execution process exited unexpectedly (exit code {code})."
@@ -0,0 +1,138 @@
+"""
+Raw file serving for the workspace.
+
+Files are sent as bytes rather than JSON-wrapped text. Starlette's FileResponse
+provides Range requests and, on servers that support it, zero-copy
+"pathsend" transfers. On top of that this module adds:
+- conditional requests: If-None-Match / If-Modified-Since are answered with 304
+- optional gzip or brotli (if the brotli package is installed) for text files,
+  compressed in chunks while streaming
+- safe resolution of nested paths inside the workspace
+"""
+import mimetypes
+import os
+import zlib
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Iterator, Optional
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+# Files larger than this are never compressed (sent zero-copy instead)
+COMPRESS_MAX_BYTES = int(os.getenv("FILE_COMPRESS_MAX_BYTES", str(16 * 1024 * 1024)))
+# Files smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = 1024
+READ_CHUNK = 256 * 1024
+
+_TEXT_TYPES = {"application/json", "application/javascript", "application/xml", "application/x-sh",
+               "application/x-yaml", "application/sql"}
+
+
+def resolve_workspace_path(root: Path, relative: str) -> Optional[Path]:
+    """Resolve a client-supplied path inside root; None if it escapes root."""
+    root = Path(root).resolve()
+    relative = relative.replace("\\", "/").lstrip("/")
+    candidate = (root / relative).resolve()
+    if candidate != root and root not in candidate.parents:
+        return None
+    return candidate
+
+
+def media_type_for(path: Path) -> str:
+    media_type, _ = mimetypes.guess_type(path.name)
+    if media_type is None:
+        # Source files without a registered type (.py, .jsx, ...) are shown as text
+        return "text/plain"
+    return media_type
+
+
+def _is_compressible(media_type: str) -> bool:
+    return media_type.startswith("text/") or media_type in _TEXT_TYPES or media_type.endswith("+json")
+
+
+def _choose_encoding(request: Request) -> Optional[str]:
+    accepted = {
+        part.split(";")[0].strip().lower()
+        for part in request.headers.get("accept-encoding", "").split(",")
+        if part.strip() and not part.strip().endswith("q=0")
+    }
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def _compressed_chunks(path: Path, encoding: str) -> Iterator[bytes]:
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=5)
+        compress, finish = compressor.process, compressor.finish
+    else:
+        # wbits 31 = gzip container
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        compress, finish = compressor.compress, compressor.flush
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK), b""):
+            data = compress(chunk)
+            if data:
+                yield data
+    yield finish()
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison, as RFC 9110 requires for If-None-Match
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag.removeprefix("W/") in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return int(mtime) <= since.timestamp()
+    return False
+
+
+def serve_file(path: Path, request: Request, content_hash: Optional[str] = None) -> Response:
+    """
+    Response for one file. content_hash (e.g. from the workspace index) gives a
+    strong ETag; otherwise it is derived from size and mtime.
+    """
+    stat = path.stat()
+    media_type = media_type_for(path)
+    encoding = _choose_encoding(request)
+    if not (
+        encoding
+        and "range" not in request.headers
+        and _is_compressible(media_type)
+        and COMPRESS_MIN_BYTES <= stat.st_size <= COMPRESS_MAX_BYTES
+    ):
+        encoding = None
+
+    etag = content_hash[:32] if content_hash else f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+    # Compressed bytes differ from the identity response, so they get their own (weak) validator
+    etag = f'W/"{etag}-{encoding}"' if encoding else f'"{etag}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        # Let browsers cache, but revalidate every time so edits show up immediately
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if _not_modified(request, etag, stat.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        return StreamingResponse(_compressed_chunks(path, encoding), media_type=media_type, headers=headers)
+
+    # Range requests and zero-copy sends are handled by FileResponse
+    return FileResponse(path, media_type=media_type, headers=headers, stat_result=stat)
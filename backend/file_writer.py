@@ -0,0 +1,163 @@
+"""
+Write pipeline behind the agent file tools and the code block auto-save.
+
+Every write goes through write_files():
+- paths are resolved inside the workspace, anything outside is blocked
+- content that is already on disk (same size and sha256) is not rewritten
+- files are written to a temp file in the target directory and renamed over
+  the destination, so readers never see a half-written file
+- with FILE_WRITE_FSYNC=1 the temp files are fsynced before the renames
+
+A batch is written in two phases, all temp files and then all renames, so if
+writing any file of the batch fails, none of them is replaced.
+"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from workspace_index import file_hash, notify_changed
+
+FSYNC = os.getenv("FILE_WRITE_FSYNC", "0").lower() in ("1", "true", "yes", "on")
+
+# Result statuses
+CREATED = "created"
+UPDATED = "updated"
+UNCHANGED = "unchanged"
+EXISTS = "exists"
+BLOCKED = "blocked"
+FAILED = "failed"
+
+CHANGED_STATES = {CREATED, UPDATED}
+
+
+class WriteResult(NamedTuple):
+    path: str  # as requested, relative to the workspace
+    status: str
+    detail: str = ""
+
+
+def resolve_in_workspace(workspace_path, filename: str) -> Optional[Path]:
+    """
+    Absolute path of filename inside the workspace, or None if it would escape it.
+    Leading slashes and drive letters are stripped, so absolute-looking paths
+    from agents are treated as workspace-relative.
+    """
+    workspace_abs = os.path.abspath(workspace_path)
+    filename = filename.lstrip("/\\")
+    # Remove any drive letter (e.g., C:)
+    if len(filename) >= 2 and filename[1] == ":":
+        filename = filename[2:].lstrip("/\\")
+    filepath_abs = os.path.abspath(os.path.join(workspace_abs, filename))
+    if not filepath_abs.startswith(workspace_abs + os.sep):
+        return None
+    return Path(filepath_abs)
+
+
+def _unchanged(path: Path, data: bytes) -> bool:
+    try:
+        if path.stat().st_size != len(data):
+            return False
+        return file_hash(path) == hashlib.sha256(data).hexdigest()
+    except OSError:
+        return False
+
+
+def _write_temp(path: Path, data: bytes) -> str:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            if FSYNC:
+                f.flush()
+                os.fsync(f.fileno())
+        try:
+            os.chmod(tmp, path.stat().st_mode & 0o7777)
+        except FileNotFoundError:
+            os.chmod(tmp, 0o644)  # mkstemp creates 0600
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return tmp
+
+
+def write_files(
+    workspace_path,
+    files: Iterable[Tuple[str, str]],
+    overwrite: bool = True,
+) -> List[WriteResult]:
+    """
+    Write (relative path, text) pairs into the workspace as utf-8.
+    Returns one WriteResult per distinct path, in request order; a later entry
+    for the same path replaces an earlier one.
+    """
+    requested: Dict[str, str] = {}
+    for name, content in files:
+        requested[name] = content
+
+    results: Dict[str, WriteResult] = {}
+    staged: List[Tuple[str, Path, str, str]] = []  # (name, path, temp file, status)
+    try:
+        for name, content in requested.items():
+            path = resolve_in_workspace(workspace_path, name)
+            if path is None:
+                results[name] = WriteResult(name, BLOCKED, "outside the workspace")
+                continue
+            data = content.encode("utf-8")
+            exists = path.exists()
+            if exists and _unchanged(path, data):
+                results[name] = WriteResult(name, UNCHANGED)
+                continue
+            if exists and not overwrite:
+                results[name] = WriteResult(name, EXISTS, "overwrite option was not passed")
+                continue
+            try:
+                staged.append((name, path, _write_temp(path, data), UPDATED if exists else CREATED))
+            except OSError as e:
+                results[name] = WriteResult(name, FAILED, str(e))
+
+        if any(result.status == FAILED for result in results.values()):
+            # Keep the batch all-or-nothing for files that were about to change
+            for name, path, tmp, _ in staged:
+                os.unlink(tmp)
+                results[name] = WriteResult(name, FAILED, "not written, another file in the batch failed")
+            staged = []
+
+        for name, path, tmp, status in staged:
+            try:
+                os.replace(tmp, path)
+            except OSError as e:
+                os.unlink(tmp)
+                results[name] = WriteResult(name, FAILED, str(e))
+                continue
+            notify_changed(path)
+            results[name] = WriteResult(name, status)
+        staged = []
+    finally:
+        for _, _, tmp, _ in staged:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+    return [results[name] for name in requested]
+
+
+def write_file(workspace_path, filename: str, content: str, overwrite: bool = True) -> WriteResult:
+    return write_files(workspace_path, [(filename, content)], overwrite)[0]
+
+
+def summarize(results: List[WriteResult]) -> str:
+    """One line per outcome group, for tool output read by the LLM."""
+    groups: Dict[str, List[str]] = {}
+    for result in results:
+        label = f"{result.path} ({result.detail})" if result.detail else result.path
+        groups.setdefault(result.status, []).append(label)
+    changed = sum(len(groups.get(status, [])) for status in CHANGED_STATES)
+    lines = [f"{changed} of {len(results)} files changed."]
+    for status in (CREATED, UPDATED, UNCHANGED, EXISTS, BLOCKED, FAILED):
+        if status in groups:
+            lines.append(f"{status}: {', '.join(groups[status])}")
+    return "\n".join(lines)
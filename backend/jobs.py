@@ -0,0 +1,288 @@
+"""
+Job scheduler for agent runs.
+
+Each submitted request becomes a Job with its own id, log stream and workspace
+directory. Jobs run on a bounded worker pool; once the pool and the wait queue
+are full, new submissions are rejected so callers can back off.
+"""
+import asyncio
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from logger import AgentLogger, agent_logger
+from metrics import Timeline, span, use_timeline
+from snapshots import SnapshotStore, copy_file
+from history import HistoryStore
+from workspace_index import notify_changed
+
+# Number of jobs allowed to run at the same time
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("JOB_MAX_CONCURRENCY", "2"))
+# Number of jobs allowed to wait for a free worker before submissions are rejected
+DEFAULT_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "8"))
+# Finished jobs kept for status queries
+DEFAULT_HISTORY_LIMIT = int(os.getenv("JOB_HISTORY_LIMIT", "100"))
+# Event-loop (demo/replay) jobs admitted at once; they hold no worker thread
+DEFAULT_ASYNC_LIMIT = int(os.getenv("JOB_ASYNC_LIMIT", "500"))
+# Per-job log buffer size
+JOB_LOG_CAPACITY = int(os.getenv("JOB_LOG_CAPACITY", "2000"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobQueueFullError(Exception):
+    """Raised when the scheduler cannot admit another job."""
+
+
+class JobCancelledError(Exception):
+    """Raised inside a running job once cancellation was requested."""
+
+
+class Job:
+    def __init__(self, message: str, jobs_root: Path, global_logger: AgentLogger, options: Optional[Dict[str, Any]] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.message = message
+        # Per-request settings for the runner, e.g. {"no_cache": True}
+        self.options: Dict[str, Any] = dict(options or {})
+        self.workspace_path = Path(jobs_root) / self.id / "workspace"
+        self.status = QUEUED
+        self.error: Optional[str] = None
+        # Final result text set by the runner; kept in the history store, not in to_dict
+        self.output: Optional[str] = None
+        self.created_at = datetime.now().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.future = None
+        self.is_async = False
+        self._loop = None
+        self._cancel_event = threading.Event()
+        # Timed spans of the run, see metrics.py
+        self.timeline = Timeline()
+        # "before"/"after" snapshot ids, see snapshots.py
+        self.snapshots: Dict[str, str] = {}
+
+        # Own log stream, mirrored into the global logger tagged with the job id
+        self.logger = AgentLogger(capacity=JOB_LOG_CAPACITY, payloads=global_logger.payloads)
+        self.logger.add_listener(
+            lambda entry: global_logger.log(entry["role"], entry["message"], entry["type"], job_id=self.id,
+                                            payload=entry.get("payload"))
+        )
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        """Called by the runner at safe points (step/task callbacks)."""
+        if self._cancel_event.is_set():
+            raise JobCancelledError(f"Job {self.id} was cancelled")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "message": self.message,
+            "options": self.options,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "cancel_requested": self.cancel_requested,
+            "async": self.is_async,
+            "last_seq": self.logger.last_seq,
+            "snapshots": self.snapshots,
+        }
+
+
+class JobManager:
+    """
+    Bounded worker pool plus admission control.
+
+    runner(job) does the actual work and runs on a pool thread. It should call
+    job.check_cancelled() regularly; raising JobCancelledError marks the job cancelled.
+    Jobs that only wait on timers (demo/replay) can instead be submitted with a
+    coroutine runner; they run as tasks on the event loop and hold no pool thread.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[[Job], Any],
+        shared_workspace: Path,
+        jobs_root: Path,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        queue_limit: int = DEFAULT_QUEUE_LIMIT,
+        history_limit: int = DEFAULT_HISTORY_LIMIT,
+        async_limit: int = DEFAULT_ASYNC_LIMIT,
+        logger: AgentLogger = agent_logger,
+        snapshots: Optional[SnapshotStore] = None,
+        history: Optional[HistoryStore] = None,
+    ):
+        self._runner = runner
+        self.shared_workspace = Path(shared_workspace)
+        self.jobs_root = Path(jobs_root)
+        self.max_concurrency = max_concurrency
+        self.queue_limit = queue_limit
+        self.history_limit = history_limit
+        self.async_limit = async_limit
+        self._logger = logger
+        # Keep the store on the jobs' filesystem so workspaces can be hard-linked to it
+        self.snapshots = snapshots or SnapshotStore(self.jobs_root / "snapshots")
+        # Durable record of every job's state changes (optional)
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="job")
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        message: str,
+        coroutine_runner: Optional[Callable[[Job], Awaitable[Any]]] = None,
+        options: Optional[Dict[str, Any]] = None,
+    ) -> Job:
+        """
+        Queue a job. With coroutine_runner the job runs on the current event loop,
+        so this must then be called from inside that loop.
+        """
+        is_async = coroutine_runner is not None
+        limit = self.async_limit if is_async else self.max_concurrency + self.queue_limit
+        with self._lock:
+            active = sum(
+                1 for job in self._jobs.values()
+                if job.status in (QUEUED, RUNNING) and job.is_async == is_async
+            )
+            if active >= limit:
+                raise JobQueueFullError(f"{active} jobs are already queued or running (limit {limit})")
+            job = Job(message, self.jobs_root, self._logger, options)
+            job.is_async = is_async
+            self._jobs[job.id] = job
+            self._evict_finished()
+        self._record(job)
+        if is_async:
+            job._loop = asyncio.get_running_loop()
+            job.future = job._loop.create_task(self._run_async(job, coroutine_runner))
+        else:
+            job.future = self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return job
+        job._cancel_event.set()
+        if job.is_async:
+            # Interrupts the pending asyncio.sleep; cancel() may be called from any thread
+            job._loop.call_soon_threadsafe(job.future.cancel)
+        elif job.future is not None and job.future.cancel():
+            # Never started: finish it here since _run will not be called
+            self._finish(job, CANCELLED)
+            job.logger.log("System", "Job cancelled before it started.", "warning")
+        return job
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, job: Job):
+        if job.cancel_requested:
+            self._finish(job, CANCELLED)
+            return
+        job.status = RUNNING
+        job.started_at = datetime.now().isoformat()
+        self._record(job)
+        try:
+            with use_timeline(job.timeline):
+                with span("workspace", "prepare"):
+                    self._prepare_workspace(job)
+                try:
+                    with span("run", "agents"):
+                        self._runner(job)
+                finally:
+                    with span("workspace", "snapshot"):
+                        self._snapshot_result(job)
+                with span("workspace", "publish"):
+                    self._publish_workspace(job)
+            self._finish(job, SUCCEEDED)
+        except JobCancelledError:
+            job.logger.log("System", "Job cancelled.", "warning")
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            job.error = str(e)
+            self._finish(job, FAILED)
+        finally:
+            shutil.rmtree(job.workspace_path.parent, ignore_errors=True)
+
+    async def _run_async(self, job: Job, coroutine_runner: Callable[[Job], Awaitable[Any]]):
+        job.status = RUNNING
+        job.started_at = datetime.now().isoformat()
+        self._record(job)
+        try:
+            await coroutine_runner(job)
+            self._finish(job, SUCCEEDED)
+        except (JobCancelledError, asyncio.CancelledError):
+            job.logger.log("System", "Job cancelled.", "warning")
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            job.error = str(e)
+            self._finish(job, FAILED)
+
+    def _finish(self, job: Job, status: str):
+        job.status = status
+        job.finished_at = datetime.now().isoformat()
+        self._record(job)
+
+    def _record(self, job: Job):
+        if self.history is not None:
+            self.history.record_job({**job.to_dict(), "output": job.output})
+
+    def _prepare_workspace(self, job: Job):
+        """
+        Snapshot the shared workspace and build the job workspace from it, so agents
+        can read existing files. Files are hard links into the snapshot store, not copies.
+        """
+        if self.shared_workspace.exists():
+            before = self.snapshots.snapshot(self.shared_workspace, "before", job.id)
+            job.snapshots["before"] = before["id"]
+            self.snapshots.materialize(before["id"], job.workspace_path)
+        else:
+            job.workspace_path.mkdir(parents=True, exist_ok=True)
+
+    def _snapshot_result(self, job: Job):
+        """Record what the agents left in the job workspace, also when they failed."""
+        if job.workspace_path.exists():
+            job.snapshots["after"] = self.snapshots.snapshot(job.workspace_path, "after", job.id)["id"]
+
+    def _publish_workspace(self, job: Job):
+        """Copy files the job created or changed back into the shared workspace."""
+        after = job.snapshots["after"]
+        if "before" in job.snapshots:
+            changes = self.snapshots.diff(job.snapshots["before"], after)
+            changed = changes["added"] + changes["modified"]
+        else:
+            changed = list(self.snapshots.files(after))
+        # Deletions are not published: agents have no tool to delete files
+        for rel in changed:
+            dest = self.shared_workspace / rel
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            copy_file(job.workspace_path / rel, dest)
+            notify_changed(dest)
+
+    def _evict_finished(self):
+        finished = [job for job in self._jobs.values() if job.status in FINISHED_STATES]
+        for job in finished[: max(0, len(finished) - self.history_limit)]:
+            del self._jobs[job.id]
@@ -0,0 +1,249 @@
+"""
+Response cache for LLM calls.
+
+Agents call llm.call(messages, tools=...) for every step. cached_llm() wraps an
+LLM so identical calls (same model, messages, tool schemas and temperature) are
+answered from the cache instead of the provider:
+- an in-memory LRU of LLM_CACHE_MEMORY_ENTRIES responses in front of
+- an SQLite table at LLM_CACHE_PATH, evicted least-recently-used once it holds
+  more than LLM_CACHE_MAX_BYTES of responses
+Entries older than LLM_CACHE_TTL_SECONDS are ignored and removed.
+
+Only plain text responses are cached; native tool calls and structured outputs
+always go to the provider. Set LLM_CACHE=0 to disable the cache, or wrap a
+single run in bypass_cache() to skip lookups and stores for it.
+"""
+import contextlib
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from metrics import span, usage_delta
+
+ENABLED = os.getenv("LLM_CACHE", "1").lower() not in ("0", "false", "no", "off")
+DEFAULT_PATH = Path(os.getenv("LLM_CACHE_PATH", str(Path(__file__).resolve().parent / "cache" / "llm_cache.sqlite3")))
+DEFAULT_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256"))
+DEFAULT_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+DEFAULT_TTL = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+_bypass = contextvars.ContextVar("llm_cache_bypass", default=False)
+
+
+@contextlib.contextmanager
+def bypass_cache(enabled: bool = True):
+    """Within this block (in this thread/context) LLM calls neither read nor fill the cache."""
+    token = _bypass.set(enabled)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def cache_key(model: str, messages: Any, tools: Any = None, temperature: Optional[float] = None) -> str:
+    payload = {"model": model, "messages": messages, "tools": tools, "temperature": temperature}
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    def __init__(
+        self,
+        path: Optional[Path] = DEFAULT_PATH,
+        memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttl: float = DEFAULT_TTL,
+    ):
+        self.path = Path(path) if path else None
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "bypassed": 0, "evictions": 0}
+
+    # -- storage ---------------------------------------------------------
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._db is None and self.path is not None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL, "
+                    "size INTEGER NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"LLM cache disabled on disk: {e}")
+                self.path = None
+                self._db = None
+        return self._db
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, response = entry
+                if now - created <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return response
+                del self._memory[key]
+
+            db = self._connect()
+            if db is not None:
+                row = db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    response, created = row
+                    if now - created <= self.ttl:
+                        db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+                        db.commit()
+                        self._remember(key, created, response)
+                        self._stats["disk_hits"] += 1
+                        return response
+                    db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    db.commit()
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key: str, response: str, model: Optional[str] = None):
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, response)
+            self._stats["stores"] += 1
+            db = self._connect()
+            if db is None:
+                return
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, len(response.encode("utf-8")), now, now),
+            )
+            self._evict(db, now)
+            db.commit()
+
+    def _remember(self, key: str, created: float, response: str):
+        self._memory[key] = (created, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self, db: sqlite3.Connection, now: float):
+        expired = db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,)).rowcount
+        self._stats["evictions"] += max(expired, 0)
+        (total,) = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used rows until the table fits again
+        freed = 0
+        doomed = []
+        for key, size in db.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            if total - freed <= self.max_bytes:
+                break
+            doomed.append((key,))
+            freed += size
+        db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self._stats["evictions"] += len(doomed)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            db = self._connect()
+            if db is not None:
+                db.execute("DELETE FROM responses")
+                db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            db = self._connect()
+            if db is not None:
+                stats["disk_entries"], stats["disk_bytes"] = db.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+                ).fetchone()
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def note_bypass(self):
+        with self._lock:
+            self._stats["bypassed"] += 1
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+# Global instance
+llm_cache = LLMResponseCache()
+
+_cached_classes: Dict[type, type] = {}
+
+
+def _cached_class(llm_class: type) -> type:
+    """Subclass of llm_class whose call() goes through the cache and is timed (isinstance checks still pass)."""
+    cached = _cached_classes.get(llm_class)
+    if cached is not None:
+        return cached
+
+    def call(self, messages, tools=None, *args, **kwargs):
+        model = getattr(self, "model", None)
+        with span("llm", str(model)) as attrs, usage_delta(self, attrs):
+            return _call(self, attrs, messages, tools, *args, **kwargs)
+
+    def _call(self, attrs, messages, tools, *args, **kwargs):
+        cache = self.__dict__.get("_response_cache") or llm_cache
+        if not ENABLED:
+            return llm_class.call(self, messages, *args, tools=tools, **kwargs)
+        if _bypass.get():
+            cache.note_bypass()
+            attrs["cache"] = "bypass"
+            return llm_class.call(self, messages, *args, tools=tools, **kwargs)
+        # Native tool execution and structured outputs can have effects or return objects
+        if kwargs.get("available_functions") or kwargs.get("response_model"):
+            return llm_class.call(self, messages, *args, tools=tools, **kwargs)
+        key = cache_key(getattr(self, "model", None), messages, tools, getattr(self, "temperature", None))
+        response = cache.get(key)
+        if response is not None:
+            attrs["cache"] = "hit"
+            return response
+        attrs["cache"] = "miss"
+        response = llm_class.call(self, messages, *args, tools=tools, **kwargs)
+        if isinstance(response, str) and response:
+            cache.put(key, response, getattr(self, "model", None))
+        return response
+
+    cached = type(f"Cached{llm_class.__name__}", (llm_class,), {"call": call, "__module__": __name__})
+    _cached_classes[llm_class] = cached
+    return cached
+
+
+def cached_llm(llm, cache: Optional[LLMResponseCache] = None):
+    """
+    Route llm.call() through the response cache and record each call as an
+    "llm" span (see metrics.py). Returns llm itself. With LLM_CACHE=0 calls are
+    still timed but always go to the provider.
+    """
+    if llm is None:
+        return llm
+    if type(llm) in _cached_classes.values():
+        return llm
+    llm.__class__ = _cached_class(type(llm))
+    if cache is not None:
+        llm.__dict__["_response_cache"] = cache
+    return llm
@@ -0,0 +1,99 @@
+"""
+Out-of-line storage for large activity log messages.
+
+Task outputs, final results and extracted code can be many kilobytes, and the
+activity feed would otherwise resend them in every poll or stream frame that
+covers them. AgentLogger.log() hands messages over LOG_INLINE_BYTES to a
+PayloadStore. The entry then carries only a preview of the first
+LOG_PREVIEW_CHARS characters, plus a reference:
+    {"message": "<preview>…", "payload": {"id": "<sha256>", "bytes": 48213}}
+The full text is served by GET /api/payloads/{id}. That endpoint supports HTTP
+Range requests for partial fetches (see file_server.py).
+
+Payloads are files named by the sha256 of their content, so the same text
+logged twice (e.g. by a job's logger and the global one) is stored once. The
+oldest files are deleted once the store holds more than LOG_PAYLOAD_MAX_BYTES.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+DEFAULT_DIR = Path(os.getenv("LOG_PAYLOAD_DIR", str(Path(__file__).resolve().parent / "logs" / "payloads")))
+INLINE_BYTES = int(os.getenv("LOG_INLINE_BYTES", "4096"))
+PREVIEW_CHARS = int(os.getenv("LOG_PREVIEW_CHARS", "500"))
+DEFAULT_MAX_BYTES = int(os.getenv("LOG_PAYLOAD_MAX_BYTES", str(256 * 1024 * 1024)))
+
+_ID_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class PayloadStore:
+    def __init__(self, root=DEFAULT_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._total: Optional[int] = None  # bytes on disk, computed on first put
+        self._lock = threading.Lock()
+
+    def put(self, text: str) -> Dict[str, object]:
+        """Store text; returns the reference {"id", "bytes"} for the log entry."""
+        data = text.encode("utf-8")
+        payload_id = hashlib.sha256(data).hexdigest()
+        path = self.path(payload_id)
+        with self._lock:
+            if self._total is None:
+                self._total = self._disk_usage()
+            try:
+                # Logged again: mark it recently used, as eviction goes oldest mtime first
+                os.utime(path)
+                exists = True
+            except FileNotFoundError:
+                exists = False
+            if not exists:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".incoming-")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+                self._total += len(data)
+                if self._total > self.max_bytes:
+                    self._evict(keep=path)
+        return {"id": payload_id, "bytes": len(data)}
+
+    def path(self, payload_id: str) -> Optional[Path]:
+        """File of a payload id, or None for a malformed id. The file may not exist."""
+        if not _ID_RE.match(payload_id):
+            return None
+        return self.root / payload_id[:2] / payload_id[2:]
+
+    def get(self, payload_id: str) -> Optional[str]:
+        path = self.path(payload_id)
+        try:
+            return path.read_text(encoding="utf-8") if path is not None else None
+        except FileNotFoundError:
+            return None
+
+    def _disk_usage(self) -> int:
+        return sum(entry.stat().st_size for entry in self.root.glob("*/*") if entry.is_file())
+
+    def _evict(self, keep: Path):
+        # Oldest first, down to 90% of the limit so this does not run on every put
+        files = sorted((entry for entry in self.root.glob("*/*") if entry.is_file()), key=lambda p: p.stat().st_mtime)
+        for entry in files:
+            if self._total <= self.max_bytes * 0.9:
+                break
+            if entry == keep:
+                continue
+            size = entry.stat().st_size
+            entry.unlink()
+            self._total -= size
+
+
+def preview(text: str, chars: int = PREVIEW_CHARS) -> str:
+    return text[:chars] + "…"
+
+
+# Global instance
+payload_store = PayloadStore()
@@ -1,36 +1,149 @@
+import json
+import os
+import threading
+from bisect import bisect_right
 from datetime import datetime
-from typing import List, Dict, Any
+from pathlib import Path
+from typing import Callable, List, Dict, Any, Optional
+
+from log_payloads import INLINE_BYTES, PayloadStore, payload_store, preview
+
+# Number of entries kept in memory. Older entries are evicted (and spilled to disk).
+DEFAULT_CAPACITY = int(os.getenv("AGENT_LOG_CAPACITY", "5000"))
+# Append-only JSONL segment that receives evicted entries
+DEFAULT_SPILL_PATH = Path(__file__).resolve().parent / "logs" / "activity_spill.jsonl"
+
 
 class AgentLogger:
-    def __init__(self):
-        self._logs: List[Dict[str, Any]] = []
+    """
+    Bounded, array-backed ring buffer of agent activity entries.
+
+    Every entry gets a monotonically increasing ``seq`` id. Entry ``seq`` lives in
+    slot ``(seq - 1) % capacity``, so reading the tail after a cursor is O(k) in the
+    number of new entries instead of a scan over the whole history.
+    """
 
-    def log(self, agent_role: str, message: str, message_type: str = "info"):
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, spill_path: Optional[Path] = None,
+                 payloads: Optional[PayloadStore] = None, inline_bytes: int = INLINE_BYTES):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self._capacity = capacity
+        self._buffer: List[Optional[Dict[str, Any]]] = [None] * capacity
+        self._first_seq = 1  # oldest seq still held in memory
+        self._next_seq = 1   # seq assigned to the next entry
+        self._lock = threading.Lock()
+        self._spill_path = Path(spill_path) if spill_path else None
+        self._spill_file = None
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        # Messages over inline_bytes are kept out of line (see log_payloads.py)
+        self.payloads = payloads
+        self.inline_bytes = inline_bytes
+
+    @property
+    def last_seq(self) -> int:
+        """Sequence id of the most recent entry (0 if nothing was logged yet)."""
+        return self._next_seq - 1
+
+    def log(self, agent_role: str, message: str, message_type: str = "info", job_id: str = None,
+            payload: Optional[Dict[str, Any]] = None):
         """
         Log an event from an agent.
-        message_type: 'info', 'thought', 'command', 'error'
+        message_type: 'info', 'thought', 'command', 'error', 'delta' (streamed LLM output, see token_stream.py)
+        job_id: set when the entry belongs to a scheduled job (see jobs.py)
+        payload: reference to a message already stored out of line, with message as its preview
         """
-        entry = {
-            "timestamp": datetime.now().isoformat(),
-            "role": agent_role,
-            "message": message,
-            "type": message_type
-        }
-        self._logs.append(entry)
-        # Keep only recent logs to avoid memory issues if strictly needed, 
-        # but for now let's keep all for the session.
-
-    def get_logs(self, after_timestamp: str = None) -> List[Dict[str, Any]]:
+        # Cheap length check first: a str of n chars encodes to at most 4n bytes
+        if payload is None and self.payloads is not None and len(message) * 4 > self.inline_bytes \
+                and len(message.encode("utf-8")) > self.inline_bytes:
+            payload = self.payloads.put(message)
+            message = preview(message)
+        with self._lock:
+            seq = self._next_seq
+            entry = {
+                "seq": seq,
+                "timestamp": datetime.now().isoformat(),
+                "role": agent_role,
+                "message": message,
+                "type": message_type
+            }
+            if job_id is not None:
+                entry["job"] = job_id
+            if payload is not None:
+                entry["payload"] = payload
+            slot = (seq - 1) % self._capacity
+            if seq - self._first_seq >= self._capacity:
+                # Buffer is full: the slot still holds the oldest entry
+                self._spill(self._buffer[slot])
+                self._first_seq += 1
+            self._buffer[slot] = entry
+            self._next_seq = seq + 1
+        # Notify outside the lock so listeners may read the buffer back
+        for listener in list(self._listeners):
+            try:
+                listener(entry)
+            except Exception as e:
+                print(f"Log listener failed: {e}")
+        return entry
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        """Register a callback invoked (from the logging thread) for every new entry."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def get_logs(self, after_timestamp: str = None, after_seq: int = None) -> List[Dict[str, Any]]:
         """
-        Get logs, optionally filtering by timestamp to get only new ones.
+        Get logs, optionally only the ones newer than a cursor.
+        ``after_seq`` is the preferred cursor; ``after_timestamp`` is kept for older clients.
         """
-        if not after_timestamp:
-            return self._logs
-        
-        return [log for log in self._logs if log["timestamp"] > after_timestamp]
+        with self._lock:
+            start = self._first_seq
+            if after_seq is not None:
+                start = max(start, after_seq + 1)
+            elif after_timestamp:
+                # Entries are appended in time order, so bisect instead of scanning
+                seqs = range(self._first_seq, self._next_seq)
+                idx = bisect_right(seqs, after_timestamp, key=lambda s: self._entry(s)["timestamp"])
+                start = self._first_seq + idx
+            return [self._entry(s) for s in range(start, self._next_seq)]
 
     def clear(self):
-        self._logs = []
+        # Sequence ids keep increasing so existing client cursors stay valid
+        with self._lock:
+            self._buffer = [None] * self._capacity
+            self._first_seq = self._next_seq
+
+    def _entry(self, seq: int) -> Dict[str, Any]:
+        return self._buffer[(seq - 1) % self._capacity]
+
+    def _spill(self, entry: Dict[str, Any]):
+        if self._spill_path is None or entry is None:
+            return
+        try:
+            if self._spill_file is None:
+                self._spill_path.parent.mkdir(parents=True, exist_ok=True)
+                self._spill_file = open(self._spill_path, "a", encoding="utf-8")
+            self._spill_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._spill_file.flush()
+        except OSError as e:
+            print(f"Failed to spill log entry: {e}")
+
+
+def read_spilled(spill_path: Path = DEFAULT_SPILL_PATH, after_seq: int = 0) -> List[Dict[str, Any]]:
+    """Read evicted entries back from an on-disk spill segment."""
+    path = Path(spill_path)
+    if not path.exists():
+        return []
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry["seq"] > after_seq:
+                entries.append(entry)
+    return entries
+
 
 # Global instance
-agent_logger = AgentLogger()
+agent_logger = AgentLogger(spill_path=DEFAULT_SPILL_PATH, payloads=payload_store)
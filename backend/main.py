@@ -1,5 +1,6 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+import json
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -18,334 +19,251 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Shared workspace shown in the file explorer; jobs run in their own copies under JOBS_DIR
+WORKSPACE_DIR = Path(__file__).resolve().parent / "workspace"
+JOBS_DIR = Path(__file__).resolve().parent / "jobs"
+# Import the CrewAI stack in the background at startup; with 0 it loads on the first agent job
+CREW_PREWARM = os.getenv("CREW_PREWARM", "1").lower() not in ("0", "false", "no", "off")
+
 @app.on_event("startup")
 async def startup_event():
     # Ensure workspace directory exists
-    workspace_path = Path(__file__).resolve().parent / "workspace"
+    workspace_path = WORKSPACE_DIR
     if not workspace_path.exists():
         workspace_path.mkdir(parents=True, exist_ok=True)
         print(f"Workspace directory initialized at: {workspace_path.absolute()}")
+    # Warm up the /api/run worker processes
+    code_executor.start()
+    # Change tracking for the file explorer; the initial scan hashes every file, so it
+    # runs in a worker thread (/api/files requests made meanwhile wait for it)
+    workspace_index.start(scan=False)
+    asyncio.get_running_loop().run_in_executor(None, workspace_index.rescan)
+    # Warm shells so the first terminal opens instantly
+    await terminal_sessions.start()
+    # Load CrewAI off the request path; startup does not wait for it
+    if CREW_PREWARM:
+        threading.Thread(target=prewarm_crew, name="crew-prewarm", daemon=True).start()
 
 from pydantic import BaseModel
 
-from fastapi import BackgroundTasks
+from fastapi import Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from logger import agent_logger
+from jobs import Job, JobManager, JobQueueFullError, RUNNING
+from executor import CodeExecutor
+from demo import run_demo
+from activity_stream import activity_broadcaster, DEFAULT_COALESCE_MS
+from workspace_index import WorkspaceIndex, register_index, notify_changed
+from file_server import resolve_workspace_path, serve_file
+from terminal_manager import TerminalSessionManager, TerminalSessionLimitError
 import asyncio
-from agents import create_agents
-from crewai import Crew, Process, Task
+import threading
+from llm_cache import llm_cache
+from providers import is_demo_mode
+from snapshots import SnapshotNotFoundError, snapshot_store
+from history import history_store
+from log_payloads import payload_store
+from metrics import registry as metrics_registry, span
+from task_graph import DEFAULT_PROCESS
+# CrewAI is not imported here: crew_runner loads it on the first agent job or in prewarm_crew
 
 class ChatRequest(BaseModel):
     message: str
-
-import re
-
-def extract_and_save_code_blocks(text: str, workspace_path: Path) -> list:
-    """
-    Extract code blocks from agent text output and save them as files.
-    This is a fallback for when agents output code as text
-    instead of using File Writer Tool.
-    
-    Returns list of saved filenames.
-    """
-    saved_files = []
-    
-    # Find all code blocks with language hints
-    pattern = r'```(\w+)?\n(.*?)```'
-    blocks = list(re.finditer(pattern, text, re.DOTALL))
-    
-    if not blocks:
-        return saved_files
-    
-    # Map of language to file extension
-    ext_map = {
-        'python': '.py',
-        'py': '.py',
-        'javascript': '.js',
-        'js': '.js',
-        'typescript': '.ts',
-        'ts': '.ts',
-        'html': '.html',
-        'css': '.css',
-        'json': '.json',
-        'yaml': '.yaml',
-        'yml': '.yml',
-        'markdown': '.md',
-        'md': '.md',
-        'txt': '.txt',
-        'sh': '.sh',
-        'bash': '.sh',
-        'sql': '.sql',
-    }
-    
-    for i, match in enumerate(blocks):
-        lang = (match.group(1) or '').lower()
-        content = match.group(2).strip()
-        
-        if not content or lang in ('', 'text', 'plaintext'):
-            continue
-        
-        # Skip non-code blocks (e.g. file structure diagrams)
-        if lang not in ext_map:
-            continue
-        
-        ext = ext_map[lang]
-        
-        # Try to detect filename from content
-        filename = None
-        
-        # Method 1: Look for filename in comments at the top
-        # e.g. "# filename: calculator.py" or "# calculator.py"
-        first_lines = content.split('\n')[:5]
-        for line in first_lines:
-            # Match patterns like: # calculator.py, # filename: calculator.py
-            fname_match = re.search(r'#\s*(?:filename:\s*)?(\w[\w\-]*\.\w+)', line, re.IGNORECASE)
-            if fname_match:
-                candidate = fname_match.group(1)
-                # Verify it has a reasonable extension
-                if '.' in candidate:
-                    filename = candidate
-                    break
-        
-        # Method 2: Look for module docstring hints
-        if not filename:
-            for line in first_lines:
-                # Match: """Calculator module...""" -> calculator.py
-                doc_match = re.search(r'["\']+(.*?module.*?|.*?for (?:the )?(\w+))', line, re.IGNORECASE)
-                if doc_match:
-                    break
-        
-        # Method 3: Look at text before the code block for filename
-        if not filename:
-            pre_text = text[:match.start()]
-            # Look for ### 3.1 main.py or similar headings
-            heading_match = re.findall(r'#+\s+(?:\d+\.?\d*\s+)?(\w[\w\-]*\.\w+)', pre_text)
-            if heading_match:
-                filename = heading_match[-1]  # Take the most recent match
-        
-        # Method 4: Look for "file: X" or "save as X" patterns before block
-        if not filename:
-            pre_text_short = text[max(0, match.start()-200):match.start()]
-            save_match = re.search(r'(?:file|save|create|ファイル)[\s:]*[`"]?(\w[\w\-]*\.\w+)', pre_text_short, re.IGNORECASE)
-            if save_match:
-                filename = save_match.group(1)
-        
-        # Fallback: generate a filename
-        if not filename:
-            # Try to detect from class/function names
-            class_match = re.search(r'class\s+(\w+)', content)
-            func_match = re.search(r'def\s+(\w+)', content)
-            
-            if class_match and ext == '.py':
-                # CamelCase to snake_case
-                name = class_match.group(1)
-                snake = re.sub(r'(?<!^)(?=[A-Z])', '_', name).lower()
-                filename = f"{snake}{ext}"
-            elif func_match and func_match.group(1) == 'main' and ext == '.py':
-                filename = f"main{ext}"
-            else:
-                filename = f"code_{i+1}{ext}"
-        
-        if filename:
-            # Clean up filename: strip absolute paths, current dir prefix, and "workspace/" prefix
-            filename = filename.replace('\\', '/')
-            filename = re.sub(r'^(\./|/|workspace/|/workspace/)', '', filename, flags=re.IGNORECASE)
-            # Ensure it's just a relative path now
-            filename = os.path.normpath(filename).replace('\\', '/')
-            if filename.startswith('../') or filename.startswith('/'):
-                 filename = os.path.basename(filename) # Safety: no traversal
-
-        # Don't overwrite if file already exists and has more content
-        filepath = workspace_path / filename
-        if filepath.exists():
-            existing_size = filepath.stat().st_size
-            if existing_size > 0 and existing_size >= len(content):
-                continue  # Skip - existing file is larger or equal
-        
-        # Save the file
-        try:
-            filepath.parent.mkdir(parents=True, exist_ok=True)
-            filepath.write_text(content, encoding='utf-8')
-            saved_files.append(filename)
-        except Exception as e:
-            agent_logger.log("System", f"Failed to auto-save {filename}: {e}", "error")
-    
-    return saved_files
-
-def run_agents(message: str):
-    """
-    Run CrewAI agents in background.
-    """
+    # Skip the LLM response cache for this request (always ask the provider)
+    no_cache: bool = False
+    # "sequential" or "graph" (parallel per-file tasks); defaults to AGENT_PROCESS
+    process: str | None = None
+
+def run_agents(*args, **kwargs):
+    """Run the agent team (crew_runner.run_agents), importing the crew stack on first use."""
+    from crew_runner import run_agents as run_crew
+    return run_crew(*args, **kwargs)
+
+def prewarm_crew():
+    """Import crew_runner (CrewAI, litellm, provider SDKs) so the first /api/chat does not pay for it."""
     try:
-        agent_logger.log("System", f"Starting agents with message: {message}", "info")
-        
-        # Check for API Key (Simple check for demo purposes)
-        import os
-        if not os.getenv("OPENAI_API_KEY") and not os.getenv("CREWAI_API_KEY") and not os.getenv("GOOGLE_API_KEY") and not os.getenv("ZHIPUAI_API_KEY"):
-            # Mock execution if no key is found to demonstrate UI
-            agent_logger.log("System", "Note: No API Key found in environment. Running in Demo Mode.", "warning")
-            asyncio.run(mock_agent_execution(message))
-            return
-
-        # Create agents
-        agents = create_agents()
-        
-        # Custom callback for steps
-        def step_callback(step_output):
-            thought = getattr(step_output, 'thought', '')
-            result = getattr(step_output, 'result', '')
-            
-            if thought:
-                agent_logger.log("Agent", f"Thinking: {thought}", "thought")
-            if result:
-                agent_logger.log("Agent", f"Action: {result}", "info")
-            if not thought and not result:
-                agent_logger.log("Agent", f"Working... {str(step_output)}", "info")
-
-        # Task callback - fires when each task completes
-        def make_task_callback(task_name):
-            def task_callback(output):
-                agent_logger.log(task_name, f"Task completed: {str(output)}", "success")
-                
-                # Post-process Coder output: extract code blocks and save to workspace
-                if task_name == "Coder":
-                    workspace_path = Path(__file__).resolve().parent / "workspace"
-                    saved = extract_and_save_code_blocks(str(output), workspace_path)
-                    if saved:
-                        agent_logger.log("System", 
-                            f"Auto-saved {len(saved)} file(s) from Coder output: {', '.join(saved)}", 
-                            "success")
-                    else:
-                        agent_logger.log("System", 
-                            "Note: No new files auto-saved (files may already exist from Tool usage).", 
-                            "info")
-            return task_callback
-
-        # Define Agents
-        architect = agents["architect"]
-        coder = agents["coder"]
-        tester = agents["tester"]
-
-        # Define Tasks
-        # 1. Architect: Design the solution
-        agent_logger.log("Architect", "Starting design phase...", "info")
-        design_task = Task(
-            description=(
-                f"ユーザーの要望: '{message}'\n\n"
-                "この要望を満たすために必要なファイル構成と実装方針を設計してください。\n\n"
-                "【重要】シンプルさを最優先すること。\n"
-                "- シンプルな要望には1〜2ファイルで十分です。過剰な設計は不要です。\n"
-                "- config.py, utils.py, tests/ などは本当に必要な場合のみ含めてください。\n"
-                "- 「シンプルなコード」と言われたら、1ファイルで完結させてください。\n\n"
-                "出力には以下を含めてください：\n"
-                "- 作成すべきファイル名の一覧\n"
-                "- 各ファイルの役割と概要"
-            ),
-            expected_output="ファイル構成と実装詳細を含む簡潔な設計書",
-            agent=architect,
-            callback=make_task_callback("Architect")
-        )
-
-        # 2. Coder: Implement the code
-        agent_logger.log("System", "Starting coding phase...", "info")
-        coding_task = Task(
-            description=(
-                "アーキテクトの設計に基づいて、実際に動作するコードを実装してください。\n\n"
-                "【絶対に守るルール】\n"
-                "コードは必ず File Writer Tool を使ってファイルに保存してください。\n"
-                "チャットにコードを貼り付けるだけでは不十分です。\n\n"
-                "【手順】\n"
-                "1. 設計書を確認する\n"
-                "2. 各ファイルのコードを作成する\n"
-                "3. File Writer Tool で各ファイルを保存する（filename, content, overwrite='true' を指定）\n"
-                "4. 最終出力に、保存したファイル名の一覧を記載する\n\n"
-                "【出力例】\n"
-                "以下のファイルをワークスペースに保存しました：\n"
-                "- example.py: メインプログラム\n"
-                "- utils.py: ユーティリティ関数"
-            ),
-            expected_output="File Writer Toolで保存したファイル名一覧と実装内容の要約",
-            agent=coder,
-            context=[design_task],
-            callback=make_task_callback("Coder")
-        )
-
-        # 3. Tester: Review the code
-        agent_logger.log("System", "Starting testing phase...", "info")
-        testing_task = Task(
-            description=(
-                "コーダーが作成したコードをレビューしてください。\n\n"
-                "【手順】\n"
-                "1. File Reader Tool でワークスペース内のファイルを読み込む\n"
-                "2. コードの論理的な誤り、セキュリティの問題、改善点を確認する\n"
-                "3. レビュー結果を出力する"
-            ),
-            expected_output="コードレビューレポートと改善提案",
-            agent=tester,
-            context=[coding_task],
-            callback=make_task_callback("Tester")
-        )
-
-        # Create Crew
-        crew = Crew(
-            agents=[architect, coder, tester],
-            tasks=[design_task, coding_task, testing_task],
-            process=Process.sequential,
-            verbose=True,
-            step_callback=step_callback,
-            memory=False
-        )
-        
-        agent_logger.log("System", "Crew assembling...", "info")
-        result = crew.kickoff()
-        agent_logger.log("System", f"Workflow complete!", "success")
-        agent_logger.log("Final Output", str(result), "success")
-        
-        # List workspace files as summary
-        workspace_path = (Path(__file__).resolve().parent / "workspace")
-        if workspace_path.exists():
-            ws_files = [f.name for f in workspace_path.iterdir() if f.is_file() and f.stat().st_size > 0]
-            if ws_files:
-                agent_logger.log("System", f"Workspace files: {', '.join(ws_files)}", "info")
-        
-        # Send first Python code block to editor (from any task output)
-        result_str = str(result)
-        code_match = re.search(r'```python\n(.*?)```', result_str, re.DOTALL)
-        if code_match:
-            code = code_match.group(1).strip()
-            agent_logger.log("System", code, "code")
-            agent_logger.log("System", "Code extracted and sent to editor.", "success")
-        
+        with span("startup", "crew_import"):
+            import crew_runner  # noqa: F401
     except Exception as e:
-        import traceback
-        agent_logger.log("System", f"Error during execution: {str(e)}\n{traceback.format_exc()}", "error")
+        print(f"Crew pre-warm failed: {e}")
 
-async def mock_agent_execution(message: str):
-    """
-    Simulate agent activity for demo purposes.
-    """
-    import time
-    time.sleep(1)
-    agent_logger.log("Architect", f"Analyzing request: '{message}'", "thought")
-    time.sleep(2)
-    agent_logger.log("Architect", "Identifying necessary components...", "thought")
-    time.sleep(2)
-    agent_logger.log("Architect", "Drafting architecture diagram...", "thought")
-    time.sleep(2)
-    agent_logger.log("Architect", "Decision: Use Python/FastAPI for backend.", "info")
-    time.sleep(1)
-    agent_logger.log("Architect", "Decision: Use React for frontend.", "info")
-    time.sleep(1)
-    agent_logger.log("System", "All tasks completed (Demo).", "success")
+def run_job(job: Job):
+    job.output = run_agents(job.message, job.logger, job.workspace_path, job.check_cancelled,
+               use_cache=not job.options.get("no_cache"),
+               process=job.options.get("process") or DEFAULT_PROCESS)
+
+async def run_demo_job(job: Job):
+    job.logger.log("System", f"Starting agents with message: {job.message}", "info")
+    job.logger.log("System", "Note: No API Key found in environment. Running in Demo Mode.", "warning")
+    await run_demo(job.message, job.logger, check_cancelled=job.check_cancelled)
+
+# Every activity entry and job state change is also written to the durable history (history.py)
+agent_logger.add_listener(history_store.record_log)
+job_manager = JobManager(run_job, shared_workspace=WORKSPACE_DIR, jobs_root=JOBS_DIR,
+                         snapshots=snapshot_store, history=history_store)
+
+code_executor = CodeExecutor(WORKSPACE_DIR)
+
+workspace_index = register_index(WorkspaceIndex(WORKSPACE_DIR))
+
+terminal_sessions = TerminalSessionManager()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    job_manager.shutdown()
+    code_executor.shutdown()
+    workspace_index.stop()
+    await terminal_sessions.shutdown()
+    history_store.close()
 
 @app.post("/api/chat")
-def chat(request: ChatRequest, background_tasks: BackgroundTasks):
-    # Start agent execution in background
-    background_tasks.add_task(run_agents, request.message)
-    return {"response": "Agents started working on your request."}
+async def chat(request: ChatRequest):
+    # Queue agent execution on the job worker pool; demo runs are timers on the event loop
+    try:
+        if is_demo_mode():
+            job = job_manager.submit(request.message, coroutine_runner=run_demo_job)
+        else:
+            job = job_manager.submit(request.message, options={"no_cache": request.no_cache, "process": request.process})
+    except JobQueueFullError as e:
+        return JSONResponse(status_code=429, content={"error": str(e)}, headers={"Retry-After": "5"})
+    return {"response": "Agents started working on your request.", "job_id": job.id}
+
+@app.get("/api/llm_cache")
+def get_llm_cache_stats():
+    """Hit/miss counters and size of the LLM response cache."""
+    return llm_cache.stats()
+
+@app.delete("/api/llm_cache")
+def clear_llm_cache():
+    llm_cache.clear()
+    return {"status": "success"}
+
+@app.get("/api/jobs")
+def list_jobs():
+    return {"jobs": [job.to_dict() for job in job_manager.list()]}
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found"})
+    return job.to_dict()
+
+@app.get("/api/jobs/{job_id}/timeline")
+def get_job_timeline(job_id: str):
+    """Timed spans of a job (tasks, steps, LLM and tool calls) with a per-kind summary."""
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found"})
+    return {"job_id": job.id, "status": job.status, **job.timeline.to_dict()}
+
+@app.get("/api/history/jobs")
+def list_job_history(limit: int = 50, before: str = None, status: str = None):
+    """Past jobs, newest first, across restarts. Page with before=<next_before>."""
+    return history_store.jobs(limit=limit, before=before, status=status)
+
+@app.get("/api/history/jobs/{job_id}")
+def get_job_history(job_id: str):
+    """A past job including its final output."""
+    job = history_store.job(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found"})
+    return job
+
+@app.get("/api/history/logs")
+def get_log_history(job: str = None, role: str = None, type: str = None, after_id: int = 0, limit: int = 200):
+    """Stored activity entries, oldest first, unaffected by /api/reset_logs. Page with after_id=<next_after_id>."""
+    return history_store.logs(job=job, role=role, type=type, after_id=after_id, limit=limit)
+
+@app.get("/api/snapshots")
+def list_snapshots(job_id: str = None):
+    """Workspace snapshots, oldest first; each job records one "before" and one "after"."""
+    return {"snapshots": snapshot_store.list(job_id)}
+
+@app.get("/api/snapshots/{old_id}/diff/{new_id}")
+def diff_snapshots(old_id: str, new_id: str):
+    try:
+        return snapshot_store.diff(old_id, new_id)
+    except SnapshotNotFoundError as e:
+        return JSONResponse(status_code=404, content={"error": f"Snapshot not found: {e.args[0]}"})
+
+@app.post("/api/snapshots/{snapshot_id}/restore")
+def restore_snapshot(snapshot_id: str):
+    """Roll the shared workspace back (or forward) to a snapshot; only differing files are touched."""
+    if any(job.status == RUNNING and not job.is_async for job in job_manager.list()):
+        return JSONResponse(status_code=409, content={"error": "Jobs are running; restore once they finish"})
+    try:
+        changes = snapshot_store.restore(snapshot_id, WORKSPACE_DIR)
+    except SnapshotNotFoundError as e:
+        return JSONResponse(status_code=404, content={"error": f"Snapshot not found: {e.args[0]}"})
+    return {"status": "success", **changes}
+
+@app.get("/api/metrics")
+def get_metrics():
+    """Span durations, token and byte counters of all runs, in the Prometheus text format."""
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/api/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found"})
+    return job.to_dict()
+
+@app.get("/api/jobs/{job_id}/activity")
+def get_job_activity(job_id: str, after_seq: int = None):
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found"})
+    return {"logs": job.logger.get_logs(after_seq=after_seq), "last_seq": job.logger.last_seq}
 
 @app.get("/api/activity")
-def get_activity(after: str = None):
-    return {"logs": agent_logger.get_logs(after)}
+def get_activity(after: str = None, after_seq: int = None):
+    return {"logs": agent_logger.get_logs(after, after_seq=after_seq), "last_seq": agent_logger.last_seq}
+
+@app.get("/api/payloads/{payload_id}")
+def get_payload(payload_id: str, request: Request):
+    """
+    Full text of a log message stored out of line (entries with a "payload" reference).
+    Supports Range requests, e.g. "Range: bytes=0-65535" for the first 64 KiB.
+    """
+    path = payload_store.path(payload_id)
+    if path is None or not path.is_file():
+        return JSONResponse(status_code=404, content={"error": "Payload not found"})
+    # The id is the content hash, so it doubles as a strong ETag
+    return serve_file(path, request, content_hash=payload_id)
+
+@app.websocket("/api/ws/activity")
+async def websocket_activity(websocket: WebSocket, after_seq: int = None, epoch: str = None,
+                             coalesce_ms: int = DEFAULT_COALESCE_MS):
+    """
+    Push activity log entries as they are written, as {"logs", "last_seq", "epoch"} frames.
+    Clients resume with ?after_seq=<last seen seq>&epoch=<epoch of that frame>; bursts are
+    batched per coalesce_ms. A cursor from another epoch (before a backend restart) gets
+    {"logs": [], "reset": true, "last_seq": 0, "epoch"} first; the client drops its entries
+    and receives the current log from the start.
+    """
+    await websocket.accept()
+    subscription = activity_broadcaster.subscribe(after_seq, coalesce_ms, epoch)
+    if subscription.reset:
+        await websocket.send_json({"logs": [], "reset": True, "last_seq": subscription.cursor,
+                                   "epoch": activity_broadcaster.epoch})
+    # Watch for the client going away while we are idle waiting for logs
+    disconnected = asyncio.ensure_future(websocket.receive())
+    try:
+        while True:
+            batch = asyncio.ensure_future(subscription.next_batch())
+            done, _ = await asyncio.wait({batch, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                batch.cancel()
+                break
+            await websocket.send_json({"logs": batch.result(), "last_seq": subscription.cursor,
+                                       "epoch": activity_broadcaster.epoch})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        subscription.close()
+        disconnected.cancel()
 
 class RunRequest(BaseModel):
     code: str
@@ -353,76 +271,100 @@ class RunRequest(BaseModel):
 
 @app.post("/api/reset_logs")
 async def reset_logs():
-    """Clear all agent activity logs."""
+    """Clear all agent activity logs (the durable history in history.py is kept)."""
     agent_logger.clear()
     return {"status": "success", "message": "Logs cleared"}
 
 @app.post("/api/run")
 def run_code(request: RunRequest):
     """
-    Execute Python code and return output.
-    WARNING: This is unsafe and should be sandboxed in production.
+    Execute Python code in an isolated worker process and return output.
+    Limits (wall time, CPU, memory) are configured through the RUN_* environment variables.
     """
-    import sys
-    from io import StringIO
-    import contextlib
+    return code_executor.run(request.code, request.input)
 
-    code = request.code
-    input_str = request.input
-    output_buffer = StringIO()
+@app.post("/api/run/stream")
+def run_code_stream(request: RunRequest):
+    """
+    Execute Python code and stream output as newline-delimited JSON frames:
+    {"type": "stdout"|"stderr", "data": ...} while running, then a final {"type": "exit", ...}.
+    """
+    frames = code_executor.run_stream(request.code, request.input)
+    return StreamingResponse(
+        (json.dumps(frame, ensure_ascii=False) + "\n" for frame in frames),
+        media_type="application/x-ndjson",
+    )
 
-    # Get absolute path to workspace
-    workspace_path = (Path(__file__).resolve().parent / "workspace").resolve()
-    str_workspace_path = str(workspace_path)
+@app.get("/api/files")
+def list_files(request: Request):
+    """
+    List all files in the workspace (paths relative to it, including subdirectories).
+    Served from the workspace index; the index version is the ETag.
+    """
+    etag = workspace_index.etag
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=workspace_index.listing_json(), media_type="application/json", headers={"ETag": etag})
 
+@app.websocket("/api/ws/files")
+async def websocket_files(websocket: WebSocket, version: int = None):
+    """
+    Push workspace changes. The first frame is a full snapshot
+    {"type": "snapshot", "version", "entries"} unless ?version=<last seen> can be
+    caught up from diff history; after that {"type": "diff", "version", "added",
+    "changed", "removed"} frames follow each change.
+    """
+    await websocket.accept()
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+    listener = lambda diff: loop.call_soon_threadsafe(changed.set)
+    workspace_index.add_listener(listener)
+    disconnected = asyncio.ensure_future(websocket.receive())
     try:
-        # Redirect stdout to capture print statements
-        # Redirect stdin to provide input
-        with contextlib.redirect_stdout(output_buffer):
-            # Prepare stdin
-            sys.stdin = StringIO(input_str)
-            
-            # Add workspace to sys.path if not present
-            path_added = False
-            if str_workspace_path not in sys.path:
-                sys.path.insert(0, str_workspace_path)
-                path_added = True
-            
-            try:
-                # Execute the code
-                exec(code, {'__name__': '__main__'})
-            finally:
-                # Remove workspace from sys.path if we added it
-                if path_added and str_workspace_path in sys.path:
-                    sys.path.remove(str_workspace_path)
-                # Reset stdin
-                sys.stdin = sys.__stdin__
-        
-        result = output_buffer.getvalue()
-        return {"status": "success", "output": result}
-        
-    except Exception as e:
-        # Reset stdin in case of error
-        sys.stdin = sys.__stdin__
-        return {"status": "error", "output": str(e)}
+        while True:
+            diffs = workspace_index.diffs_since(version) if version is not None else None
+            if diffs is None:
+                # Off the event loop: the first snapshot waits for the startup scan
+                version, entries = await loop.run_in_executor(None, workspace_index.snapshot)
+                await websocket.send_json({"type": "snapshot", "version": version, "entries": entries})
+            else:
+                for diff in diffs:
+                    await websocket.send_json({"type": "diff", **diff})
+                    version = diff["version"]
+            changed.clear()
+            if version != workspace_index.version:
+                continue
+            waiter = asyncio.ensure_future(changed.wait())
+            done, _ = await asyncio.wait({waiter, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                waiter.cancel()
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        workspace_index.remove_listener(listener)
+        disconnected.cancel()
 
-@app.get("/api/files")
-def list_files():
-    """List all files in the workspace."""
-    workspace_path = Path(".") / "workspace"
-    files = []
-    if workspace_path.exists():
-        for file_path in workspace_path.iterdir():
-            if file_path.is_file():
-                files.append(file_path.name)
-    return {"files": files}
-
-@app.get("/api/files/{filename}")
+@app.get("/api/raw/{path:path}")
+def read_raw_file(path: str, request: Request):
+    """
+    Raw bytes of a workspace file (nested paths allowed). Supports Range,
+    If-None-Match/If-Modified-Since and gzip/brotli via Accept-Encoding.
+    """
+    file_path = resolve_workspace_path(WORKSPACE_DIR, path)
+    if file_path is None or not file_path.is_file():
+        return JSONResponse(status_code=404, content={"error": "File not found"})
+    # Reuse the indexed content hash as ETag while the index is up to date for this file
+    entry = workspace_index.get(file_path.relative_to(workspace_index.root).as_posix())
+    stat = file_path.stat()
+    content_hash = entry["hash"] if entry and (entry["size"], entry["mtime"]) == (stat.st_size, stat.st_mtime) else None
+    return serve_file(file_path, request, content_hash)
+
+@app.get("/api/files/{filename:path}")
 def read_file(filename: str):
-    """Read a specific file from the workspace."""
-    safe_filename = Path(filename).name # Prevent directory traversal
-    file_path = Path(".") / "workspace" / safe_filename
-    if not file_path.exists():
+    """Read a specific file from the workspace as JSON. Prefer /api/raw for large files."""
+    file_path = resolve_workspace_path(WORKSPACE_DIR, filename) # Prevent directory traversal
+    if file_path is None or not file_path.is_file():
         return {"error": "File not found"}
     try:
         content = file_path.read_text(encoding="utf-8")
@@ -430,15 +372,15 @@ def read_file(filename: str):
     except Exception as e:
         return {"error": str(e)}
 
-@app.delete("/api/files/{filename}")
+@app.delete("/api/files/{filename:path}")
 def delete_file(filename: str):
     """Delete a specific file from the workspace."""
-    safe_filename = Path(filename).name # Prevent directory traversal
-    file_path = Path(".") / "workspace" / safe_filename
-    if not file_path.exists():
+    file_path = resolve_workspace_path(WORKSPACE_DIR, filename) # Prevent directory traversal
+    if file_path is None or not file_path.is_file():
         return {"error": "File not found"}
     try:
         file_path.unlink()
+        notify_changed(file_path)
         return {"status": "success", "message": f"Deleted {filename}"}
     except Exception as e:
         return {"error": str(e)}
@@ -447,27 +389,68 @@ def delete_file(filename: str):
 def read_root():
     return {"status": "ok"}
 
-from fastapi import WebSocket, WebSocketDisconnect
-# Import TerminalManager from the newly created file
-# Ensure terminal_manager.py is in the same directory or PYTHONPATH
-try:
-    from terminal_manager import TerminalManager
-except ImportError:
-    # Fallback if running from a different context, though safe_tools implies usage of sys.path
-    import sys
-    sys.path.append(str(Path(__file__).parent))
-    from terminal_manager import TerminalManager
-
 @app.websocket("/api/ws/terminal")
-async def websocket_terminal(websocket: WebSocket):
-    manager = TerminalManager()
-    await manager.connect(websocket)
+async def websocket_terminal(websocket: WebSocket, session: str = None):
+    """
+    Attach to a terminal session. ?session=<id> reattaches after a reload; the
+    first frame is a binary {"type": "session", "id", "resumed", "end_line"} control message.
+    Text frames are keystrokes for the shell. Binary frames carry JSON control
+    messages, currently {"type": "resize", "cols": ..., "rows": ...}.
+    """
+    await websocket.accept()
+    user = websocket.client.host if websocket.client else "local"
+    try:
+        terminal = await terminal_sessions.attach(websocket, session, user)
+    except TerminalSessionLimitError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
     try:
         while True:
-            data = await websocket.receive_text()
-            await manager.write(data)
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("text") is not None:
+                await terminal.write(message["text"])
+            elif message.get("bytes"):
+                control = json.loads(message["bytes"])
+                if control.get("type") == "resize":
+                    terminal.resize(int(control["cols"]), int(control["rows"]))
     except WebSocketDisconnect:
-        await manager.disconnect()
+        pass
     except Exception as e:
         print(f"WebSocket error: {e}")
-        await manager.disconnect()
+    finally:
+        # The shell keeps running; a reconnect with the same id picks it up again
+        terminal_sessions.detach(terminal, websocket)
+
+def _terminal_session(session_id: str, request: Request):
+    """The session if it exists and belongs to the requesting client, else None."""
+    terminal = terminal_sessions.get(session_id)
+    user = request.client.host if request.client else "local"
+    if terminal is None or terminal.owner != user:
+        return None
+    return terminal
+
+@app.get("/api/terminal/{session_id}/lines")
+async def read_terminal_lines(session_id: str, request: Request, start: int = 0, end: int = None):
+    """Raw output of lines [start, end) of a terminal session, for paging back through it."""
+    terminal = _terminal_session(session_id, request)
+    if terminal is None:
+        return JSONResponse(status_code=404, content={"error": "Terminal session not found"})
+    return terminal.log.read(start, end)
+
+@app.get("/api/terminal/{session_id}/search")
+async def search_terminal(session_id: str, request: Request, q: str, regex: bool = False,
+                          ignore_case: bool = False, start_line: int = None, limit: int = 100):
+    """Lines of a terminal session's output matching q (substring, or regex with regex=true)."""
+    terminal = _terminal_session(session_id, request)
+    if terminal is None:
+        return JSONResponse(status_code=404, content={"error": "Terminal session not found"})
+    # The shell reader appends on the event loop: copy the log here, then search the copy
+    # in a worker thread so a slow regex cannot stall the loop
+    log = terminal.log.snapshot()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, lambda: log.search(q, regex=regex, ignore_case=ignore_case, start_line=start_line, limit=limit))
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
@@ -0,0 +1,225 @@
+"""
+Timing, token and I/O instrumentation for agent runs.
+
+Code wraps the work it wants measured in span(kind, name). A span records its
+duration plus any counters added to it (tokens, bytes, cache hit), and goes to:
+- the Timeline of the current run (a context variable set by JobManager), which
+  /api/jobs/{id}/timeline returns as JSON
+- the process-wide MetricsRegistry, which /api/metrics renders in the
+  Prometheus text format
+
+Span kinds: workspace (job setup and publish), run, kickoff, task, step, llm,
+tool, autosave, scan, startup. CrewAI runs tasks and steps itself and only calls back
+when one finishes, so those are recorded with mark(), which closes a span that
+started at the previous mark of the same scope.
+"""
+import contextlib
+import contextvars
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Upper bounds (seconds) of the duration histogram buckets
+BUCKETS = (0.005, 0.025, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# Spans kept per timeline; later ones only update the summary
+MAX_SPANS = 5000
+
+# Counters a span may carry; they are summed per kind/name in the registry
+COUNTERS = ("prompt_tokens", "completion_tokens", "bytes_read", "bytes_written")
+
+
+class MetricsRegistry:
+    """Process-wide aggregates of every finished span."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._durations: Dict[Tuple[str, str], List[float]] = {}  # (kind, name) -> [count, sum, *buckets]
+        self._counters: Dict[Tuple[str, str, str], float] = defaultdict(float)  # (counter, kind, name)
+        self._cache: Dict[Tuple[str, str], int] = defaultdict(int)  # (kind, result)
+
+    def observe(self, kind: str, name: str, seconds: float, attrs: Dict[str, Any]):
+        with self._lock:
+            stats = self._durations.get((kind, name))
+            if stats is None:
+                stats = self._durations[(kind, name)] = [0, 0.0] + [0] * len(BUCKETS)
+            stats[0] += 1
+            stats[1] += seconds
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    stats[2 + i] += 1
+            for counter in COUNTERS:
+                if attrs.get(counter):
+                    self._counters[(counter, kind, name)] += attrs[counter]
+            if "cache" in attrs:
+                self._cache[(kind, attrs["cache"])] += 1
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = [
+            "# HELP agent_span_duration_seconds Duration of instrumented agent work.",
+            "# TYPE agent_span_duration_seconds histogram",
+        ]
+        with self._lock:
+            durations = {key: list(stats) for key, stats in self._durations.items()}
+            counters = dict(self._counters)
+            cache = dict(self._cache)
+        for (kind, name), stats in sorted(durations.items()):
+            labels = f'kind="{_escape(kind)}",name="{_escape(name)}"'
+            for bound, count in zip(BUCKETS, stats[2:]):
+                lines.append(f'agent_span_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'agent_span_duration_seconds_bucket{{{labels},le="+Inf"}} {stats[0]}')
+            lines.append(f"agent_span_duration_seconds_sum{{{labels}}} {stats[1]:.6f}")
+            lines.append(f"agent_span_duration_seconds_count{{{labels}}} {stats[0]}")
+        for counter in COUNTERS:
+            metric = f"agent_{counter}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for (name_, kind, name), value in sorted(counters.items()):
+                if name_ == counter:
+                    lines.append(f'{metric}{{kind="{_escape(kind)}",name="{_escape(name)}"}} {value:g}')
+        lines.append("# TYPE agent_cache_lookups_total counter")
+        for (kind, result), value in sorted(cache.items()):
+            lines.append(f'agent_cache_lookups_total{{kind="{_escape(kind)}",result="{_escape(result)}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+class Timeline:
+    """Spans of one run, with times relative to its start."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.spans: List[Dict[str, Any]] = []
+        self.dropped = 0
+        self._marks: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, kind: str, name: str, start: float, seconds: float, attrs: Dict[str, Any]):
+        span = {
+            "kind": kind,
+            "name": name,
+            "start_ms": round((start - self.started) * 1000, 1),
+            "duration_ms": round(seconds * 1000, 1),
+            "thread": threading.current_thread().name,
+            **attrs,
+        }
+        with self._lock:
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+
+    def mark(self, kind: str, name: str, scope: Optional[str] = None, **attrs):
+        """
+        Record a span from the previous mark in scope (or the start) until now.
+        Used for work CrewAI runs between callbacks, such as a step or a task.
+        """
+        scope = scope or kind
+        now = time.monotonic()
+        with self._lock:
+            start = self._marks.get(scope, self.started)
+            self._marks[scope] = now
+        _record(self, kind, name, start, now - start, attrs)
+
+    def reset_mark(self, scope: str):
+        with self._lock:
+            self._marks[scope] = time.monotonic()
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = list(self.spans)
+        summary: Dict[str, Dict[str, float]] = {}
+        for span in spans:
+            entry = summary.setdefault(span["kind"], {"count": 0, "duration_ms": 0.0})
+            entry["count"] += 1
+            entry["duration_ms"] = round(entry["duration_ms"] + span["duration_ms"], 1)
+            for counter in COUNTERS:
+                if span.get(counter):
+                    entry[counter] = entry.get(counter, 0) + span[counter]
+        return {"spans": spans, "summary": summary, "dropped": self.dropped}
+
+
+registry = MetricsRegistry()
+_current: contextvars.ContextVar = contextvars.ContextVar("metrics_timeline", default=None)
+
+
+def current_timeline() -> Optional[Timeline]:
+    return _current.get()
+
+
+@contextlib.contextmanager
+def use_timeline(timeline: Optional[Timeline]):
+    """Send spans recorded in this context (and tasks copied from it) to timeline."""
+    token = _current.set(timeline)
+    try:
+        yield timeline
+    finally:
+        _current.reset(token)
+
+
+@contextlib.contextmanager
+def span(kind: str, name: str, **attrs):
+    """
+    Time the block. Yields the attribute dict, so the block can add counters:
+        with span("tool", "File Reader Tool") as s:
+            s["bytes_read"] = len(data)
+    A span whose block raised gets error=<exception type>.
+    """
+    start = time.monotonic()
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs["error"] = type(e).__name__
+        raise
+    finally:
+        _record(_current.get(), kind, name, start, time.monotonic() - start, attrs)
+
+
+def mark(kind: str, name: str, scope: Optional[str] = None, **attrs):
+    """Timeline.mark on the current timeline, if there is one."""
+    timeline = _current.get()
+    if timeline is not None:
+        timeline.mark(kind, name, scope, **attrs)
+
+
+def reset_marks(*scopes: str):
+    """Start the next mark of each scope now, e.g. right before a crew kickoff."""
+    timeline = _current.get()
+    if timeline is not None:
+        for scope in scopes:
+            timeline.reset_mark(scope)
+
+
+def usage_counters(usage) -> Dict[str, int]:
+    """prompt/completion token counts of a CrewAI UsageMetrics object or token usage dict."""
+    counters = {}
+    for counter in ("prompt_tokens", "completion_tokens"):
+        value = usage.get(counter) if isinstance(usage, dict) else getattr(usage, counter, None)
+        if isinstance(value, int) and value > 0:
+            counters[counter] = value
+    return counters
+
+
+@contextlib.contextmanager
+def usage_delta(llm, attrs: Dict[str, Any]):
+    """
+    Add the tokens llm reports for the block to attrs. CrewAI LLMs keep a running
+    _token_usage total; an LLM shared by concurrent calls makes the split approximate.
+    """
+    before = usage_counters(dict(getattr(llm, "_token_usage", None) or {}))
+    try:
+        yield
+    finally:
+        after = usage_counters(dict(getattr(llm, "_token_usage", None) or {}))
+        for counter, value in after.items():
+            if value > before.get(counter, 0):
+                attrs[counter] = value - before.get(counter, 0)
+
+
+def _record(timeline: Optional[Timeline], kind: str, name: str, start: float, seconds: float, attrs: Dict[str, Any]):
+    registry.observe(kind, name, seconds, attrs)
+    if timeline is not None:
+        timeline.add(kind, name, start, seconds, attrs)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
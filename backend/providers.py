@@ -0,0 +1,91 @@
+"""
+LLM provider selection from the environment and backend/.env.
+
+Kept apart from agents.py so the API can tell whether a key is configured
+(demo mode) without importing CrewAI, which takes seconds.
+"""
+import hashlib
+import os
+import threading
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+
+env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
+
+
+def select_provider() -> dict:
+    """
+    Pick the LLM provider from the current environment.
+    Priority: ZhiPu AI GLM > Google Gemini > OpenAI
+    """
+    zhipuai_key = os.getenv("ZHIPUAI_API_KEY")
+    google_key = os.getenv("GOOGLE_API_KEY")
+
+    if zhipuai_key and not str(zhipuai_key).startswith("#"):
+        # Use ZhiPu AI GLM via OpenAI-compatible API
+        return {
+            "label": "ZhiPu AI (GLM)",
+            "model": "GLM-4.5-Flash",
+            "api_key": zhipuai_key,
+            "base_url": "https://open.bigmodel.cn/api/paas/v4/",
+        }
+    elif google_key:
+        # Use Google Gemini as fallback
+        return {"label": "Google Gemini", "model": "gemini/gemini-2.0-flash", "api_key": google_key}
+    # CrewAI default (OpenAI); no explicit LLM is passed to the agents
+    return {"label": "OpenAI", "model": None, "api_key": os.getenv("OPENAI_API_KEY")}
+
+
+def provider_fingerprint(provider: dict) -> str:
+    """Stable id for a provider config that never contains the raw API key."""
+    key_hash = hashlib.sha256((provider.get("api_key") or "").encode("utf-8")).hexdigest()[:16]
+    return f"{provider['model']}|{provider.get('base_url', '')}|{key_hash}"
+
+
+class EnvWatcher:
+    """Reloads a .env file into os.environ, but only when its content changed."""
+
+    def __init__(self, env_file: str = env_path):
+        self.env_file = env_file
+        self._stat: Optional[Tuple[int, int]] = None
+        self._hash: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def refresh(self) -> bool:
+        """Re-read the file if its mtime or size changed. Returns True when the content changed."""
+        with self._lock:
+            try:
+                stat = os.stat(self.env_file)
+                env_stat = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                env_stat = None
+            if env_stat == self._stat:
+                return False
+            self._stat = env_stat
+            content = b""
+            if env_stat is not None:
+                with open(self.env_file, "rb") as f:
+                    content = f.read()
+            env_hash = hashlib.sha256(content).hexdigest()
+            if env_hash == self._hash:
+                return False
+            self._hash = env_hash
+            if env_stat is not None:
+                load_dotenv(self.env_file, override=True)
+            return True
+
+    def reset(self):
+        with self._lock:
+            self._stat = self._hash = None
+
+
+def is_demo_mode() -> bool:
+    """True when no LLM API key is configured; requests are then answered by demo.py scripts."""
+    # Pick up .env edits (cheap stat unless the file changed)
+    env_watcher.refresh()
+    return not any(os.getenv(name) for name in ("OPENAI_API_KEY", "CREWAI_API_KEY", "GOOGLE_API_KEY", "ZHIPUAI_API_KEY"))
+
+
+# Global instance
+env_watcher = EnvWatcher()
@@ -7,6 +7,12 @@ from typing import Any
 from crewai.tools import BaseTool
 from pydantic import BaseModel
 
+from file_writer import (
+    BLOCKED, CHANGED_STATES, EXISTS, FAILED, UNCHANGED, resolve_in_workspace, summarize, write_file, write_files,
+)
+from metrics import span
+from workspace_reader import DEFAULT_MAX_BYTES, MAX_LIST_ENTRIES, reader_for
+
 
 class SafeFileWriterInput(BaseModel):
     filename: str
@@ -15,10 +21,17 @@ class SafeFileWriterInput(BaseModel):
     content: str
 
 
+def _as_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.lower() in ("y", "yes", "t", "true", "on", "1")
+    return bool(value)
+
+
 class SafeFileWriterTool(BaseTool):
     """
     A file writer tool that enforces all writes to stay within a designated
     workspace directory. Prevents path traversal attacks (e.g. ../../main.py).
+    Writes go through file_writer, so identical content is not rewritten.
     """
     name: str = "File Writer Tool"
     description: str = (
@@ -30,110 +43,194 @@ class SafeFileWriterTool(BaseTool):
     workspace_path: str = ""
 
     def _run(self, **kwargs: Any) -> str:
+        with span("tool", self.name) as attrs:
+            return self._write(attrs, **kwargs)
+
+    def _write(self, attrs: dict, **kwargs: Any) -> str:
         try:
             filename = kwargs["filename"]
             content = kwargs["content"]
             directory = kwargs.get("directory")
-            overwrite = kwargs.get("overwrite", False)
-
-            # Convert overwrite to boolean
-            if isinstance(overwrite, str):
-                overwrite = overwrite.lower() in ("y", "yes", "t", "true", "on", "1")
+            overwrite = _as_bool(kwargs.get("overwrite", False))
 
             # Handle "null" or "None" string for directory
             if isinstance(directory, str) and directory.lower() in ("null", "none"):
                 directory = None
-
-            # Resolve the workspace absolute path
-            workspace_abs = os.path.abspath(self.workspace_path)
-
-            # If a directory is provided, treat it as relative to workspace
             if directory:
-                # Strip any leading slashes or drive letters to force relative path
-                directory = directory.lstrip("/\\")
-                # Remove any drive letter (e.g., C:)
-                if len(directory) >= 2 and directory[1] == ":":
-                    directory = directory[2:].lstrip("/\\")
-                target_dir = os.path.join(workspace_abs, directory)
-            else:
-                target_dir = workspace_abs
-
-            # Construct the full file path
-            filepath = os.path.join(target_dir, filename)
-
-            # SECURITY: Resolve to absolute path and verify it's within workspace
-            filepath_abs = os.path.abspath(filepath)
-            if not filepath_abs.startswith(workspace_abs + os.sep) and filepath_abs != workspace_abs:
+                # The directory is workspace-relative, like the filename
+                filename = os.path.join(directory, filename)
+
+            result = write_file(self.workspace_path, filename, content, overwrite)
+            filepath_abs = resolve_in_workspace(self.workspace_path, filename)
+            if result.status in CHANGED_STATES:
+                attrs["bytes_written"] = len(content.encode("utf-8"))
+            if result.status == BLOCKED:
+                workspace_abs = os.path.abspath(self.workspace_path)
                 return (
-                    f"BLOCKED: Path '{filepath_abs}' is outside the workspace directory "
+                    f"BLOCKED: Path '{filename}' is outside the workspace directory "
                     f"'{workspace_abs}'. All file operations must stay within the workspace."
                 )
-
-            # Create the target directory if it doesn't exist
-            target_dir_abs = os.path.dirname(filepath_abs)
-            if not os.path.exists(target_dir_abs):
-                os.makedirs(target_dir_abs, exist_ok=True)
-
-            # Check if file exists and overwrite is not allowed
-            if os.path.exists(filepath_abs) and not overwrite:
+            if result.status == EXISTS:
                 return f"File {filepath_abs} already exists and overwrite option was not passed."
-
-            # Write content to the file
-            mode = "w" if overwrite else "x"
-            with open(filepath_abs, mode) as file:
-                file.write(content)
+            if result.status == UNCHANGED:
+                return f"File {filepath_abs} already has this content; nothing was written."
+            if result.status == FAILED:
+                return f"An error occurred while writing to the file: {result.detail}"
             return f"Content successfully written to {filepath_abs}"
 
-        except FileExistsError:
-            return f"File already exists and overwrite option was not passed."
         except Exception as e:
             return f"An error occurred while writing to the file: {e!s}"
 
 
+class FileSpec(BaseModel):
+    path: str
+    content: str
+
+
+class SafeMultiFileWriterInput(BaseModel):
+    files: list[FileSpec]
+    overwrite: str | bool = True
+
+
+class SafeMultiFileWriterTool(BaseTool):
+    """
+    Batch variant of SafeFileWriterTool: a whole set of files in one tool call,
+    written all-or-nothing, with a report of what changed.
+    """
+    name: str = "Multi File Writer Tool"
+    description: str = (
+        "A tool to write several files to the workspace in one call. "
+        "Accepts files, a list of {path, content} with paths relative to the workspace, "
+        "and an optional overwrite flag (default true). "
+        "Reports which files were created, updated or already up to date."
+    )
+    args_schema: type[BaseModel] = SafeMultiFileWriterInput
+    workspace_path: str = ""
+
+    def _run(self, **kwargs: Any) -> str:
+        with span("tool", self.name) as attrs:
+            return self._write_many(attrs, **kwargs)
+
+    def _write_many(self, attrs: dict, **kwargs: Any) -> str:
+        try:
+            files = []
+            for spec in kwargs["files"]:
+                if isinstance(spec, BaseModel):
+                    spec = spec.model_dump()
+                files.append((spec["path"], spec["content"]))
+            overwrite = _as_bool(kwargs.get("overwrite", True))
+            results = write_files(self.workspace_path, files, overwrite)
+            contents = dict(files)  # a later entry for a path replaces an earlier one
+            attrs["bytes_written"] = sum(
+                len(contents[result.path].encode("utf-8")) for result in results if result.status in CHANGED_STATES
+            )
+            return summarize(results)
+        except Exception as e:
+            return f"An error occurred while writing the files: {e!s}"
+
+
 class SafeFileReaderInput(BaseModel):
     file_path: str
+    start_line: int | None = None
+    end_line: int | None = None
+    mode: str = "full"
+    lines: int | None = None
+    max_bytes: int | None = None
 
 
 class SafeFileReaderTool(BaseTool):
     """
     A file reader tool that enforces all reads to stay within a designated
-    workspace directory.
+    workspace directory. Reads are served from the workspace's shared
+    WorkspaceReader cache and can be limited to part of the file.
     """
     name: str = "File Reader Tool"
     description: str = (
         "A tool to read the contents of a file from the workspace. "
-        "Provide the file path relative to the workspace directory."
+        "Provide the file path relative to the workspace directory. "
+        "Optionally pass start_line/end_line (1-based, inclusive) to read part of the file, "
+        "mode 'head' or 'tail' with lines=N for the first or last N lines, "
+        "mode 'outline' for the top-level definitions with line numbers, "
+        "and max_bytes to limit the size of the result."
     )
     args_schema: type[BaseModel] = SafeFileReaderInput
     workspace_path: str = ""
 
     def _run(self, **kwargs: Any) -> str:
+        with span("tool", self.name) as attrs:
+            return self._read(attrs, **kwargs)
+
+    def _read(self, attrs: dict, **kwargs: Any) -> str:
         try:
             file_path = kwargs["file_path"]
 
-            # Resolve the workspace absolute path
-            workspace_abs = os.path.abspath(self.workspace_path)
-
-            # Strip any leading slashes or drive letters to force relative path
-            file_path = file_path.lstrip("/\\")
-            if len(file_path) >= 2 and file_path[1] == ":":
-                file_path = file_path[2:].lstrip("/\\")
-
-            # Construct the full file path
-            filepath_abs = os.path.abspath(os.path.join(workspace_abs, file_path))
-
             # SECURITY: Verify it's within workspace
-            if not filepath_abs.startswith(workspace_abs + os.sep) and filepath_abs != workspace_abs:
+            filepath_abs = resolve_in_workspace(self.workspace_path, file_path)
+            if filepath_abs is None:
+                workspace_abs = os.path.abspath(self.workspace_path)
                 return (
-                    f"BLOCKED: Path '{filepath_abs}' is outside the workspace directory "
+                    f"BLOCKED: Path '{file_path}' is outside the workspace directory "
                     f"'{workspace_abs}'. All file operations must stay within the workspace."
                 )
 
-            if not os.path.exists(filepath_abs):
+            if not filepath_abs.is_file():
                 return f"File not found: {filepath_abs}"
 
-            with open(filepath_abs, "r", encoding="utf-8") as file:
-                return file.read()
+            reader = reader_for(self.workspace_path)
+            rel_path = reader.relative(filepath_abs)
+            if rel_path is None:
+                # Through a symlinked directory that points out of the workspace
+                return f"BLOCKED: Path '{file_path}' resolves outside the workspace directory."
+            text = reader.read(
+                rel_path,
+                start_line=kwargs.get("start_line"),
+                end_line=kwargs.get("end_line"),
+                mode=kwargs.get("mode") or "full",
+                lines=kwargs.get("lines"),
+                max_bytes=kwargs.get("max_bytes") or DEFAULT_MAX_BYTES,
+            )
+            attrs["bytes_read"] = len(text.encode("utf-8"))
+            return text
 
         except Exception as e:
             return f"An error occurred while reading the file: {e!s}"
+
+
+class SafeDirectoryListInput(BaseModel):
+    pattern: str | None = None
+    directory: str | None = None
+
+
+class SafeDirectoryListTool(BaseTool):
+    """Lists workspace files from the cached workspace tree, without reading them."""
+    name: str = "Workspace List Tool"
+    description: str = (
+        "A tool to list the files in the workspace with their sizes. "
+        "Optionally pass a glob pattern (e.g. '*.py', 'src/**/*.js') "
+        "and a subdirectory to list."
+    )
+    args_schema: type[BaseModel] = SafeDirectoryListInput
+    workspace_path: str = ""
+
+    def _run(self, **kwargs: Any) -> str:
+        with span("tool", self.name) as attrs:
+            return self._list(attrs, **kwargs)
+
+    def _list(self, attrs: dict, **kwargs: Any) -> str:
+        try:
+            directory = kwargs.get("directory")
+            if isinstance(directory, str) and directory.lower() in ("null", "none", "."):
+                directory = None
+            if directory and resolve_in_workspace(self.workspace_path, directory) is None:
+                return f"BLOCKED: Directory '{directory}' is outside the workspace directory."
+
+            files = reader_for(self.workspace_path).list(kwargs.get("pattern"), directory)
+            if not files:
+                return "No matching files in the workspace."
+            lines = [f"{path} ({size} bytes)" for path, size in files[:MAX_LIST_ENTRIES]]
+            if len(files) > MAX_LIST_ENTRIES:
+                lines.append(f"... {len(files) - MAX_LIST_ENTRIES} more; narrow the pattern or directory")
+            return "\n".join(lines)
+
+        except Exception as e:
+            return f"An error occurred while listing the workspace: {e!s}"
@@ -0,0 +1,348 @@
+"""
+Content-addressed snapshots of workspaces.
+
+File contents are stored once per distinct content under SNAPSHOT_DIR/objects,
+named by their sha256. A snapshot is a manifest mapping workspace-relative paths
+to (sha256, size); it is saved as SNAPSHOT_DIR/manifests/<id>.json.
+
+- snapshot() only hashes files whose size or mtime changed since the last
+  snapshot or materialize() of the same directory; the rest reuse their hash.
+- materialize() builds a directory from a snapshot with hard links to the
+  stored objects (SNAPSHOT_LINK_MODE=copy makes copies, reflinked where the
+  filesystem supports it). Objects are read-only, and our writers replace files
+  instead of writing into them, so a job never changes a stored object.
+- diff() compares two manifests without reading any file, and restore() only
+  touches the files that differ.
+
+JobManager records a "before" snapshot of the shared workspace when a job starts
+(its workspace is materialized from it) and an "after" snapshot of the job
+workspace once the agents finish; restoring "before" undoes a run.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl  # POSIX only
+except ImportError:  # Windows
+    fcntl = None
+
+from workspace_index import IGNORED_DIRS, notify_changed
+
+DEFAULT_DIR = Path(os.getenv("SNAPSHOT_DIR", str(Path(__file__).resolve().parent / "cache" / "snapshots")))
+# Snapshots kept; older ones and objects only they referenced are deleted
+DEFAULT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "200"))
+LINK_MODE = os.getenv("SNAPSHOT_LINK_MODE", "hardlink")
+
+_FICLONE = 0x40049409  # Linux ioctl: share the source's extents (btrfs, xfs)
+_CHUNK = 1024 * 1024
+
+
+class SnapshotNotFoundError(KeyError):
+    pass
+
+
+class SnapshotStore:
+    def __init__(self, root=DEFAULT_DIR, keep: int = DEFAULT_KEEP, link_mode: str = LINK_MODE):
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.manifests = self.root / "manifests"
+        self.keep = keep
+        self.link_mode = link_mode
+        self._headers: Optional[Dict[str, dict]] = None
+        self._files: Dict[str, Dict[str, Tuple[str, int]]] = {}  # id -> manifest files, recently used
+        # directory -> rel path -> (size, mtime_ns, sha256), from its last snapshot or materialize
+        self._stats: Dict[str, Dict[str, Tuple[int, int, str]]] = {}
+        self._active = 0
+        self._lock = threading.RLock()
+
+    # -- snapshots ---------------------------------------------------------
+
+    def snapshot(self, workspace, label: str = "", job_id: Optional[str] = None) -> dict:
+        """Record the current content of workspace. Returns the snapshot header."""
+        workspace = Path(workspace)
+        key = os.path.abspath(workspace)
+        with self._lock:
+            known = self._stats.get(key, {})
+            self._active += 1  # objects stored below are not referenced by a manifest yet
+        files: Dict[str, Tuple[str, int]] = {}
+        stats: Dict[str, Tuple[int, int, str]] = {}
+        hashed = 0
+        try:
+            for rel, stat in _walk(workspace):
+                cached = known.get(rel)
+                # Unchanged size and mtime: reuse the hash, as long as the object was not pruned
+                if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime_ns) \
+                        and self._object(cached[2]).exists():
+                    sha = cached[2]
+                else:
+                    sha = self._store(workspace / rel)
+                    hashed += 1
+                files[rel] = (sha, stat.st_size)
+                stats[rel] = (stat.st_size, stat.st_mtime_ns, sha)
+        except BaseException:
+            with self._lock:
+                self._active -= 1
+            raise
+
+        header = {
+            "id": uuid.uuid4().hex[:12],
+            "label": label,
+            "job_id": job_id,
+            "workspace": key,
+            "created": time.time(),
+            "files": len(files),
+            "bytes": sum(size for _, size in files.values()),
+            "hashed": hashed,
+        }
+        self.manifests.mkdir(parents=True, exist_ok=True)
+        _write_json(self.manifests / f"{header['id']}.json", {**header, "manifest": files})
+        with self._lock:
+            self._active -= 1
+            self._stats[key] = stats
+            self._load_headers()[header["id"]] = header
+            self._remember(header["id"], files)
+            self._prune()
+        return header
+
+    def list(self, job_id: Optional[str] = None) -> List[dict]:
+        """Snapshot headers, oldest first."""
+        with self._lock:
+            headers = list(self._load_headers().values())
+        if job_id is not None:
+            headers = [header for header in headers if header["job_id"] == job_id]
+        return sorted(headers, key=lambda header: header["created"])
+
+    def get(self, snapshot_id: str) -> dict:
+        with self._lock:
+            header = self._load_headers().get(snapshot_id)
+        if header is None:
+            raise SnapshotNotFoundError(snapshot_id)
+        return header
+
+    def files(self, snapshot_id: str) -> Dict[str, Tuple[str, int]]:
+        """rel path -> (sha256, size) of a snapshot."""
+        self.get(snapshot_id)
+        with self._lock:
+            files = self._files.get(snapshot_id)
+            if files is not None:
+                return files
+        try:
+            files = self._read_manifest(snapshot_id)
+        except (OSError, ValueError):
+            raise SnapshotNotFoundError(snapshot_id)
+        with self._lock:
+            self._remember(snapshot_id, files)
+        return files
+
+    def diff(self, old_id: str, new_id: str) -> Dict[str, List[str]]:
+        """Paths added, modified and deleted going from snapshot old_id to new_id."""
+        return _diff(self.files(old_id), self.files(new_id))
+
+    # -- building directories ------------------------------------------------
+
+    def materialize(self, snapshot_id: str, target) -> int:
+        """Create the files of a snapshot under target (which should be empty). Returns the file count."""
+        target = Path(target)
+        files = self.files(snapshot_id)
+        stats: Dict[str, Tuple[int, int, str]] = {}
+        target.mkdir(parents=True, exist_ok=True)
+        for rel, (sha, _) in files.items():
+            dest = target / rel
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            self._link(self._object(sha), dest)
+            stat = dest.stat()
+            stats[rel] = (stat.st_size, stat.st_mtime_ns, sha)
+        with self._lock:
+            self._stats[os.path.abspath(target)] = stats
+        return len(files)
+
+    def restore(self, snapshot_id: str, workspace) -> Dict[str, List[str]]:
+        """
+        Make workspace match a snapshot: only files that differ are written or
+        deleted. Returns what changed, relative to the workspace's current state.
+        """
+        workspace = Path(workspace)
+        files = self.files(snapshot_id)
+        current = self.snapshot(workspace, label="before restore")
+        changes = _diff(self.files(current["id"]), files)
+        key = os.path.abspath(workspace)
+        with self._lock:
+            stats = dict(self._stats.get(key, {}))
+        for rel in changes["added"] + changes["modified"]:
+            dest = workspace / rel
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            copy_file(self._object(files[rel][0]), dest)
+            stat = dest.stat()
+            stats[rel] = (stat.st_size, stat.st_mtime_ns, files[rel][0])
+            notify_changed(dest)
+        for rel in changes["deleted"]:
+            path = workspace / rel
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            stats.pop(rel, None)
+            notify_changed(path)
+        with self._lock:
+            self._stats[key] = stats
+        return changes
+
+    # -- storage -------------------------------------------------------------
+
+    def _object(self, sha: str) -> Path:
+        return self.objects / sha[:2] / sha[2:]
+
+    def _store(self, path: Path) -> str:
+        """Hash path and add its content to the object store (read once). Returns the sha256."""
+        self.objects.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, tmp = tempfile.mkstemp(dir=self.objects, prefix=".incoming-")
+        try:
+            with os.fdopen(fd, "wb") as out, open(path, "rb") as src:
+                for chunk in iter(lambda: src.read(_CHUNK), b""):
+                    digest.update(chunk)
+                    out.write(chunk)
+            sha = digest.hexdigest()
+            obj = self._object(sha)
+            if obj.exists():
+                os.unlink(tmp)
+            else:
+                obj.parent.mkdir(exist_ok=True)
+                os.chmod(tmp, 0o444)
+                os.replace(tmp, obj)
+            return sha
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def _link(self, obj: Path, dest: Path):
+        if self.link_mode == "hardlink":
+            try:
+                os.link(obj, dest)
+                return
+            except OSError:
+                pass  # other filesystem or link limit: copy instead
+        copy_file(obj, dest)
+
+    def _load_headers(self) -> Dict[str, dict]:
+        if self._headers is None:
+            headers = {}
+            if self.manifests.is_dir():
+                for path in self.manifests.glob("*.json"):
+                    try:
+                        data = json.loads(path.read_text(encoding="utf-8"))
+                    except (OSError, ValueError):
+                        continue
+                    data.pop("manifest", None)
+                    headers[data["id"]] = data
+            self._headers = headers
+        return self._headers
+
+    def _remember(self, snapshot_id: str, files: Dict[str, Tuple[str, int]]):
+        self._files.pop(snapshot_id, None)
+        self._files[snapshot_id] = files
+        while len(self._files) > 8:
+            self._files.pop(next(iter(self._files)))
+
+    def _read_manifest(self, snapshot_id: str) -> Dict[str, Tuple[str, int]]:
+        data = json.loads((self.manifests / f"{snapshot_id}.json").read_text(encoding="utf-8"))
+        return {rel: tuple(entry) for rel, entry in data["manifest"].items()}
+
+    def _prune(self):
+        headers = self._load_headers()
+        # Prune in batches: collecting objects reads every remaining manifest
+        if len(headers) <= self.keep + max(1, self.keep // 10):
+            return
+        doomed = sorted(headers.values(), key=lambda header: header["created"])[:len(headers) - self.keep]
+        for header in doomed:
+            del headers[header["id"]]
+            self._files.pop(header["id"], None)
+            try:
+                (self.manifests / f"{header['id']}.json").unlink()
+            except FileNotFoundError:
+                pass
+        if self._active:
+            return  # a snapshot in progress may use any object; collect next time
+        live = set()
+        for snapshot_id in headers:
+            files = self._files.get(snapshot_id) or self._read_manifest(snapshot_id)
+            live.update(sha for sha, _ in files.values())
+        for directory in self.objects.iterdir():
+            if not directory.is_dir():
+                continue
+            for obj in directory.iterdir():
+                if directory.name + obj.name not in live:
+                    obj.unlink()
+
+def _walk(workspace: Path):
+    """(posix rel path, stat) of every regular file, skipping IGNORED_DIRS and symlinks."""
+    stack = [workspace]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.is_symlink():
+                        continue
+                    if entry.is_dir():
+                        if entry.name not in IGNORED_DIRS:
+                            stack.append(Path(entry.path))
+                    elif entry.is_file():
+                        yield Path(entry.path).relative_to(workspace).as_posix(), entry.stat()
+        except FileNotFoundError:
+            continue
+
+
+def _diff(old: Dict[str, Tuple[str, int]], new: Dict[str, Tuple[str, int]]) -> Dict[str, List[str]]:
+    return {
+        "added": sorted(rel for rel in new if rel not in old),
+        "modified": sorted(rel for rel, entry in new.items() if rel in old and old[rel][0] != entry[0]),
+        "deleted": sorted(rel for rel in old if rel not in new),
+    }
+
+
+def copy_file(src: Path, dest: Path):
+    """
+    Atomically replace dest with a copy of src, as a reflink where the filesystem
+    supports it. dest keeps its permissions; a new file gets 0644.
+    """
+    fd, tmp = tempfile.mkstemp(dir=dest.parent, prefix=f".{dest.name}.")
+    try:
+        with os.fdopen(fd, "wb") as out, open(src, "rb") as source:
+            cloned = False
+            if fcntl is not None:
+                try:
+                    fcntl.ioctl(out.fileno(), _FICLONE, source.fileno())
+                    cloned = True
+                except OSError:
+                    pass  # not supported here: copy the bytes
+            if not cloned:
+                for chunk in iter(lambda: source.read(_CHUNK), b""):
+                    out.write(chunk)
+        try:
+            os.chmod(tmp, dest.stat().st_mode & 0o7777)
+        except FileNotFoundError:
+            os.chmod(tmp, 0o644)
+        os.replace(tmp, dest)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def _write_json(path: Path, data):
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+# Global instance
+snapshot_store = SnapshotStore()
@@ -0,0 +1,153 @@
+"""
+Task graph execution for agent runs.
+
+In graph mode (AGENT_PROCESS=graph, or "process": "graph" on /api/chat) the
+Architect's design is split into one coding task per planned file. Coding
+tasks run concurrently on a bounded pool, and each file's review starts as
+soon as that file is done, so a multi-file project takes about as long as its
+slowest file instead of the sum of all of them.
+
+TaskGraph knows nothing about CrewAI: nodes are plain callables with
+dependencies. crew_runner.py builds the graph from Crew/Task objects.
+"""
+import contextvars
+import os
+import queue
+import re
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from code_extractor import EXT_MAP, clean_filename
+
+# Nodes of one graph that may run at the same time
+DEFAULT_MAX_PARALLEL = int(os.getenv("AGENT_GRAPH_PARALLEL", "3"))
+# Plans naming more files than this share the last coding task
+MAX_PLANNED_FILES = int(os.getenv("AGENT_GRAPH_MAX_FILES", "12"))
+
+PROCESS_SEQUENTIAL = "sequential"
+PROCESS_GRAPH = "graph"
+DEFAULT_PROCESS = os.getenv("AGENT_PROCESS", PROCESS_SEQUENTIAL)
+
+_EXTENSIONS = sorted({ext.lstrip(".") for ext in EXT_MAP.values()} | {"jsx", "tsx", "toml", "ini", "cfg"})
+# Lines of a design that list files: "- ", "* ", "+ ", "1. ", "2) " and table rows.
+# File names in prose ("README.md は不要です") are not a plan.
+_PLAN_LINE_RE = re.compile(r"^\s*(?:[-*+]\s|\d+[.)]\s|\|)")
+# A file name in a plan line: "- app.py: ...", "- `src/util.js`", "| models.py | ..."
+_PLANNED_FILE_RE = re.compile(
+    r"(?<![\w./-])((?:[\w-]+/)*[\w-]+\.(?:" + "|".join(_EXTENSIONS) + r"))(?![\w-])",
+    re.IGNORECASE,
+)
+
+
+class TaskFailedError(Exception):
+    """
+    Raised by TaskGraph.run when nodes failed. .errors maps node id to the
+    exception, .results holds what the other nodes returned.
+    """
+
+    def __init__(self, errors: Dict[str, BaseException], results: Dict[str, Any]):
+        super().__init__(", ".join(f"{node}: {error}" for node, error in errors.items()))
+        self.errors = errors
+        self.results = results
+
+
+def parse_file_plan(design: str) -> List[str]:
+    """
+    Workspace-relative file names listed in the Architect's design (list items
+    and table rows), in order of first mention.
+    """
+    files: List[str] = []
+    for line in design.splitlines():
+        if not _PLAN_LINE_RE.match(line):
+            continue
+        for match in _PLANNED_FILE_RE.finditer(line):
+            name = clean_filename(match.group(1))
+            if name not in files:
+                files.append(name)
+    return files
+
+
+def group_files(files: List[str], limit: int = MAX_PLANNED_FILES) -> List[List[str]]:
+    """One coding task per file, except that files beyond limit share the last task."""
+    if len(files) <= limit:
+        return [[name] for name in files]
+    return [[name] for name in files[:limit - 1]] + [files[limit - 1:]]
+
+
+class TaskGraph:
+    """
+    A DAG of callables run on a bounded thread pool. A node starts as soon as
+    all of its dependencies succeeded and receives their results as a dict.
+    Nodes depending on a failed node are skipped; independent ones still run.
+    """
+
+    def __init__(self, max_parallel: int = DEFAULT_MAX_PARALLEL):
+        self.max_parallel = max_parallel
+        self._nodes: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+        self._deps: Dict[str, List[str]] = {}
+
+    def add(self, node_id: str, fn: Callable[[Dict[str, Any]], Any], deps: Iterable[str] = ()):
+        deps = list(deps)
+        for dep in deps:
+            if dep not in self._nodes:
+                raise ValueError(f"{node_id} depends on unknown node {dep}")
+        self._nodes[node_id] = fn
+        self._deps[node_id] = deps
+
+    def run(self, check_cancelled: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+        """Run every node; returns results by node id or raises TaskFailedError."""
+        check_cancelled = check_cancelled or (lambda: None)
+        results: Dict[str, Any] = {}
+        errors: Dict[str, BaseException] = {}
+        pending = dict(self._deps)
+        running: Dict[Future, str] = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_parallel, thread_name_prefix="task") as executor:
+            while pending or running:
+                for node_id, deps in list(pending.items()):
+                    if any(dep in errors for dep in deps):
+                        errors[node_id] = RuntimeError("skipped, a dependency failed")
+                        del pending[node_id]
+                    elif all(dep in results for dep in deps):
+                        inputs = {dep: results[dep] for dep in deps}
+                        # Context variables (e.g. the LLM cache bypass) carry over into the node
+                        context = contextvars.copy_context()
+                        running[executor.submit(context.run, self._nodes[node_id], inputs)] = node_id
+                        del pending[node_id]
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node_id = running.pop(future)
+                    try:
+                        results[node_id] = future.result()
+                    except BaseException as e:
+                        errors[node_id] = e
+                try:
+                    check_cancelled()
+                except BaseException:
+                    for future in running:
+                        future.cancel()
+                    raise
+
+        if errors:
+            raise TaskFailedError(errors, results)
+        return results
+
+
+class AgentPool:
+    """Hands out one of a fixed set of agents; an agent is never used by two tasks at once."""
+
+    def __init__(self, agents: Iterable[Any]):
+        self._free: "queue.Queue[Any]" = queue.Queue()
+        for agent in agents:
+            self._free.put(agent)
+
+    @contextmanager
+    def acquire(self):
+        agent = self._free.get()
+        try:
+            yield agent
+        finally:
+            self._free.put(agent)
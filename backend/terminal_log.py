@@ -0,0 +1,201 @@
+"""
+Per-session terminal output log.
+
+Output is stored as utf-8 in one append-only bytearray next to an array of
+line start offsets, so a session costs about one byte per character plus eight
+bytes per line. Lines are numbered from 0 for the life of the session; when
+the log grows past its budget the oldest lines are dropped, and their numbers
+are not reused, so clients can keep paging with the numbers they already have.
+A single line longer than the budget (progress bars redrawn with \r, output
+without newlines) loses its head instead, and reads of it report truncated.
+
+Searches run over the raw bytes (bytes.find or a compiled bytes regex) and map
+match offsets to line numbers by bisecting the offset index.
+"""
+import os
+import re
+from array import array
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional
+
+# Bytes of output kept per session; older lines are dropped beyond this
+DEFAULT_MAX_BYTES = int(os.getenv("TERMINAL_LOG_BYTES", str(8 * 1024 * 1024)))
+# Largest number of lines returned by one read()
+MAX_READ_LINES = 5000
+# Longest search query, and most matches returned by one search()
+MAX_QUERY_CHARS = 1000
+MAX_SEARCH_MATCHES = 1000
+
+# CSI/OSC sequences and other escapes, removed from search result previews
+_ANSI_ESCAPE = re.compile(rb"\x1b(?:\[[0-?]*[ -/]*[@-~]|\][^\x07\x1b]*(?:\x07|\x1b\\)|[@-Z\\-_])")
+
+
+class TerminalOutputLog:
+    """Append-only output log with a line offset index."""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be positive")
+        self.max_bytes = max_bytes
+        self._data = bytearray()
+        self._base = 0        # absolute offset of _data[0]
+        self._first_line = 0  # number of the first line still held
+        # Absolute start offset of every held line; the last one is still open
+        self._starts = array("Q", [0])
+        # The first held line lost its head to the budget
+        self._head_truncated = False
+
+    @property
+    def first_line(self) -> int:
+        return self._first_line
+
+    @property
+    def end_line(self) -> int:
+        """One past the last line number (the last line may still be incomplete)."""
+        return self._first_line + len(self._starts)
+
+    @property
+    def size(self) -> int:
+        return len(self._data)
+
+    def append(self, text: str):
+        data = text.encode("utf-8")
+        offset = self._base + len(self._data)
+        self._data += data
+        pos = data.find(b"\n")
+        while pos != -1:
+            self._starts.append(offset + pos + 1)
+            pos = data.find(b"\n", pos + 1)
+        if len(self._data) > self.max_bytes:
+            self._trim()
+
+    def _trim(self):
+        # Drop down to 3/4 of the budget so trimming happens once per few appends
+        keep_from = self._base + len(self._data) - self.max_bytes * 3 // 4
+        # Only whole lines are dropped, but always keep the open last line
+        drop = min(bisect_right(self._starts, keep_from) - 1, len(self._starts) - 1)
+        if drop > 0:
+            cut = self._starts[drop]
+            del self._data[:cut - self._base]
+            del self._starts[:drop]
+            self._base = cut
+            self._first_line += drop
+            self._head_truncated = False
+        if len(self._data) > self.max_bytes:
+            # The first held line alone is over the budget: drop its head, not splitting a character
+            cut = keep_from - self._base
+            while cut < len(self._data) and 0x80 <= self._data[cut] < 0xC0:
+                cut += 1
+            del self._data[:cut]
+            self._base += cut
+            self._starts[0] = self._base
+            self._head_truncated = True
+
+    def snapshot(self) -> "TerminalOutputLog":
+        """
+        A copy of the current content. Appends and trims happen on the event loop,
+        so searches run on a snapshot in a worker thread instead of the live log.
+        """
+        copy = TerminalOutputLog(self.max_bytes)
+        copy._data = bytearray(self._data)
+        copy._base = self._base
+        copy._first_line = self._first_line
+        copy._starts = array("Q", self._starts)
+        copy._head_truncated = self._head_truncated
+        return copy
+
+    def _offset(self, line: int) -> int:
+        """Absolute offset where line starts (end of the log for line == end_line)."""
+        if line >= self.end_line:
+            return self._base + len(self._data)
+        return self._starts[line - self._first_line]
+
+    def _line_at(self, offset: int) -> int:
+        return self._first_line + bisect_right(self._starts, offset) - 1
+
+    def read(self, start: int, end: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Raw output of lines [start, end), escapes and line endings included, so it
+        can be written to xterm as is. The range is clamped to the lines still held.
+        truncated is True when the first line returned lost its head to the budget.
+        """
+        start = max(start, self._first_line)
+        end = self.end_line if end is None else min(end, self.end_line)
+        end = max(start, min(end, start + MAX_READ_LINES))
+        lo, hi = self._offset(start) - self._base, self._offset(end) - self._base
+        return {
+            "start": start,
+            "end": end,
+            "first_line": self._first_line,
+            "end_line": self.end_line,
+            "truncated": self._head_truncated and start == self._first_line and end > start,
+            "text": self._data[lo:hi].decode("utf-8", errors="replace"),
+        }
+
+    def tail(self, max_chars: int) -> str:
+        """The last whole lines (plus the open line) that fit in about max_chars bytes."""
+        if len(self._data) <= max_chars:
+            return self._data.decode("utf-8", errors="replace")
+        offset = self._base + len(self._data) - max_chars
+        line = self._line_at(offset)
+        start = self._offset(line + 1) if self._offset(line) < offset else self._offset(line)
+        if start - self._base >= len(self._data):
+            # One line longer than max_chars: cut it, skipping a split character
+            return self._data[offset - self._base:].decode("utf-8", errors="ignore")
+        return self._data[start - self._base:].decode("utf-8", errors="replace")
+
+    def search(
+        self,
+        query: str,
+        regex: bool = False,
+        ignore_case: bool = False,
+        start_line: Optional[int] = None,
+        limit: int = 100,
+    ) -> Dict[str, Any]:
+        """
+        Lines from start_line on that contain query, at most one hit per line.
+        Raises ValueError for an empty or overlong query or an invalid regex.
+        next_line is where to continue when the result was cut off at limit
+        (at most MAX_SEARCH_MATCHES), else None.
+        """
+        if not query:
+            raise ValueError("query must not be empty")
+        if len(query) > MAX_QUERY_CHARS:
+            raise ValueError(f"query must be at most {MAX_QUERY_CHARS} characters")
+        limit = max(1, min(limit, MAX_SEARCH_MATCHES))
+        needle = query.encode("utf-8")
+        pattern = None
+        if regex or ignore_case:
+            try:
+                pattern = re.compile(
+                    needle if regex else re.escape(needle),
+                    re.MULTILINE | (re.IGNORECASE if ignore_case else 0),
+                )
+            except re.error as e:
+                raise ValueError(f"invalid regex: {e}") from None
+
+        line = self._first_line if start_line is None else max(start_line, self._first_line)
+        pos = self._offset(line) - self._base
+        end = len(self._data)
+        matches: List[Dict[str, Any]] = []
+        while pos < end:
+            if pattern is not None:
+                found = pattern.search(self._data, pos)
+                hit = found.start() if found else -1
+            else:
+                hit = self._data.find(needle, pos)
+            if hit == -1:
+                break
+            line = self._line_at(self._base + hit)
+            if len(matches) == limit:
+                return {"matches": matches, "next_line": line}
+            lo = self._offset(line) - self._base
+            hi = self._offset(line + 1) - self._base
+            matches.append({"line": line, "text": self._preview(lo, hi)})
+            pos = hi
+        return {"matches": matches, "next_line": None}
+
+    def _preview(self, lo: int, hi: int) -> str:
+        raw = _ANSI_ESCAPE.sub(b"", bytes(self._data[lo:hi]))
+        # Carriage returns (progress bars, prompt redraws) only move the cursor
+        return raw.rstrip(b"\r\n").replace(b"\r", b"").decode("utf-8", errors="replace")
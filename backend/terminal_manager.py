@@ -1,76 +1,423 @@
+"""
+Interactive shell behind the IDE terminal.
+
+On POSIX the shell runs on a real pseudo-terminal, so programs see a TTY
+(prompt, colors, line editing) and stdout/stderr arrive interleaved in order.
+On Windows, where pty is unavailable, pipes are used as before.
+
+Output is read in large chunks and decoded incrementally, so a multibyte
+character split between two reads stays intact. It is coalesced into frames
+sent at most every FRAME_INTERVAL or once FRAME_CHARS accumulate. When the
+websocket falls behind, the reader pauses until the backlog drains, so a fast
+producer (cat of a big file, pip install) cannot flood the socket or grow
+memory without bound.
+
+Shells live in sessions that survive the websocket: a page reload reattaches
+to the same shell (?session=<id>) and gets its recent scrollback replayed.
+All output of a session is kept in a TerminalOutputLog (terminal_log.py), which
+the frontend searches and pages through by line number.
+A few warm shells are kept ready so a new terminal opens without waiting for
+shell startup, and detached sessions are closed after TERMINAL_IDLE_SECONDS.
+"""
 import asyncio
+import codecs
+import json
+import locale
 import os
-import sys
+import signal
+import struct
 import subprocess
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Set
+
 from fastapi import WebSocket
 
-class TerminalManager:
-    def __init__(self):
+from terminal_log import TerminalOutputLog
+
+try:
+    import fcntl
+    import termios
+except ImportError:  # Windows
+    fcntl = termios = None
+
+USE_PTY = os.name != "nt"
+READ_SIZE = 64 * 1024
+# Output frames are sent at most this often...
+FRAME_INTERVAL = float(os.getenv("TERMINAL_FRAME_MS", "16")) / 1000
+# ...unless this many characters are already waiting
+FRAME_CHARS = 32 * 1024
+# Pending output at which the reader pauses, and at which it resumes
+HIGH_WATER = 256 * 1024
+LOW_WATER = 64 * 1024
+DEFAULT_COLS, DEFAULT_ROWS = 80, 24
+# Tail of the output log replayed on reattach; older lines are fetched on demand
+SCROLLBACK_CHARS = int(os.getenv("TERMINAL_SCROLLBACK_CHARS", str(512 * 1024)))
+# Pre-spawned shells waiting for a new session
+WARM_SHELLS = int(os.getenv("TERMINAL_WARM_SHELLS", "1"))
+# Detached sessions are closed after this long without a client
+IDLE_TIMEOUT = float(os.getenv("TERMINAL_IDLE_SECONDS", "600"))
+MAX_SESSIONS_PER_USER = int(os.getenv("TERMINAL_MAX_SESSIONS_PER_USER", "4"))
+
+
+def _make_controlling_tty():
+    """Runs in the child before exec: new session with the pty slave (fd 0) as its terminal."""
+    os.setsid()
+    fcntl.ioctl(0, termios.TIOCSCTTY, 0)
+
+
+class ShellProcess:
+    """
+    A shell whose decoded output is passed to on_output(text) as it arrives.
+    on_exit() is called once the shell's output ends.
+    """
+
+    def __init__(self, on_output: Callable[[str], None], on_exit: Optional[Callable[[], None]] = None):
+        self._on_output = on_output
+        self._on_exit = on_exit
+        self.process = None
+        self._master_fd: Optional[int] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._resumed = asyncio.Event()
+        self._resumed.set()
+        self._reading = False
+        # Japanese Windows consoles use cp932; a pty is utf-8
+        self.encoding = "utf-8" if USE_PTY else (locale.getpreferredencoding(False) or "utf-8")
+        self._decoder = codecs.getincrementaldecoder(self.encoding)(errors="replace")
+
+    @property
+    def paused(self) -> bool:
+        return not self._resumed.is_set()
+
+    async def start(self, cols: int = DEFAULT_COLS, rows: int = DEFAULT_ROWS):
+        if USE_PTY:
+            master, slave = os.openpty()
+            self._master_fd = master
+            self.resize(cols, rows)
+            env = dict(os.environ, TERM="xterm-256color")
+            try:
+                self.process = await asyncio.create_subprocess_exec(
+                    "bash", stdin=slave, stdout=slave, stderr=slave,
+                    preexec_fn=_make_controlling_tty, env=env,
+                )
+            finally:
+                os.close(slave)
+            asyncio.get_running_loop().add_reader(master, self._on_readable)
+            self._reading = True
+        else:
+            self.process = await asyncio.create_subprocess_exec(
+                "powershell.exe",
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                # Create a new console window group so signals don't propagate to parent
+                creationflags=subprocess.CREATE_NEW_CONSOLE,
+            )
+            self._reader_task = asyncio.create_task(self._read_pipe())
+            # Without a console, PowerShell only prints its prompt after input
+            await self.write("\r\n")
+
+    def _on_readable(self):
+        try:
+            data = os.read(self._master_fd, READ_SIZE)
+        except OSError:
+            data = b""  # EIO: the shell exited and closed the slave side
+        if data:
+            self._on_output(self._decoder.decode(data))
+        else:
+            self._stop_reading()
+            self._finish()
+
+    async def _read_pipe(self):
+        stream = self.process.stdout
+        while True:
+            await self._resumed.wait()
+            data = await stream.read(READ_SIZE)
+            if not data:
+                break
+            self._on_output(self._decoder.decode(data))
+        self._finish()
+
+    def _finish(self):
+        tail = self._decoder.decode(b"", final=True)
+        if tail:
+            self._on_output(tail)
+        if self._on_exit:
+            self._on_exit()
+
+    def pause(self):
+        """Stop reading output until resume(); the shell blocks once the pty/pipe buffer fills."""
+        self._resumed.clear()
+        if USE_PTY:
+            self._stop_reading()
+
+    def resume(self):
+        self._resumed.set()
+        if USE_PTY and not self._reading and self._master_fd is not None:
+            asyncio.get_running_loop().add_reader(self._master_fd, self._on_readable)
+            self._reading = True
+
+    def _stop_reading(self):
+        if self._reading:
+            asyncio.get_running_loop().remove_reader(self._master_fd)
+            self._reading = False
+
+    def resize(self, cols: int, rows: int):
+        if USE_PTY and self._master_fd is not None:
+            fcntl.ioctl(self._master_fd, termios.TIOCSWINSZ, struct.pack("HHHH", rows, cols, 0, 0))
+
+    async def write(self, data: str):
+        if self.process is None:
+            return
+        if USE_PTY:
+            os.write(self._master_fd, data.encode("utf-8"))
+        else:
+            self.process.stdin.write(data.encode(self.encoding, errors="replace"))
+            await self.process.stdin.drain()
+
+    async def close(self):
+        if self._reader_task:
+            self._reader_task.cancel()
+        if self._master_fd is not None:
+            self._stop_reading()
+        if self.process and self.process.returncode is None:
+            try:
+                if USE_PTY:
+                    # The shell leads its own session; hang up its whole process group
+                    os.killpg(self.process.pid, signal.SIGHUP)
+                else:
+                    self.process.terminate()
+                await asyncio.wait_for(self.process.wait(), 2)
+            except (ProcessLookupError, asyncio.TimeoutError):
+                try:
+                    self.process.kill()
+                except ProcessLookupError:
+                    pass
+        if self._master_fd is not None:
+            os.close(self._master_fd)
+            self._master_fd = None
         self.process = None
+
+
+class TerminalSessionLimitError(Exception):
+    """Raised when a user already has the maximum number of attached sessions."""
+
+
+class TerminalSession:
+    """
+    One shell plus its scrollback. At most one websocket is attached at a time;
+    while detached the shell keeps running and its output only goes to the log.
+    """
+
+    def __init__(self, on_exit: Optional[Callable[["TerminalSession"], None]] = None):
+        self.id: Optional[str] = None
+        self.owner: Optional[str] = None
+        self.process = ShellProcess(self._on_output, self._on_process_exit)
         self.websocket = None
+        self.exited = False
+        self.last_active = time.monotonic()
+        self._on_exit = on_exit
+        self.log = TerminalOutputLog()
+        self._pending: List[str] = []
+        self._pending_chars = 0
+        self._wakeup = asyncio.Event()
+        self._sender: Optional[asyncio.Task] = None
+        self._last_sent = 0.0
+
+    async def start(self, cols: int = DEFAULT_COLS, rows: int = DEFAULT_ROWS):
+        await self.process.start(cols, rows)
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
+    @property
+    def scrollback(self) -> str:
+        return self.log.tail(SCROLLBACK_CHARS)
+
+    def attach(self, websocket: WebSocket):
+        """Start sending to websocket, beginning with a replay of the scrollback."""
         self.websocket = websocket
-        await self.start_shell()
-
-    async def start_shell(self):
-        # Use PowerShell on Windows, bash on others (simplified for Windows env)
-        shell_cmd = "powershell.exe" if os.name == 'nt' else "bash"
-        
-        # Create subprocess with pipes
-        # We need to use asyncio.create_subprocess_exec for non-blocking I/O
-        self.process = await asyncio.create_subprocess_exec(
-            shell_cmd,
-            stdin=asyncio.subprocess.PIPE,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-            # Create a new console window group so signals don't propagate to parent
-            creationflags=subprocess.CREATE_NEW_CONSOLE if os.name == 'nt' else 0
-        )
-
-        # Start background tasks to read stdout/stderr
-        asyncio.create_task(self._read_stream(self.process.stdout))
-        asyncio.create_task(self._read_stream(self.process.stderr))
-
-    async def _read_stream(self, stream):
+        replay = self.scrollback
+        self._pending = [replay]
+        self._pending_chars = len(replay)
+        self._last_sent = 0.0
+        self._wakeup.set()
+        self._sender = asyncio.create_task(self._send_frames())
+
+    def detach(self, websocket: WebSocket):
+        if self.websocket is not websocket:
+            return
+        if self._sender:
+            self._sender.cancel()
+            self._sender = None
+        self.websocket = None
+        self._pending = []
+        self._pending_chars = 0
+        self.last_active = time.monotonic()
+        # Nobody to wait for any more: output goes to the bounded log only
+        if self.process.paused:
+            self.process.resume()
+
+    def _on_output(self, text: str):
+        self.log.append(text)
+        if self.websocket is None:
+            return
+        self._pending.append(text)
+        self._pending_chars += len(text)
+        if self._pending_chars >= HIGH_WATER and not self.process.paused:
+            self.process.pause()
+        self._wakeup.set()
+
+    def _on_process_exit(self):
+        self.exited = True
+        if self._on_exit:
+            self._on_exit(self)
+
+    async def _send_frames(self):
         while True:
-            try:
-                # Read 1024 bytes at a time
-                data = await stream.read(1024)
-                if not data:
-                    break
-                # Send raw bytes or decode? xterm.js handles strings well.
-                # Decoding might fail if cut in middle of multibyte char, 
-                # but for simplicity let's try decoding with errors='replace'.
-                # Better: send text if possible.
-                text = data.decode('cp932', errors='replace') # Windows typically uses cp932 (Shift-JIS) or utf-8
-                # If pure utf-8 environment, change to utf-8. 
-                # PowerShell might output local encoding. 
-                # Let's try to detect or default to cp932 for Japanese Windows.
-                
+            await self._wakeup.wait()
+            # Send at once after a quiet period (keystroke echo); otherwise wait to batch
+            delay = FRAME_INTERVAL - (time.monotonic() - self._last_sent)
+            if delay > 0 and self._pending_chars < FRAME_CHARS:
+                await asyncio.sleep(delay)
+            self._wakeup.clear()
+            text = "".join(self._pending)
+            self._pending = []
+            self._pending_chars = 0
+            if text:
+                # Awaiting here is the backpressure: output piles up while the client is slow
                 await self.websocket.send_text(text)
-            except Exception as e:
-                print(f"Error reading stream: {e}")
-                break
+                self._last_sent = time.monotonic()
+            if self.process.paused and self._pending_chars < LOW_WATER:
+                self.process.resume()
 
     async def write(self, data: str):
-        if self.process and self.process.stdin:
-            # Encode string to bytes
-            # PowerShell expects input in local encoding or UTF-8 depending on config.
-            # Let's try local encoding (cp932) first.
-            try:
-                self.process.stdin.write(data.encode('cp932'))
-                await self.process.stdin.drain()
-            except Exception:
-                # Fallback to utf-8
-                self.process.stdin.write(data.encode('utf-8'))
-                await self.process.stdin.drain()
-
-    async def disconnect(self):
-        if self.process:
+        self.last_active = time.monotonic()
+        await self.process.write(data)
+
+    def resize(self, cols: int, rows: int):
+        self.process.resize(cols, rows)
+
+    async def close(self):
+        if self._sender:
+            self._sender.cancel()
+            self._sender = None
+        await self.process.close()
+
+
+class TerminalSessionManager:
+    """Owns all terminal sessions, the warm shell pool and the idle reaper."""
+
+    def __init__(
+        self,
+        warm_shells: int = WARM_SHELLS,
+        idle_timeout: float = IDLE_TIMEOUT,
+        max_sessions_per_user: int = MAX_SESSIONS_PER_USER,
+    ):
+        self.warm_shells = warm_shells
+        self.idle_timeout = idle_timeout
+        self.max_sessions_per_user = max_sessions_per_user
+        self._sessions: Dict[str, TerminalSession] = {}
+        self._warm: List[TerminalSession] = []
+        self._tasks: Set[asyncio.Task] = set()
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        self._track(self._reap_idle())
+        await self._fill_pool()
+
+    async def shutdown(self):
+        for task in list(self._tasks):
+            task.cancel()
+        self._tasks.clear()
+        sessions = list(self._sessions.values()) + self._warm
+        self._sessions.clear()
+        self._warm = []
+        for session in sessions:
+            await session.close()
+
+    def get(self, session_id: str) -> Optional[TerminalSession]:
+        return self._sessions.get(session_id)
+
+    def sessions_of(self, user: str) -> List[TerminalSession]:
+        return [session for session in self._sessions.values() if session.owner == user]
+
+    async def attach(self, websocket: WebSocket, session_id: Optional[str], user: str) -> TerminalSession:
+        """
+        Reattach to session_id if it is the user's and free, otherwise open a new
+        session. The client learns the id, and the number of lines logged so far,
+        from a {"type": "session"} control frame.
+        """
+        async with self._lock:
+            session = self._sessions.get(session_id) if session_id else None
+            resumed = session is not None and session.owner == user and session.websocket is None and not session.exited
+            if not resumed:
+                session = await self._open(user)
+        control = {"type": "session", "id": session.id, "resumed": resumed, "end_line": session.log.end_line}
+        await websocket.send_bytes(json.dumps(control).encode())
+        session.attach(websocket)
+        return session
+
+    def detach(self, session: TerminalSession, websocket: WebSocket):
+        session.detach(websocket)
+
+    async def close(self, session_id: str):
+        session = self._sessions.pop(session_id, None)
+        if session:
+            await session.close()
+
+    async def _open(self, user: str) -> TerminalSession:
+        owned = self.sessions_of(user)
+        if len(owned) >= self.max_sessions_per_user:
+            # Make room by closing the user's longest-idle detached session
+            detached = [session for session in owned if session.websocket is None]
+            if not detached:
+                raise TerminalSessionLimitError(
+                    f"{len(owned)} terminal sessions are already open (limit {self.max_sessions_per_user})"
+                )
+            await self.close(min(detached, key=lambda session: session.last_active).id)
+
+        session = self._warm.pop() if self._warm else await self._spawn()
+        session.id = uuid.uuid4().hex[:12]
+        session.owner = user
+        self._sessions[session.id] = session
+        self._track(self._fill_pool())
+        return session
+
+    async def _spawn(self) -> TerminalSession:
+        session = TerminalSession(on_exit=self._on_session_exit)
+        await session.start()
+        return session
+
+    async def _fill_pool(self):
+        while len(self._warm) < self.warm_shells:
+            self._warm.append(await self._spawn())
+
+    def _on_session_exit(self, session: TerminalSession):
+        """The shell ended (e.g. the user typed exit): drop the session and close its socket."""
+        if session in self._warm:
+            self._warm.remove(session)
+        if session.id is not None:
+            self._sessions.pop(session.id, None)
+        self._track(self._close_exited(session))
+
+    async def _close_exited(self, session: TerminalSession):
+        websocket = session.websocket
+        await session.close()
+        if websocket is not None:
             try:
-                self.process.terminate()
-            except:
-                pass
-            self.process = None
+                await websocket.close()
+            except RuntimeError:
+                pass  # already closed
+
+    async def _reap_idle(self):
+        while True:
+            await asyncio.sleep(min(self.idle_timeout, 30))
+            now = time.monotonic()
+            for session in list(self._sessions.values()):
+                if session.websocket is None and now - session.last_active > self.idle_timeout:
+                    await self.close(session.id)
+
+    def _track(self, coroutine) -> asyncio.Task:
+        """Keep a reference to background tasks so they can be cancelled on shutdown."""
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
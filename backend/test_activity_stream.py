@@ -0,0 +1,31 @@
+import asyncio
+
+from activity_stream import ActivityBroadcaster
+from logger import AgentLogger
+
+
+def test_cursor_past_the_newest_entry_replays_from_the_start():
+    logger = AgentLogger(capacity=10)
+    broadcaster = ActivityBroadcaster(logger)
+    for i in range(3):
+        logger.log("Coder", f"entry {i}", "info")
+
+    async def scenario():
+        # Cursors from before a backend restart, with a seq below the current one
+        stale = broadcaster.subscribe(after_seq=1, coalesce_ms=0, epoch="earlier")
+        current = broadcaster.subscribe(after_seq=2, coalesce_ms=0, epoch=broadcaster.epoch)
+        # Clients without an epoch: only a seq past the newest entry is recognized
+        legacy_stale = broadcaster.subscribe(after_seq=40, coalesce_ms=0)
+        legacy_current = broadcaster.subscribe(after_seq=2, coalesce_ms=0)
+        assert stale.reset and legacy_stale.reset
+        assert not current.reset and not legacy_current.reset
+        batches = [await s.next_batch() for s in (stale, current, legacy_stale, legacy_current)]
+        for subscription in (stale, current, legacy_stale, legacy_current):
+            subscription.close()
+        return batches
+
+    batches = asyncio.run(scenario())
+    messages = [[e["message"] for e in batch] for batch in batches]
+    assert messages[0] == messages[2] == ["entry 0", "entry 1", "entry 2"]
+    assert messages[1] == messages[3] == ["entry 2"]
+    assert broadcaster.subscriber_count == 0
@@ -6,3 +6,33 @@ def test_agents_creation():
         agents = create_agents()
         assert "architect" in agents
         assert "coder" in agents
+
+def test_agent_registry_caches_until_env_changes(tmp_path, monkeypatch):
+    import os
+    from agents import AgentRegistry
+
+    for key in ("ZHIPUAI_API_KEY", "GOOGLE_API_KEY", "OPENAI_API_KEY"):
+        monkeypatch.delenv(key, raising=False)
+    env_file = tmp_path / ".env"
+    env_file.write_text("ZHIPUAI_API_KEY=first\n", encoding="utf-8")
+
+    with patch('agents.Agent') as MockAgent, patch('agents.LLM') as MockLLM:
+        registry = AgentRegistry(env_file=str(env_file))
+        registry.get_agent("coder", str(tmp_path / "job1"))
+        registry.get_agent("coder", str(tmp_path / "job2"))
+        # The client is shared; each run gets its own agent and tools
+        assert MockLLM.call_count == 1
+        assert [call.kwargs["role"] for call in MockAgent.call_args_list] == ["Coder", "Coder"]
+        tools = [call.kwargs["tools"][0].workspace_path for call in MockAgent.call_args_list]
+        assert tools == [str(tmp_path / "job1"), str(tmp_path / "job2")]
+
+        # Rewriting identical content keeps the client
+        env_file.write_text("ZHIPUAI_API_KEY=first\n", encoding="utf-8")
+        os.utime(env_file, (1, 1))
+        registry.get_agent("coder")
+        assert MockLLM.call_count == 1
+
+        env_file.write_text("ZHIPUAI_API_KEY=second\n", encoding="utf-8")
+        registry.get_agent("coder")
+        assert MockLLM.call_count == 2
+        assert MockLLM.call_args.kwargs["api_key"] == "second"
@@ -0,0 +1,64 @@
+from code_extractor import extract_and_save_code_blocks, iter_code_blocks
+
+SAMPLE = """### 3.1 calculator.py
+```python
+class Calculator:
+    pass
+```
+
+Now the entry point, save as app.py:
+```python
+def main():
+    pass
+```
+
+```python
+# filename: utils.py
+def helper():
+    return 1
+```
+
+```text
+not code
+```
+
+```python
+class ReportBuilder:
+    pass
+```
+"""
+
+
+def test_iter_code_blocks_resolves_names():
+    names = [block.filename for block in iter_code_blocks(SAMPLE)]
+    # The heading stays in effect until a later heading replaces it
+    assert names == ["calculator.py", "calculator.py", "utils.py", "calculator.py"]
+
+
+def test_iter_code_blocks_hints_and_fallbacks():
+    text = "Please create main.py:\n```python\ndef main():\n    pass\n```\n```py\nclass HttpClient:\n    pass\n```\n"
+    names = [block.filename for block in iter_code_blocks(text)]
+    assert names == ["main.py", "http_client.py"]
+
+
+def test_extract_and_save_code_blocks_writes_batch(tmp_path):
+    (tmp_path / "utils.py").write_text("# a much longer hand-written utils module\n" * 10, encoding="utf-8")
+    saved = extract_and_save_code_blocks(SAMPLE, tmp_path)
+
+    # calculator.py is named by three blocks; the longest one is written once
+    assert saved == ["calculator.py"]
+    assert "ReportBuilder" in (tmp_path / "calculator.py").read_text(encoding="utf-8")
+    # Larger existing files are left alone
+    assert "hand-written" in (tmp_path / "utils.py").read_text(encoding="utf-8")
+
+
+def test_incremental_extractor_emits_blocks_when_fence_closes():
+    from code_extractor import IncrementalCodeExtractor
+
+    extractor = IncrementalCodeExtractor()
+    assert extractor.feed("### 1 app.py\n```python\n# prints letters\nprint('a')\n") == []
+    assert extractor.feed("print('b')\n``") == []
+    blocks = extractor.feed("`\nSave as extra.py\n")
+    assert [(b.filename, b.content) for b in blocks] == [("app.py", "# prints letters\nprint('a')\nprint('b')")]
+    assert extractor.feed("```js\nconsole.log(1)\n```\n")[0].filename == "app.py"
+    assert extractor.close() == []
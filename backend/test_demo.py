@@ -0,0 +1,45 @@
+import asyncio
+import json
+from demo import DemoStep, load_transcript, run_load, run_script
+from jobs import JobManager, SUCCEEDED, CANCELLED
+from logger import AgentLogger
+
+
+def test_run_script_and_transcript_replay(tmp_path):
+    logger = AgentLogger(capacity=10)
+    steps = [DemoStep(0.01, "Architect", "Analyzing '{message}'", "thought"), DemoStep(0.01, "System", "done", "success")]
+    asyncio.run(run_script(steps, logger, speed=10, message="todo app"))
+    logs = logger.get_logs()
+    assert [log["message"] for log in logs] == ["Analyzing 'todo app'", "done"]
+
+    transcript = tmp_path / "run.jsonl"
+    transcript.write_text("\n".join(json.dumps(log) for log in logs), encoding="utf-8")
+    replay = load_transcript(transcript)
+    assert [(s.role, s.message, s.type) for s in replay] == [(log["role"], log["message"], log["type"]) for log in logs]
+    assert replay[0].delay == 0.0
+
+
+def test_async_jobs_do_not_use_worker_threads(tmp_path):
+    steps = [DemoStep(0.05, "System", "tick")]
+
+    async def scenario():
+        manager = JobManager(lambda job: None, tmp_path / "ws", tmp_path / "jobs",
+                             max_concurrency=1, queue_limit=0, logger=AgentLogger(capacity=1000))
+        # Far more jobs than worker threads or queue slots
+        jobs = [manager.submit("demo", coroutine_runner=lambda job: run_script(steps, job.logger, speed=1))
+                for _ in range(50)]
+        slow = manager.submit("slow", coroutine_runner=lambda job: asyncio.sleep(10))
+        await asyncio.sleep(0)
+        manager.cancel(slow.id)
+        await asyncio.gather(*(job.future for job in jobs + [slow]))
+        return jobs, slow
+
+    jobs, slow = asyncio.run(scenario())
+    assert all(job.status == SUCCEEDED for job in jobs)
+    assert slow.status == CANCELLED
+
+
+def test_run_load_reports_throughput():
+    result = asyncio.run(run_load(jobs=20, speed=1000, subscribers=2))
+    assert result["entries"] == 20 * 6
+    assert result["entries_per_second"] > 0
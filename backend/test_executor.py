@@ -0,0 +1,82 @@
+import sys
+from executor import CodeExecutor
+
+
+def make_executor(tmp_path, **kwargs):
+    (tmp_path / "helper.py").write_text("def greet():\n    return 'hi from workspace'\n", encoding="utf-8")
+    return CodeExecutor(tmp_path, size=1, **kwargs)
+
+
+def test_run_captures_output_and_input(tmp_path):
+    executor = make_executor(tmp_path)
+    try:
+        result = executor.run("import helper\nprint(helper.greet())\nprint(input())", "typed")
+        assert result["status"] == "success"
+        assert result["output"] == "hi from workspace\ntyped\n"
+        # The API process is untouched
+        assert str(tmp_path) not in sys.path
+    finally:
+        executor.shutdown()
+
+
+def test_run_reports_errors_and_timeouts(tmp_path):
+    executor = make_executor(tmp_path, timeout=1)
+    try:
+        result = executor.run("print('before')\nraise ValueError('bad')")
+        assert result["status"] == "error"
+        assert "before" in result["output"] and "ValueError: bad" in result["output"]
+
+        result = executor.run("while True:\n    pass")
+        assert result["status"] == "error"
+        assert "timed out" in result["output"]
+
+        # The pool replaced the stuck worker
+        assert executor.run("print(1)")["output"] == "1\n"
+    finally:
+        executor.shutdown()
+
+
+def test_workers_are_recycled(tmp_path):
+    executor = make_executor(tmp_path, max_runs_per_worker=2)
+    try:
+        pids = [executor.run("import os\nprint(os.getpid())")["output"] for _ in range(4)]
+        assert pids[0] == pids[1]
+        assert pids[1] != pids[2]
+    finally:
+        executor.shutdown()
+
+
+def test_run_stream_sends_incremental_frames_and_truncates(tmp_path):
+    executor = make_executor(tmp_path)
+    try:
+        code = "import time\nprint('first', flush=True)\ntime.sleep(0.3)\nprint('second')"
+        frames = executor.run_stream(code)
+        first = next(frames)
+        assert first == {"type": "stdout", "data": "first\n"}
+        rest = list(frames)
+        assert rest[-1]["type"] == "exit" and rest[-1]["status"] == "success"
+
+        frames = list(executor.run_stream("print('x' * 5000)", max_output_chars=100))
+        output = "".join(f["data"] for f in frames if f["type"] in ("stdout", "stderr"))
+        assert output.startswith("x" * 100)
+        assert "output truncated" in output
+        assert frames[-1]["truncated"] is True
+    finally:
+        executor.shutdown()
+
+
+def test_only_workspace_modules_are_dropped_between_runs(tmp_path):
+    executor = make_executor(tmp_path)
+    try:
+        # A C extension loaded by one run is still usable by the next one on the same worker
+        code = "import os, sys, _decimal, sqlite3\nprint(os.getpid(), '_sqlite3' in sys.modules, 'helper' in sys.modules)"
+        first = executor.run(code + "\nimport helper")["output"].split()
+        second = executor.run(code)["output"].split()
+        assert first[0] == second[0]
+        assert second[1:] == ["True", "False"]
+
+        # Workspace edits are picked up by the next run
+        (tmp_path / "helper.py").write_text("def greet():\n    return 'edited'\n", encoding="utf-8")
+        assert executor.run("import helper\nprint(helper.greet())")["output"] == "edited\n"
+    finally:
+        executor.shutdown()
@@ -0,0 +1,59 @@
+import os
+
+import file_writer
+from file_writer import CREATED, UNCHANGED, UPDATED, EXISTS, BLOCKED, FAILED, summarize, write_file, write_files
+
+
+def test_identical_content_is_not_rewritten(tmp_path):
+    assert write_file(tmp_path, "app.py", "print('hi')\n").status == CREATED
+    target = tmp_path / "app.py"
+    os.utime(target, (1, 1))
+
+    assert write_file(tmp_path, "app.py", "print('hi')\n").status == UNCHANGED
+    assert target.stat().st_mtime == 1
+    # Identical content is fine even without overwrite
+    assert write_file(tmp_path, "app.py", "print('hi')\n", overwrite=False).status == UNCHANGED
+
+    assert write_file(tmp_path, "app.py", "print('bye')\n", overwrite=False).status == EXISTS
+    assert write_file(tmp_path, "app.py", "print('bye')\n").status == UPDATED
+    assert target.read_text(encoding="utf-8") == "print('bye')\n"
+
+
+def test_batch_writes_utf8_atomically_and_reports_changes(tmp_path):
+    (tmp_path / "README.md").write_bytes("# 既存\n".encode("utf-8"))
+    results = write_files(tmp_path, [
+        ("README.md", "# 既存\n"),
+        ("/src/main.py", "import util\n"),
+        ("src/util.py", "VALUE = 'ü'\n"),
+        ("../escape.py", "x = 1\n"),
+    ])
+    assert [(r.path, r.status) for r in results] == [
+        ("README.md", UNCHANGED),
+        ("/src/main.py", CREATED),
+        ("src/util.py", CREATED),
+        ("../escape.py", BLOCKED),
+    ]
+    assert (tmp_path / "src" / "util.py").read_bytes() == "VALUE = 'ü'\n".encode("utf-8")
+    assert not (tmp_path.parent / "escape.py").exists()
+    # No temp files are left behind
+    assert sorted(p.name for p in (tmp_path / "src").iterdir()) == ["main.py", "util.py"]
+
+    report = summarize(results)
+    assert report.splitlines()[0] == "2 of 4 files changed."
+    assert "created: /src/main.py, src/util.py" in report
+
+
+def test_batch_is_not_applied_when_one_file_fails(tmp_path, monkeypatch):
+    (tmp_path / "a.py").write_text("old\n", encoding="utf-8")
+    real_write_temp = file_writer._write_temp
+
+    def failing_write_temp(path, data):
+        if path.name == "b.py":
+            raise OSError("disk full")
+        return real_write_temp(path, data)
+
+    monkeypatch.setattr(file_writer, "_write_temp", failing_write_temp)
+    results = write_files(tmp_path, [("a.py", "new\n"), ("b.py", "b\n")])
+    assert [r.status for r in results] == [FAILED, FAILED]
+    assert (tmp_path / "a.py").read_text(encoding="utf-8") == "old\n"
+    assert [p.name for p in tmp_path.iterdir()] == ["a.py"]
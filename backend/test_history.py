@@ -0,0 +1,84 @@
+from history import HistoryStore
+from jobs import JobManager, SUCCEEDED
+from logger import AgentLogger
+
+
+def test_log_entries_are_batched_and_queryable(tmp_path):
+    store = HistoryStore(tmp_path / "history.sqlite3", batch_size=50, flush_interval=0.05)
+    logger = AgentLogger(capacity=10)
+    logger.add_listener(store.record_log)
+    for i in range(120):
+        logger.log("Coder" if i % 2 else "Tester", f"entry {i}", "thought" if i % 3 == 0 else "info",
+                   job_id="job-a" if i < 60 else "job-b")
+    # The in-memory log is cleared; the history is not
+    logger.clear()
+    assert store.flush()
+    assert store.stats()["written"] == 120
+
+    first = store.logs(job="job-b", limit=25)
+    assert [e["message"] for e in first["entries"]][:2] == ["entry 60", "entry 61"]
+    second = store.logs(job="job-b", after_id=first["next_after_id"], limit=25)
+    third = store.logs(job="job-b", after_id=second["next_after_id"], limit=25)
+    assert len(third["entries"]) == 10 and third["next_after_id"] is None
+    assert third["entries"][-1]["message"] == "entry 119"
+
+    thoughts = store.logs(role="Tester", type="thought", limit=1000)["entries"]
+    assert [e["seq"] for e in thoughts] == [i + 1 for i in range(0, 120, 6)]
+    store.close()
+
+    # A new store on the same file (a restart) sees everything
+    reopened = HistoryStore(tmp_path / "history.sqlite3")
+    assert len(reopened.logs(limit=1000)["entries"]) == 120
+    reopened.close()
+
+
+def test_queue_limit_drops_instead_of_blocking(tmp_path):
+    store = HistoryStore(tmp_path / "history.sqlite3", queue_limit=3, flush_interval=10)
+    store._closed = True  # keep the writer from starting so the queue fills up
+    for i in range(5):
+        store.record_log({"seq": i, "role": "Coder", "type": "info", "message": "x"})
+    assert store.stats() == {"written": 0, "dropped": 2, "batches": 0, "queued": 3}
+
+
+def test_jobs_are_recorded_with_their_output(tmp_path):
+    store = HistoryStore(tmp_path / "history.sqlite3", flush_interval=0.01)
+
+    def runner(job):
+        job.output = "all done"
+
+    manager = JobManager(runner, tmp_path / "workspace", tmp_path / "jobs",
+                         logger=AgentLogger(capacity=10), history=store)
+    jobs = [manager.submit(f"request {i}", options={"no_cache": i == 0}) for i in range(3)]
+    for job in jobs:
+        job.future.result(timeout=5)
+    manager.shutdown()
+    assert store.flush()
+
+    page = store.jobs(limit=2)
+    assert len(page["jobs"]) == 2 and page["next_before"] is not None
+    rest = store.jobs(limit=2, before=page["next_before"])
+    assert {job["id"] for job in page["jobs"] + rest["jobs"]} == {job.id for job in jobs}
+    assert all(job["status"] == SUCCEEDED and job["output_chars"] == 8 for job in page["jobs"])
+
+    stored = store.job(jobs[0].id)
+    assert stored["output"] == "all done" and stored["options"] == {"no_cache": True}
+    assert store.job("missing") is None
+    store.close()
+
+
+def test_job_pages_do_not_skip_jobs_created_in_the_same_instant(tmp_path):
+    store = HistoryStore(tmp_path / "history.sqlite3", flush_interval=0.01)
+    for i in range(5):
+        store.record_job({"id": f"job{i}", "message": "m", "status": SUCCEEDED,
+                          "created_at": "2026-01-01T00:00:00" if i < 4 else "2026-01-01T00:00:01"})
+    assert store.flush()
+
+    seen, before = [], None
+    while True:
+        page = store.jobs(limit=2, before=before)
+        seen += [job["id"] for job in page["jobs"]]
+        before = page["next_before"]
+        if before is None:
+            break
+    assert seen == ["job4", "job3", "job2", "job1", "job0"]
+    store.close()
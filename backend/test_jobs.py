@@ -0,0 +1,61 @@
+import threading
+import pytest
+from jobs import JobManager, JobQueueFullError, SUCCEEDED, CANCELLED, FAILED
+from logger import AgentLogger
+
+
+def test_job_runs_in_own_workspace_and_publishes(tmp_path):
+    shared = tmp_path / "workspace"
+    shared.mkdir()
+    (shared / "existing.py").write_text("print('old')", encoding="utf-8")
+    global_logger = AgentLogger(capacity=100)
+
+    def runner(job):
+        assert (job.workspace_path / "existing.py").exists()
+        (job.workspace_path / "new.py").write_text("print('new')", encoding="utf-8")
+        job.logger.log("Coder", "wrote new.py", "info")
+
+    manager = JobManager(runner, shared, tmp_path / "jobs", max_concurrency=1, logger=global_logger)
+    job = manager.submit("make a file")
+    job.future.result(timeout=5)
+
+    assert job.status == SUCCEEDED
+    assert (shared / "new.py").read_text(encoding="utf-8") == "print('new')"
+    assert not job.workspace_path.exists()
+    assert [log["message"] for log in job.logger.get_logs()] == ["wrote new.py"]
+    assert manager.snapshots.diff(job.snapshots["before"], job.snapshots["after"])["added"] == ["new.py"]
+    assert global_logger.get_logs()[-1]["job"] == job.id
+
+
+def test_job_admission_control_and_cancel(tmp_path):
+    release = threading.Event()
+
+    def runner(job):
+        while not release.wait(0.01):
+            job.check_cancelled()
+
+    manager = JobManager(runner, tmp_path / "workspace", tmp_path / "jobs",
+                         max_concurrency=1, queue_limit=1, logger=AgentLogger(capacity=10))
+    running = manager.submit("first")
+    queued = manager.submit("second")
+    with pytest.raises(JobQueueFullError):
+        manager.submit("third")
+
+    manager.cancel(queued.id)
+    assert queued.status == CANCELLED
+
+    manager.cancel(running.id)
+    running.future.result(timeout=5)
+    assert running.status == CANCELLED
+    manager.shutdown()
+
+
+def test_job_failure_is_recorded(tmp_path):
+    def runner(job):
+        raise RuntimeError("boom")
+
+    manager = JobManager(runner, tmp_path / "workspace", tmp_path / "jobs", logger=AgentLogger(capacity=10))
+    job = manager.submit("fail")
+    job.future.result(timeout=5)
+    assert job.status == FAILED
+    assert job.error == "boom"
@@ -0,0 +1,63 @@
+import time
+
+from llm_cache import LLMResponseCache, bypass_cache, cache_key, cached_llm
+
+
+class FakeLLM:
+    def __init__(self, model="glm", temperature=0.2):
+        self.model = model
+        self.temperature = temperature
+        self.calls = 0
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None, from_agent=None):
+        self.calls += 1
+        return f"answer {self.calls}"
+
+
+def test_identical_calls_are_answered_from_the_cache(tmp_path):
+    cache = LLMResponseCache(tmp_path / "cache.sqlite3")
+    llm = cached_llm(FakeLLM(), cache)
+    assert isinstance(llm, FakeLLM)
+    messages = [{"role": "user", "content": "hello"}]
+
+    assert llm.call(messages) == "answer 1"
+    assert llm.call(messages, callbacks=[object()]) == "answer 1"
+    assert llm.call(messages + [{"role": "user", "content": "more"}]) == "answer 2"
+    assert llm.call(messages, tools=[{"name": "File Writer Tool"}]) == "answer 3"
+    assert llm.calls == 3
+
+    with bypass_cache():
+        assert llm.call(messages) == "answer 4"
+    # Native tool execution always reaches the provider
+    assert llm.call(messages, available_functions={"f": print}) == "answer 5"
+
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["misses"], stats["stores"], stats["bypassed"]) == (1, 3, 3, 1)
+
+    # A fresh process (new memory tier) is served from SQLite
+    reopened = LLMResponseCache(tmp_path / "cache.sqlite3")
+    other = cached_llm(FakeLLM(), reopened)
+    assert other.call(messages) == "answer 1"
+    assert other.calls == 0 and reopened.stats()["disk_hits"] == 1
+
+
+def test_key_covers_model_and_temperature():
+    messages = [{"role": "user", "content": "hi"}]
+    assert cache_key("glm", messages, None, 0.2) == cache_key("glm", list(messages), None, 0.2)
+    assert cache_key("glm", messages, None, 0.2) != cache_key("gemini", messages, None, 0.2)
+    assert cache_key("glm", messages, None, 0.2) != cache_key("glm", messages, None, 0.7)
+
+
+def test_ttl_and_size_eviction(tmp_path):
+    cache = LLMResponseCache(tmp_path / "cache.sqlite3", memory_entries=1, max_bytes=25, ttl=60)
+    cache.put("a", "x" * 10)
+    cache.put("b", "y" * 10)
+    assert cache.get("a") == "x" * 10  # from disk; now the most recently used
+    cache.put("c", "z" * 10)
+    assert cache.get("b") is None
+    assert cache.get("a") == "x" * 10 and cache.get("c") == "z" * 10
+    assert cache.stats()["disk_bytes"] == 20
+
+    cache.ttl = 0
+    time.sleep(0.01)
+    assert cache.get("c") is None
@@ -0,0 +1,65 @@
+import os
+
+from history import HistoryStore
+from log_payloads import PayloadStore
+from logger import AgentLogger
+
+
+def test_large_messages_are_stored_out_of_line(tmp_path):
+    store = PayloadStore(tmp_path / "payloads")
+    logger = AgentLogger(capacity=10, payloads=store, inline_bytes=100)
+
+    small = logger.log("Coder", "short", "info")
+    assert "payload" not in small
+
+    text = "コード" * 200  # 600 chars, 1800 bytes
+    entry = logger.log("Coder", text, "code")
+    assert entry["payload"] == {"id": entry["payload"]["id"], "bytes": 1800}
+    assert len(entry["message"]) < len(text) and text.startswith(entry["message"].rstrip("…"))
+    assert store.get(entry["payload"]["id"]) == text
+    assert store.path(entry["payload"]["id"]).stat().st_size == 1800
+
+    # Identical content is stored once; bad ids never reach the filesystem
+    assert logger.log("Tester", text)["payload"]["id"] == entry["payload"]["id"]
+    assert store.path("../../etc/passwd") is None and store.get("0" * 64) is None
+
+
+def test_mirrored_entries_keep_the_reference(tmp_path):
+    store = PayloadStore(tmp_path / "payloads")
+    history = HistoryStore(tmp_path / "history.sqlite3", flush_interval=0.01)
+    global_logger = AgentLogger(capacity=10, payloads=store, inline_bytes=100)
+    global_logger.add_listener(history.record_log)
+    job_logger = AgentLogger(capacity=10, payloads=store, inline_bytes=100)
+    job_logger.add_listener(lambda e: global_logger.log(e["role"], e["message"], e["type"], job_id="job1",
+                                                        payload=e.get("payload")))
+
+    entry = job_logger.log("Final Output", "x" * 1000, "success")
+    mirrored = global_logger.get_logs()[-1]
+    assert mirrored["payload"] == entry["payload"] and mirrored["message"] == entry["message"]
+
+    assert history.flush()
+    stored = history.logs(job="job1")["entries"][0]
+    assert stored["payload"] == entry["payload"]
+    history.close()
+
+
+def test_store_evicts_oldest_payloads_over_the_limit(tmp_path):
+    store = PayloadStore(tmp_path / "payloads", max_bytes=2500)
+    first = store.put("a" * 1000)
+    store.put("b" * 1000)
+    latest = store.put("c" * 1000)
+    assert store.get(first["id"]) is None
+    assert store.get(latest["id"]) == "c" * 1000
+
+
+def test_logging_a_payload_again_keeps_it_from_eviction(tmp_path):
+    store = PayloadStore(tmp_path / "payloads", max_bytes=2500)
+    first = store.put("a" * 1000)
+    second = store.put("b" * 1000)
+    os.utime(store.path(first["id"]), (1, 1))
+    os.utime(store.path(second["id"]), (2, 2))
+    # "a" is logged again by a new entry, so "b" is now the oldest
+    store.put("a" * 1000)
+    store.put("c" * 1000)
+    assert store.get(first["id"]) == "a" * 1000
+    assert store.get(second["id"]) is None
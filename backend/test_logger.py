@@ -16,3 +16,34 @@ def test_logger():
     new_logs = logger.get_logs(after_timestamp=first_log_time)
     assert len(new_logs) == 1
     assert new_logs[0]["role"] == "Coder"
+
+def test_logger_seq_cursor():
+    logger = AgentLogger(capacity=8)
+    for i in range(5):
+        logger.log("Coder", f"step {i}", "info")
+
+    assert [log["seq"] for log in logger.get_logs()] == [1, 2, 3, 4, 5]
+    new_logs = logger.get_logs(after_seq=3)
+    assert [log["message"] for log in new_logs] == ["step 3", "step 4"]
+    assert logger.get_logs(after_seq=logger.last_seq) == []
+
+def test_logger_ring_buffer_spill(tmp_path):
+    from logger import read_spilled
+
+    spill_path = tmp_path / "spill.jsonl"
+    logger = AgentLogger(capacity=3, spill_path=spill_path)
+    for i in range(10):
+        logger.log("System", f"entry {i}", "info")
+
+    logs = logger.get_logs()
+    assert [log["seq"] for log in logs] == [8, 9, 10]
+    # Cursors older than the buffer return what is still held in memory
+    assert len(logger.get_logs(after_seq=2)) == 3
+
+    spilled = read_spilled(spill_path)
+    assert [entry["seq"] for entry in spilled] == [1, 2, 3, 4, 5, 6, 7]
+
+    logger.clear()
+    assert logger.get_logs() == []
+    logger.log("System", "after clear", "info")
+    assert logger.get_logs()[0]["seq"] == 11
@@ -7,3 +7,109 @@ def test_read_root():
     response = client.get("/")
     assert response.status_code == 200
     assert response.json() == {"status": "ok"}
+
+def test_activity_websocket_resumes_from_cursor():
+    from logger import agent_logger
+
+    agent_logger.log("Architect", "before connect", "info")
+    cursor = agent_logger.last_seq - 1
+    with client.websocket_connect(f"/api/ws/activity?after_seq={cursor}&coalesce_ms=0") as ws:
+        frame = ws.receive_json()
+        assert [log["message"] for log in frame["logs"]] == ["before connect"]
+
+        agent_logger.log("Coder", "pushed live", "info")
+        frame = ws.receive_json()
+        assert frame["logs"][-1]["message"] == "pushed live"
+        assert frame["last_seq"] == agent_logger.last_seq
+
+def test_activity_stream_resets_a_cursor_from_an_earlier_process():
+    from activity_stream import activity_broadcaster
+    from logger import agent_logger
+
+    agent_logger.log("Architect", "after restart", "info")
+    epoch = activity_broadcaster.epoch
+    # Same epoch: a normal resume
+    with client.websocket_connect(f"/api/ws/activity?after_seq={agent_logger.last_seq - 1}&epoch={epoch}&coalesce_ms=0") as ws:
+        frame = ws.receive_json()
+        assert frame["logs"][-1]["message"] == "after restart" and frame["epoch"] == epoch
+    # Another process's cursor is reset even when its seq is below the current one
+    with client.websocket_connect(f"/api/ws/activity?after_seq=1&epoch=oldprocess&coalesce_ms=0") as ws:
+        assert ws.receive_json() == {"logs": [], "reset": True, "last_seq": 0, "epoch": epoch}
+        frame = ws.receive_json()
+        assert frame["logs"][-1]["message"] == "after restart"
+
+def test_chat_in_demo_mode_runs_as_async_job(monkeypatch):
+    for key in ("OPENAI_API_KEY", "CREWAI_API_KEY", "GOOGLE_API_KEY", "ZHIPUAI_API_KEY"):
+        monkeypatch.delenv(key, raising=False)
+
+    # Keep one event loop alive for the whole test, as in a real server
+    with TestClient(app) as live_client:
+        response = live_client.post("/api/chat", json={"message": "hello"})
+        job_id = response.json()["job_id"]
+        job = live_client.get(f"/api/jobs/{job_id}").json()
+        assert job["async"] is True
+        assert job["status"] in ("queued", "running")
+
+        live_client.post(f"/api/jobs/{job_id}/cancel")
+        assert live_client.get(f"/api/jobs/{job_id}").json()["status"] == "cancelled"
+
+def test_files_listing_supports_etag():
+    response = client.get("/api/files")
+    assert response.status_code == 200
+    assert "files" in response.json()
+    etag = response.headers["etag"]
+    assert client.get("/api/files", headers={"If-None-Match": etag}).status_code == 304
+
+def test_files_websocket_sends_snapshot_then_diffs():
+    from main import WORKSPACE_DIR, workspace_index
+    from workspace_index import notify_changed
+
+    WORKSPACE_DIR.mkdir(exist_ok=True)
+    target = WORKSPACE_DIR / "ws_index_probe.txt"
+    try:
+        with client.websocket_connect("/api/ws/files") as ws:
+            frame = ws.receive_json()
+            assert frame["type"] == "snapshot"
+            assert frame["version"] == workspace_index.version
+
+            target.write_text("probe", encoding="utf-8")
+            notify_changed(target)
+            frame = ws.receive_json()
+            assert frame["type"] == "diff"
+            assert [entry["path"] for entry in frame["added"]] == ["ws_index_probe.txt"]
+    finally:
+        target.unlink(missing_ok=True)
+        notify_changed(target)
+
+def test_raw_file_ranges_conditionals_and_compression():
+    from main import WORKSPACE_DIR
+    from workspace_index import notify_changed
+
+    nested = WORKSPACE_DIR / "raw_probe" / "data.txt"
+    nested.parent.mkdir(parents=True, exist_ok=True)
+    body = "0123456789" * 500
+    nested.write_text(body, encoding="utf-8")
+    notify_changed(nested)
+    try:
+        plain = client.get("/api/raw/raw_probe/data.txt", headers={"Accept-Encoding": "identity"})
+        assert plain.status_code == 200
+        assert plain.text == body
+        etag = plain.headers["etag"]
+        assert client.get("/api/raw/raw_probe/data.txt", headers={"Accept-Encoding": "identity", "If-None-Match": etag}).status_code == 304
+
+        partial = client.get("/api/raw/raw_probe/data.txt", headers={"Range": "bytes=10-19"})
+        assert partial.status_code == 206
+        assert partial.text == "0123456789"
+        assert partial.headers["content-range"] == f"bytes 10-19/{len(body)}"
+
+        compressed = client.get("/api/raw/raw_probe/data.txt", headers={"Accept-Encoding": "gzip"})
+        assert compressed.headers["content-encoding"] == "gzip"
+        assert compressed.text == body
+
+        assert client.get("/api/files/raw_probe/data.txt").json() == {"content": body}
+        assert client.get("/api/raw/..%2F..%2Fmain.py").status_code == 404
+        assert client.delete("/api/files/raw_probe/data.txt").json()["status"] == "success"
+        assert not nested.exists()
+    finally:
+        nested.unlink(missing_ok=True)
+        nested.parent.rmdir()
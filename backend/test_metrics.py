@@ -0,0 +1,115 @@
+import contextvars
+
+import pytest
+
+from llm_cache import LLMResponseCache, cached_llm
+from metrics import MetricsRegistry, Timeline, mark, registry, reset_marks, span, usage_counters, use_timeline
+
+
+class CountingLLM:
+    """Keeps a running token total like CrewAI's LLM."""
+
+    def __init__(self):
+        self.model = "glm"
+        self.temperature = 0.2
+        self._token_usage = {"prompt_tokens": 0, "completion_tokens": 0}
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None, from_agent=None):
+        self._token_usage["prompt_tokens"] += 12
+        self._token_usage["completion_tokens"] += 5
+        return "done"
+
+
+def test_spans_go_to_the_current_timeline_and_registry():
+    timeline = Timeline()
+    with use_timeline(timeline):
+        with span("tool", "File Reader Tool") as attrs:
+            attrs["bytes_read"] = 120
+        with pytest.raises(KeyError):
+            with span("tool", "File Reader Tool"):
+                raise KeyError("x")
+    with span("tool", "outside"):
+        pass
+
+    spans = timeline.to_dict()["spans"]
+    assert [(s["kind"], s["name"]) for s in spans] == [("tool", "File Reader Tool")] * 2
+    assert spans[0]["bytes_read"] == 120 and spans[1]["error"] == "KeyError"
+    summary = timeline.to_dict()["summary"]["tool"]
+    assert summary["count"] == 2 and summary["bytes_read"] == 120
+
+
+def test_span_attrs_stay_out_of_the_registry_labels():
+    # Graph mode names task spans by role and lists the files in the attrs
+    timeline = Timeline()
+    with use_timeline(timeline):
+        with span("task", "Coder", files=["app_unique_name.py", "models.py"]):
+            pass
+    assert timeline.to_dict()["spans"][0]["files"] == ["app_unique_name.py", "models.py"]
+    rendered = registry.render()
+    assert 'kind="task",name="Coder"' in rendered and "app_unique_name.py" not in rendered
+
+
+def test_timeline_follows_copied_contexts():
+    timeline = Timeline()
+    with use_timeline(timeline):
+        context = contextvars.copy_context()
+
+    def node():
+        with span("task", "Coder (app.py)"):
+            pass
+
+    context.run(node)
+    assert timeline.to_dict()["spans"][0]["name"] == "Coder (app.py)"
+
+
+def test_marks_measure_from_the_previous_mark_of_a_scope():
+    timeline = Timeline()
+    with use_timeline(timeline):
+        reset_marks("step")
+        mark("step", "Architect")
+        mark("step", "Coder")
+        mark("task", "Architect")
+    spans = timeline.to_dict()["spans"]
+    assert [(s["kind"], s["name"]) for s in spans] == [("step", "Architect"), ("step", "Coder"), ("task", "Architect")]
+    assert spans[1]["start_ms"] >= spans[0]["start_ms"]
+    # Outside a run marks are ignored
+    mark("step", "Coder")
+
+
+def test_prometheus_text_format():
+    registry = MetricsRegistry()
+    registry.observe("llm", "glm", 0.3, {"prompt_tokens": 10, "completion_tokens": 4, "cache": "miss"})
+    registry.observe("llm", "glm", 0.01, {"cache": "hit"})
+    registry.observe("tool", 'say "hi"', 2.0, {"bytes_written": 64})
+    text = registry.render()
+
+    assert 'agent_span_duration_seconds_bucket{kind="llm",name="glm",le="0.025"} 1' in text
+    assert 'agent_span_duration_seconds_bucket{kind="llm",name="glm",le="0.5"} 2' in text
+    assert 'agent_span_duration_seconds_count{kind="llm",name="glm"} 2' in text
+    assert 'agent_prompt_tokens_total{kind="llm",name="glm"} 10' in text
+    assert 'agent_bytes_written_total{kind="tool",name="say \\"hi\\""} 64' in text
+    assert 'agent_cache_lookups_total{kind="llm",result="hit"} 1' in text
+    assert text.endswith("\n")
+
+
+def test_llm_calls_are_timed_with_token_counts(tmp_path):
+    llm = cached_llm(CountingLLM(), LLMResponseCache(tmp_path / "cache.sqlite3"))
+    timeline = Timeline()
+    with use_timeline(timeline):
+        llm.call([{"role": "user", "content": "hi"}])
+        llm.call([{"role": "user", "content": "hi"}])
+
+    first, second = timeline.to_dict()["spans"]
+    assert (first["kind"], first["name"], first["cache"]) == ("llm", "glm", "miss")
+    assert (first["prompt_tokens"], first["completion_tokens"]) == (12, 5)
+    assert second["cache"] == "hit" and "prompt_tokens" not in second
+
+
+def test_usage_counters_accepts_objects_and_dicts():
+    class Usage:
+        prompt_tokens = 100
+        completion_tokens = 0
+
+    assert usage_counters(Usage()) == {"prompt_tokens": 100}
+    assert usage_counters({"completion_tokens": 7}) == {"completion_tokens": 7}
+    assert usage_counters(None) == {}
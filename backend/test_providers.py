@@ -0,0 +1,28 @@
+import os
+
+from providers import EnvWatcher, provider_fingerprint, select_provider
+
+
+def test_env_watcher_reloads_only_on_change(tmp_path, monkeypatch):
+    env_file = tmp_path / ".env"
+    monkeypatch.delenv("ZHIPUAI_API_KEY", raising=False)
+    watcher = EnvWatcher(str(env_file))
+    # A missing file is not a change
+    assert not watcher.refresh()
+
+    env_file.write_text("ZHIPUAI_API_KEY=first\n")
+    assert watcher.refresh() and os.environ["ZHIPUAI_API_KEY"] == "first"
+    assert not watcher.refresh()
+
+    # Same content under a new mtime is not a change
+    os.utime(env_file, ns=(1, 1))
+    assert not watcher.refresh()
+
+    env_file.write_text("ZHIPUAI_API_KEY=second\n")
+    assert watcher.refresh() and select_provider()["api_key"] == "second"
+
+
+def test_fingerprint_hides_the_key(monkeypatch):
+    monkeypatch.setenv("ZHIPUAI_API_KEY", "secret-key")
+    fingerprint = provider_fingerprint(select_provider())
+    assert "secret-key" not in fingerprint and fingerprint.startswith("GLM-4.5-Flash|")
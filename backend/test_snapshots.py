@@ -0,0 +1,80 @@
+import os
+
+import snapshots
+from snapshots import SnapshotNotFoundError, SnapshotStore
+import pytest
+
+
+def make_workspace(root, files):
+    for rel, text in files.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+
+
+def test_identical_content_is_stored_once(tmp_path):
+    workspace = tmp_path / "workspace"
+    make_workspace(workspace, {"a.py": "same", "pkg/b.py": "same", "c.py": "other", "node_modules/x.js": "skip"})
+    store = SnapshotStore(tmp_path / "store")
+
+    header = store.snapshot(workspace, "before", job_id="job1")
+    assert header["files"] == 3 and header["hashed"] == 3
+    assert sorted(store.files(header["id"])) == ["a.py", "c.py", "pkg/b.py"]
+    assert sum(len(files) for _, _, files in os.walk(store.objects)) == 2
+
+    # Unchanged files are not hashed again
+    (workspace / "c.py").write_text("changed", encoding="utf-8")
+    second = store.snapshot(workspace)
+    assert second["hashed"] == 1
+    assert store.diff(header["id"], second["id"]) == {"added": [], "modified": ["c.py"], "deleted": []}
+    assert [s["id"] for s in store.list(job_id="job1")] == [header["id"]]
+
+
+def test_materialize_links_and_restore_touches_only_changes(tmp_path):
+    workspace = tmp_path / "workspace"
+    make_workspace(workspace, {"keep.py": "keep", "edit.py": "v1"})
+    store = SnapshotStore(tmp_path / "store")
+    before = store.snapshot(workspace)
+
+    job = tmp_path / "job"
+    assert store.materialize(before["id"], job) == 2
+    assert os.stat(job / "keep.py").st_ino == os.stat(store._object(store.files(before["id"])["keep.py"][0])).st_ino
+    after = store.snapshot(job)
+    assert after["hashed"] == 0
+
+    make_workspace(workspace, {"edit.py": "v2", "new.py": "new"})
+    keep_inode = os.stat(workspace / "keep.py").st_ino
+    changes = store.restore(before["id"], workspace)
+
+    assert changes == {"added": [], "modified": ["edit.py"], "deleted": ["new.py"]}
+    assert (workspace / "edit.py").read_text(encoding="utf-8") == "v1"
+    assert not (workspace / "new.py").exists()
+    assert os.stat(workspace / "keep.py").st_ino == keep_inode
+    # Restored files are ordinary writable copies, not links into the store
+    assert os.stat(workspace / "edit.py").st_nlink == 1
+
+
+def test_prune_drops_old_snapshots_and_unreferenced_objects(tmp_path):
+    workspace = tmp_path / "workspace"
+    store = SnapshotStore(tmp_path / "store", keep=2)
+    ids = []
+    for i in range(4):
+        make_workspace(workspace, {"a.py": f"v{i}"})
+        ids.append(store.snapshot(workspace)["id"])
+
+    assert [s["id"] for s in store.list()] == ids[-2:]
+    assert sum(len(files) for _, _, files in os.walk(store.objects)) == 2
+    with pytest.raises(SnapshotNotFoundError):
+        store.files(ids[0])
+    # Headers are read back from disk by a new store
+    assert [s["id"] for s in SnapshotStore(tmp_path / "store").list()] == ids[-2:]
+
+
+def test_copy_file_without_fcntl(tmp_path, monkeypatch):
+    # Windows has no fcntl; copies fall back to reading and writing the bytes
+    monkeypatch.setattr(snapshots, "fcntl", None)
+    src = tmp_path / "src.txt"
+    src.write_bytes(b"x" * 300_000)
+    dest = tmp_path / "dest.txt"
+    snapshots.copy_file(src, dest)
+    assert dest.read_bytes() == src.read_bytes()
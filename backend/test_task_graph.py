@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+from task_graph import AgentPool, TaskFailedError, TaskGraph, group_files, parse_file_plan
+
+DESIGN = """
+## ファイル構成
+- `app.py`: Flask のエントリポイント
+- templates/index.html: 画面
+- static/style.css: スタイル
+| models.py | データモデル |
+1. config.toml: 設定
+
+app.py から models.py を import します。README.md は不要です。
+"""
+
+
+def test_file_plan_is_parsed_in_order_of_first_mention():
+    # Names in prose (README.md, which the design excludes) are not planned
+    assert parse_file_plan(DESIGN) == [
+        "app.py", "templates/index.html", "static/style.css", "models.py", "config.toml",
+    ]
+    assert group_files(["a.py", "b.py", "c.py", "d.py"], limit=3) == [["a.py"], ["b.py"], ["c.py", "d.py"]]
+
+
+def test_independent_nodes_run_in_parallel_and_reviews_follow_each_file():
+    order = []
+    lock = threading.Lock()
+
+    def work(name, seconds):
+        def node(inputs):
+            time.sleep(seconds)
+            with lock:
+                order.append(name)
+            return f"{name}<{','.join(sorted(inputs.values()))}>"
+        return node
+
+    graph = TaskGraph(max_parallel=4)
+    graph.add("code:slow", work("code:slow", 0.3))
+    graph.add("code:fast", work("code:fast", 0.05))
+    graph.add("review:slow", work("review:slow", 0.05), deps=["code:slow"])
+    graph.add("review:fast", work("review:fast", 0.05), deps=["code:fast"])
+
+    started = time.monotonic()
+    results = graph.run()
+    elapsed = time.monotonic() - started
+    # Bounded by the slowest chain (0.35 s), not the sum (0.45 s)
+    assert elapsed < 0.42
+    # The fast file is reviewed while the slow one is still being written
+    assert order.index("review:fast") < order.index("code:slow")
+    assert results["review:slow"] == "review:slow<code:slow<>>"
+
+
+def test_failures_skip_dependents_but_not_siblings():
+    graph = TaskGraph(max_parallel=2)
+    graph.add("code:a", lambda inputs: 1 / 0)
+    graph.add("code:b", lambda inputs: "b")
+    graph.add("review:a", lambda inputs: "never", deps=["code:a"])
+    graph.add("review:b", lambda inputs: "ok", deps=["code:b"])
+    with pytest.raises(TaskFailedError) as info:
+        graph.run()
+    assert set(info.value.errors) == {"code:a", "review:a"}
+    assert info.value.results == {"code:b": "b", "review:b": "ok"}
+
+
+def test_agent_pool_never_shares_an_agent():
+    pool = AgentPool(["coder-0", "coder-1"])
+    in_use = set()
+    overlaps = []
+
+    def node(inputs):
+        with pool.acquire() as agent:
+            if agent in in_use:
+                overlaps.append(agent)
+            in_use.add(agent)
+            time.sleep(0.02)
+            in_use.discard(agent)
+
+    graph = TaskGraph(max_parallel=4)
+    for i in range(6):
+        graph.add(f"code:{i}", node)
+    graph.run()
+    assert overlaps == []
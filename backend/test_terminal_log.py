@@ -0,0 +1,92 @@
+import pytest
+
+from terminal_log import TerminalOutputLog
+
+
+def test_lines_are_indexed_and_read_by_range():
+    log = TerminalOutputLog()
+    log.append("first\r\nsec")
+    log.append("ond\r\n\x1b[31mthird\x1b[0m\r\npartial")
+    assert (log.first_line, log.end_line) == (0, 4)
+    page = log.read(1, 3)
+    assert page["text"] == "second\r\n\x1b[31mthird\x1b[0m\r\n"
+    assert (page["start"], page["end"]) == (1, 3)
+    assert log.read(3)["text"] == "partial"
+    # Out of range requests are clamped
+    assert log.read(2, 99)["end"] == 4
+
+
+def test_search_substring_regex_and_paging():
+    log = TerminalOutputLog()
+    for i in range(10):
+        log.append(f"line {i}: {'ERROR' if i % 3 == 0 else 'ok'} \x1b[32mdone\x1b[0m\r\n")
+    result = log.search("ERROR")
+    assert [hit["line"] for hit in result["matches"]] == [0, 3, 6, 9]
+    assert result["matches"][1]["text"] == "line 3: ERROR done"
+    assert log.search("error")["matches"] == []
+    assert len(log.search("error", ignore_case=True)["matches"]) == 4
+
+    first = log.search(r"line \d: ok", regex=True, limit=2)
+    assert [hit["line"] for hit in first["matches"]] == [1, 2]
+    rest = log.search(r"line \d: ok", regex=True, start_line=first["next_line"])
+    assert [hit["line"] for hit in rest["matches"]] == [4, 5, 7, 8]
+    assert rest["next_line"] is None
+
+    with pytest.raises(ValueError):
+        log.search("(", regex=True)
+
+
+def test_old_lines_are_dropped_but_numbers_are_kept():
+    log = TerminalOutputLog(max_bytes=1000)
+    for i in range(500):
+        log.append(f"{i:04d} ✓\n")
+    assert log.size <= 1000
+    assert log.end_line == 501
+    assert log.first_line > 0
+    # Surviving lines keep their original numbers
+    assert log.read(499, 500)["text"] == "0499 ✓\n"
+    assert log.read(0, 1)["start"] == log.first_line
+    assert log.search("0010")["matches"] == []
+    assert log.search("0490")["matches"][0]["line"] == 490
+
+
+def test_tail_starts_at_a_line_boundary():
+    log = TerminalOutputLog()
+    log.append("aaaa\nbbbb\ncccc\n$ ")
+    assert log.tail(100) == "aaaa\nbbbb\ncccc\n$ "
+    assert log.tail(8) == "cccc\n$ "
+    log.append("x" * 50)
+    assert log.tail(10) == "x" * 10
+
+
+def test_a_line_longer_than_the_budget_is_cut_at_the_head():
+    log = TerminalOutputLog(max_bytes=1000)
+    # A progress bar redrawn with \r never ends its line
+    for i in range(1000):
+        log.append(f"\r{i:04d}% ■")
+    assert log.size <= 1000
+    assert (log.first_line, log.end_line) == (0, 1)
+    page = log.read(0)
+    assert page["truncated"] and page["text"].endswith("\r0999% ■")
+    assert "�" not in page["text"]
+
+    # Once the long line is complete and scrolls out, reads are whole again
+    log.append("\n")
+    for i in range(200):
+        log.append(f"{i:04d}\n")
+    page = log.read(log.first_line)
+    assert log.first_line > 0 and not page["truncated"]
+
+
+def test_search_runs_on_a_snapshot_with_capped_query_and_matches():
+    log = TerminalOutputLog()
+    for i in range(1500):
+        log.append(f"hit {i}\n")
+    snapshot = log.snapshot()
+    log.append("hit late\n")
+    assert snapshot.end_line == 1501 and log.end_line == 1502
+
+    result = snapshot.search("hit", limit=10**6)
+    assert len(result["matches"]) == 1000 and result["next_line"] == 1000
+    with pytest.raises(ValueError):
+        snapshot.search("x" * 1001)
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from terminal_manager import TerminalSession, TerminalSessionManager, TerminalSessionLimitError
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="pty terminal is POSIX only")
+
+
+class FakeWebSocket:
+    def __init__(self, delay: float = 0):
+        self.frames = []
+        self.delay = delay
+        self.controls = []
+        self.closed = False
+
+    async def send_bytes(self, data):
+        self.controls.append(json.loads(data))
+
+    async def close(self, code=1000, reason=None):
+        self.closed = True
+
+    async def send_text(self, text):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.frames.append(text)
+
+
+async def _wait_for(websocket, until):
+    for _ in range(200):
+        if until("".join(websocket.frames)):
+            break
+        await asyncio.sleep(0.05)
+    return "".join(websocket.frames)
+
+
+async def _run(websocket, command, until):
+    session = TerminalSession()
+    await session.start()
+    session.attach(websocket)
+    try:
+        await session.write(command)
+        return await _wait_for(websocket, until)
+    finally:
+        await session.close()
+
+
+def test_pty_shell_decodes_multibyte_output_across_reads():
+    websocket = FakeWebSocket()
+    # 300k bytes of 3-byte characters: reads are bound to split some of them
+    output = asyncio.run(_run(websocket, "python3 -c \"print('あ' * 100000 + 'E' + 'ND')\"\n",
+                              lambda text: "あEND" in text))
+    assert "あ" * 1000 in output
+    assert "�" not in output
+
+
+def test_output_is_coalesced_and_reader_pauses_for_slow_client():
+    websocket = FakeWebSocket(delay=0.02)
+    output = asyncio.run(_run(websocket, "seq 1 100000; echo DO\"\"NE\n", lambda text: "DONE" in text))
+    assert "99999\r\n100000\r\n" in output
+    # ~590 KB of output arrives in a handful of large frames, not 1 KB pieces
+    assert len(websocket.frames) < 100
+
+
+def test_sessions_reattach_with_scrollback_and_reuse_warm_shells():
+    async def scenario():
+        manager = TerminalSessionManager(warm_shells=1, max_sessions_per_user=1)
+        await manager.start()
+        try:
+            first = FakeWebSocket()
+            session = await manager.attach(first, None, "alice")
+            assert first.controls == [{"type": "session", "id": session.id, "resumed": False, "end_line": 1}]
+            await asyncio.sleep(0.2)  # let the pool refill in the background
+            assert len(manager._warm) == 1
+
+            await session.write("echo remembered-$((40 + 2))\n")
+            await _wait_for(first, lambda text: "remembered-42" in text)
+            manager.detach(session, first)
+
+            # Output produced while detached still lands in scrollback
+            await session.write("echo while-$((1 + 1))-away\n")
+            await asyncio.sleep(0.3)
+
+            second = FakeWebSocket()
+            again = await manager.attach(second, session.id, "alice")
+            assert again is session and second.controls[0]["resumed"] is True
+            replay = await _wait_for(second, lambda text: "while-2-away" in text)
+            assert "remembered-42" in replay
+            hits = session.log.search("while-2-away")["matches"]
+            assert [hit["text"] for hit in hits] == ["while-2-away"]
+            assert "while-2-away" in session.log.read(hits[0]["line"], hits[0]["line"] + 1)["text"]
+
+            # Someone else cannot take over the session; alice is at her limit while attached
+            other = FakeWebSocket()
+            assert (await manager.attach(other, session.id, "bob")) is not session
+            with pytest.raises(TerminalSessionLimitError):
+                await manager.attach(FakeWebSocket(), None, "alice")
+
+            # Exiting the shell ends the session and closes the socket
+            await session.write("exit\n")
+            for _ in range(100):
+                if second.closed:
+                    break
+                await asyncio.sleep(0.05)
+            assert second.closed and manager.get(session.id) is None
+        finally:
+            await manager.shutdown()
+
+    asyncio.run(scenario())
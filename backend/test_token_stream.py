@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+
+from logger import AgentLogger
+from token_stream import DeltaCoalescer, TokenStreamRouter
+
+
+def test_chunks_are_coalesced_before_logging():
+    logger = AgentLogger(capacity=100)
+    stream = DeltaCoalescer(logger, "Coder", flush_chars=16, flush_interval=60)
+    for token in ["def ", "main", "(", ")", ":", "\n    ", "pass"]:
+        stream.feed(token)
+    assert [entry["message"] for entry in logger.get_logs()] == ["def main():\n    "]
+    stream.flush()
+    logs = logger.get_logs()
+    assert [entry["message"] for entry in logs] == ["def main():\n    ", "pass"]
+    assert {entry["type"] for entry in logs} == {"delta"} and logs[0]["role"] == "Coder"
+
+
+def test_router_keeps_concurrent_agents_apart():
+    router = TokenStreamRouter()
+    first, second = AgentLogger(capacity=100), AgentLogger(capacity=100)
+    coder_a = SimpleNamespace(id="a", role="Coder")
+    coder_b = SimpleNamespace(id="b", role="Coder")
+
+    with router.stream_to([coder_a], first), router.stream_to([coder_b], second):
+        router._on_chunk(None, SimpleNamespace(agent_id="a", chunk="print("))
+        router._on_chunk(None, SimpleNamespace(agent_id="b", chunk="x = 1"))
+        router._on_chunk(None, SimpleNamespace(agent_id="zzz", chunk="other run"))
+        router._on_call_end(None, SimpleNamespace(agent_id="b"))
+        assert [entry["message"] for entry in second.get_logs()] == ["x = 1"]
+        router._on_chunk(None, SimpleNamespace(agent_id="a", chunk="1)"))
+
+    # Leaving the block flushes what is left and stops routing
+    assert [entry["message"] for entry in first.get_logs()] == ["print(1)"]
+    router._on_chunk(None, SimpleNamespace(agent_id="a", chunk="late"))
+    assert len(first.get_logs()) == 1
@@ -0,0 +1,114 @@
+from workspace_index import WorkspaceIndex, notify_changed, register_index
+
+
+def test_index_tracks_nested_files_and_diffs(tmp_path):
+    (tmp_path / "main.py").write_text("print(1)", encoding="utf-8")
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "util.py").write_text("x = 1", encoding="utf-8")
+    (tmp_path / "__pycache__").mkdir()
+    (tmp_path / "__pycache__" / "main.pyc").write_bytes(b"\0")
+
+    index = WorkspaceIndex(tmp_path, poll_seconds=0)
+    index.rescan()
+    assert [entry["path"] for entry in index.entries()] == ["main.py", "pkg/util.py"]
+    version = index.version
+
+    # Rescan without changes is a no-op
+    index.rescan()
+    assert index.version == version
+    assert index.diffs_since(version) == []
+
+    (tmp_path / "pkg" / "util.py").write_text("x = 22", encoding="utf-8")
+    (tmp_path / "main.py").unlink()
+    (tmp_path / "new.txt").write_text("hi", encoding="utf-8")
+    index.rescan()
+    [diff] = index.diffs_since(version)
+    assert [entry["path"] for entry in diff["added"]] == ["new.txt"]
+    assert [entry["path"] for entry in diff["changed"]] == ["pkg/util.py"]
+    assert diff["removed"] == ["main.py"]
+    assert index.get("pkg/util.py")["size"] == 6
+
+
+def test_notify_changed_updates_registered_index(tmp_path):
+    index = register_index(WorkspaceIndex(tmp_path / "ws", poll_seconds=0))
+    (tmp_path / "ws").mkdir()
+    index.rescan()
+    diffs = []
+    index.add_listener(diffs.append)
+
+    target = tmp_path / "ws" / "app.py"
+    target.write_text("print('hi')", encoding="utf-8")
+    notify_changed(target)
+    assert b'"app.py"' in index.listing_json()
+    assert diffs[-1]["added"][0]["path"] == "app.py"
+
+    # Paths outside every index are ignored
+    notify_changed(tmp_path / "elsewhere.py")
+    assert len(diffs) == 1
+
+    target.unlink()
+    notify_changed(target)
+    assert diffs[-1]["removed"] == ["app.py"]
+    assert index.entries() == []
+
+
+def test_hashing_does_not_hold_the_index_lock(tmp_path, monkeypatch):
+    import threading
+    import workspace_index
+
+    (tmp_path / "a.py").write_text("a = 1", encoding="utf-8")
+    index = WorkspaceIndex(tmp_path, poll_seconds=0)
+    index.rescan()
+    (tmp_path / "b.py").write_text("b = 2", encoding="utf-8")
+
+    lock_free = []
+    real_hash = workspace_index.file_hash
+
+    def checking_hash(path):
+        # Another thread (a /api/files request) must be able to take the lock
+        def probe():
+            acquired = index._lock.acquire(blocking=False)
+            if acquired:
+                index._lock.release()
+            lock_free.append(acquired)
+
+        thread = threading.Thread(target=probe)
+        thread.start()
+        thread.join()
+        return real_hash(path)
+
+    monkeypatch.setattr(workspace_index, "file_hash", checking_hash)
+    index.rescan()
+    index.refresh_path(tmp_path / "a.py")
+    (tmp_path / "a.py").write_text("a = 22", encoding="utf-8")
+    index.refresh_path(tmp_path / "a.py")
+    assert lock_free and all(lock_free)
+    assert [entry["path"] for entry in index.entries()] == ["a.py", "b.py"]
+    assert index.get("a.py")["size"] == 6
+
+
+def test_directory_rescan_only_touches_that_subtree(tmp_path):
+    import os
+    import shutil
+
+    for rel in ("top.py", "pkg/a.py", "pkg/sub/b.py", "other/c.py"):
+        (tmp_path / rel).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / rel).write_text(rel, encoding="utf-8")
+    index = WorkspaceIndex(tmp_path, poll_seconds=0)
+    version, entries = index.snapshot()
+    assert len(entries) == 4
+
+    # A directory moved away: only its files are removed, even if others changed unseen
+    shutil.move(str(tmp_path / "pkg"), str(tmp_path / "moved"))
+    (tmp_path / "other" / "c.py").write_text("changed", encoding="utf-8")
+    index.rescan(tmp_path / "pkg")
+    index.rescan(tmp_path / "moved")
+    paths = [entry["path"] for entry in index.entries()]
+    assert paths == ["moved/a.py", "moved/sub/b.py", "other/c.py", "top.py"]
+    assert index.get("other/c.py")["size"] == len("other/c.py")
+
+    # A touched but identical file refreshes the cached listing's mtime
+    listing = index.listing_json()
+    os.utime(tmp_path / "top.py", (1, 1))
+    index.refresh_path(tmp_path / "top.py")
+    assert index.listing_json() != listing and index.get("top.py")["mtime"] == 1
@@ -0,0 +1,111 @@
+import os
+
+from file_writer import write_file
+from workspace_reader import WorkspaceReader, reader_for
+
+SOURCE = '''import os
+
+LIMIT = 10
+
+
+class Store:
+    def get(self, key: str) -> str:
+        return key
+
+    async def put(self, key, value=None):
+        pass
+
+
+def main(argv) -> int:
+    return 0
+'''
+
+
+def test_line_ranges_head_tail_and_outline(tmp_path):
+    (tmp_path / "app.py").write_text(SOURCE, encoding="utf-8")
+    reader = WorkspaceReader(tmp_path)
+
+    assert reader.read("app.py") == SOURCE
+    assert reader.read("app.py", start_line=6, end_line=7) == (
+        "[lines 6-7 of 15]\nclass Store:\n    def get(self, key: str) -> str:\n"
+    )
+    assert reader.read("app.py", mode="head", lines=1) == "[lines 1-1 of 15]\nimport os\n"
+    assert reader.read("app.py", mode="tail", lines=2) == "[lines 14-15 of 15]\ndef main(argv) -> int:\n    return 0\n"
+    assert reader.read("app.py", start_line=40) == "[no lines in range; the file has 15 lines]"
+    assert reader.read("app.py", mode="outline").splitlines() == [
+        "1: import os",
+        "3: LIMIT = ...",
+        "6: class Store",
+        "7:     def get(self, key: str) -> str",
+        "10:     async def put(self, key, value=None)",
+        "14: def main(argv) -> int",
+    ]
+
+
+def test_max_bytes_cuts_on_a_line_and_says_where_to_continue(tmp_path):
+    (tmp_path / "big.txt").write_text("".join(f"line {i}\n" for i in range(1, 1001)), encoding="utf-8")
+    output = WorkspaceReader(tmp_path).read("big.txt", max_bytes=30)
+    assert output == "line 1\nline 2\nline 3\nline 4\n[truncated at 30 bytes; continue with start_line=5]"
+
+
+def test_reads_are_cached_until_the_file_changes(tmp_path, monkeypatch):
+    target = tmp_path / "notes.md"
+    target.write_text("# v1\n", encoding="utf-8")
+    reader = WorkspaceReader(tmp_path)
+    assert reader.read_text("notes.md") == "# v1\n"
+
+    opened = []
+    real_read_text = type(target).read_text
+    monkeypatch.setattr(type(target), "read_text", lambda self, *a, **k: opened.append(self) or real_read_text(self, *a, **k))
+    assert reader.read_text("notes.md") == "# v1\n"
+    assert opened == []
+
+    target.write_text("# version 2\n", encoding="utf-8")
+    assert reader.read_text("notes.md") == "# version 2\n"
+    assert len(opened) == 1
+
+
+def test_listing_is_cached_and_follows_writes(tmp_path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "app.js").write_text("x", encoding="utf-8")
+    (tmp_path / "README.md").write_text("hello", encoding="utf-8")
+    (tmp_path / "node_modules").mkdir()
+    (tmp_path / "node_modules" / "dep.js").write_text("", encoding="utf-8")
+
+    reader = reader_for(tmp_path)
+    assert reader is reader_for(str(tmp_path))
+    assert reader.list() == [("README.md", 5), ("src/app.js", 1)]
+    assert reader.list("*.js") == [("src/app.js", 1)]
+    assert reader.list("**/*.md") == [("README.md", 5)]
+    assert reader.list(directory="src") == [("src/app.js", 1)]
+
+    # Writes through the write pipeline refresh sizes and contents
+    write_file(tmp_path, "src/app.js", "longer")
+    write_file(tmp_path, "src/util/helpers.js", "y")
+    assert reader.list(directory="src") == [("src/app.js", 6), ("src/util/helpers.js", 1)]
+    # So do changes made by other processes, through directory mtimes
+    os.remove(tmp_path / "README.md")
+    assert [path for path, _ in reader.list()] == ["src/app.js", "src/util/helpers.js"]
+
+
+def test_workspace_reached_through_a_symlink(tmp_path):
+    from file_writer import resolve_in_workspace
+    from workspace_index import WorkspaceIndex, register_index
+
+    real = tmp_path / "real"
+    real.mkdir()
+    link = tmp_path / "link"
+    link.symlink_to(real, target_is_directory=True)
+    index = register_index(WorkspaceIndex(link, poll_seconds=0))
+    write_file(link, "pkg/app.py", "v = 1\n")
+
+    # Tool paths are abspath-based, the reader and index roots are resolved
+    reader = reader_for(link)
+    rel = reader.relative(resolve_in_workspace(link, "pkg/app.py"))
+    assert rel == "pkg/app.py" and reader.read(rel) == "v = 1\n"
+    assert [entry["path"] for entry in index.entries()] == ["pkg/app.py"]
+
+    # Writes through the link invalidate the reader cache and update the index
+    write_file(link, "pkg/app.py", "v = 22\n")
+    assert reader.read(rel) == "v = 22\n"
+    assert index.get("pkg/app.py")["size"] == 7
@@ -0,0 +1,126 @@
+"""
+Forward streamed LLM tokens into the activity log as "delta" entries.
+
+With LLM_STREAM=1 the agents' LLM is created with stream=True and CrewAI emits
+an LLMStreamChunkEvent per token on its global event bus. token_router listens
+for those events and hands each chunk to the coalescer registered for the
+emitting agent, so concurrent jobs never mix their output. Chunks are joined
+and logged once LLM_STREAM_CHUNK_CHARS have accumulated or LLM_STREAM_FLUSH_MS
+have passed, and whatever is left when the call completes is flushed then.
+
+Consecutive "delta" entries of one role form a single growing message; the
+frontend appends them to the previous entry instead of adding a line each.
+"""
+import contextlib
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from logger import AgentLogger
+
+STREAM_ENABLED = os.getenv("LLM_STREAM", "1").lower() not in ("0", "false", "no", "off")
+FLUSH_CHARS = int(os.getenv("LLM_STREAM_CHUNK_CHARS", "200"))
+FLUSH_INTERVAL = float(os.getenv("LLM_STREAM_FLUSH_MS", "150")) / 1000
+
+try:
+    from crewai.events import crewai_event_bus
+    from crewai.events.types.llm_events import LLMCallCompletedEvent, LLMCallFailedEvent, LLMStreamChunkEvent
+except ImportError:  # older CrewAI without the event bus: no streaming
+    crewai_event_bus = None
+
+
+class DeltaCoalescer:
+    """Joins token chunks of one agent and logs them in larger pieces."""
+
+    def __init__(
+        self,
+        logger: AgentLogger,
+        role: str,
+        flush_chars: int = FLUSH_CHARS,
+        flush_interval: float = FLUSH_INTERVAL,
+    ):
+        self.logger = logger
+        self.role = role
+        self.flush_chars = flush_chars
+        self.flush_interval = flush_interval
+        self._parts = []
+        self._chars = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def feed(self, chunk: str):
+        if not chunk:
+            return
+        with self._lock:
+            self._parts.append(chunk)
+            self._chars += len(chunk)
+            due = self._chars >= self.flush_chars or time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            text = "".join(self._parts)
+            self._parts = []
+            self._chars = 0
+            self._last_flush = time.monotonic()
+        if text:
+            self.logger.log(self.role, text, "delta")
+
+
+class TokenStreamRouter:
+    """Routes CrewAI stream events to the coalescer of the agent that produced them."""
+
+    def __init__(self):
+        self._streams: Dict[str, DeltaCoalescer] = {}
+        self._lock = threading.Lock()
+        self._listening = False
+
+    def _listen(self):
+        if self._listening or crewai_event_bus is None:
+            return
+        crewai_event_bus.on(LLMStreamChunkEvent)(self._on_chunk)
+        crewai_event_bus.on(LLMCallCompletedEvent)(self._on_call_end)
+        crewai_event_bus.on(LLMCallFailedEvent)(self._on_call_end)
+        self._listening = True
+
+    def _stream_for(self, event) -> Optional[DeltaCoalescer]:
+        agent_id = getattr(event, "agent_id", None)
+        if agent_id is None:
+            return None
+        with self._lock:
+            return self._streams.get(str(agent_id))
+
+    def _on_chunk(self, source, event):
+        stream = self._stream_for(event)
+        if stream is not None:
+            stream.feed(getattr(event, "chunk", "") or "")
+
+    def _on_call_end(self, source, event):
+        stream = self._stream_for(event)
+        if stream is not None:
+            stream.flush()
+
+    @contextlib.contextmanager
+    def stream_to(self, agents: Iterable, logger: AgentLogger, role: Optional[str] = None):
+        """
+        Log streamed tokens of these agents to logger while the block runs, under
+        role if given (e.g. to tell parallel Coders apart) or else the agent's role.
+        """
+        with self._lock:
+            self._listen()
+            streams = {str(agent.id): DeltaCoalescer(logger, role or agent.role) for agent in agents}
+            self._streams.update(streams)
+        try:
+            yield
+        finally:
+            with self._lock:
+                for agent_id in streams:
+                    self._streams.pop(agent_id, None)
+            for stream in streams.values():
+                stream.flush()
+
+
+# Global instance
+token_router = TokenStreamRouter()
@@ -0,0 +1,348 @@
+"""
+In-memory index of a workspace directory tree.
+
+The index keeps (path, size, mtime, hash) for every file and a version number that
+increases on every change. The serialized listing is cached per version, so
+/api/files is answered without touching the disk, and the version doubles as ETag.
+
+Changes come from three places:
+- explicit notify_changed() calls after our own writes (tools, auto-save, job publish)
+- watchdog filesystem events, when the optional watchdog package is installed
+- otherwise a background stat-only rescan every WORKSPACE_POLL_SECONDS
+
+Scans stat and hash files without holding the index lock, so queries keep
+being answered from the current entries while a scan runs; the lock is only
+taken to swap the results in. Scans run one at a time.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # optional dependency
+    Observer = None
+    FileSystemEventHandler = object
+
+POLL_SECONDS = float(os.getenv("WORKSPACE_POLL_SECONDS", "2"))
+# Number of diffs kept so reconnecting clients can catch up without a full listing
+DIFF_HISTORY = 256
+# Directory names never indexed
+IGNORED_DIRS = {"__pycache__", "node_modules", ".git", ".venv", "venv"}
+
+
+def canonical_path(path) -> str:
+    """
+    Absolute path with symlinks in its directories resolved, like the roots of
+    indexes and readers (Path.resolve()), so a workspace reached through a
+    symlink still matches them. The last component is kept as named.
+    """
+    path = os.path.abspath(path)
+    return os.path.join(os.path.realpath(os.path.dirname(path)), os.path.basename(path))
+
+
+def file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _WatchHandler(FileSystemEventHandler):
+    def __init__(self, index: "WorkspaceIndex"):
+        self._index = index
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            # A directory's "modified" event only echoes changes to its files, which
+            # get their own events; created/deleted/moved directories are rescanned alone
+            if event.event_type != "modified":
+                for path in (event.src_path, getattr(event, "dest_path", None)):
+                    if path:
+                        self._index.rescan(path)
+            return
+        for path in (event.src_path, getattr(event, "dest_path", None)):
+            if path:
+                self._index.refresh_path(path)
+
+
+class WorkspaceIndex:
+    def __init__(self, root: Path, poll_seconds: float = POLL_SECONDS):
+        self.root = Path(root).resolve()
+        self.poll_seconds = poll_seconds
+        self.version = 0
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._diffs: deque = deque(maxlen=DIFF_HISTORY)
+        self._listing_cache: Optional[bytes] = None
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._lock = threading.RLock()
+        # Serializes scans; held while walking and hashing, unlike _lock
+        self._scan_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._observer = None
+        self._scanned = False
+
+    # -- lifecycle -------------------------------------------------------
+
+    def start(self, scan: bool = True):
+        """
+        Initial scan plus change tracking (watchdog if available, else polling).
+        With scan=False the caller runs the initial rescan() itself, e.g. off the
+        event loop; queries made before it finishes wait for it.
+        """
+        if scan:
+            self.rescan()
+        if self._thread or self._observer:
+            return
+        self._stop.clear()
+        if Observer is not None and self.root.exists():
+            self._observer = Observer()
+            self._observer.schedule(_WatchHandler(self), str(self.root), recursive=True)
+            self._observer.daemon = True
+            self._observer.start()
+        elif self.poll_seconds > 0:
+            self._thread = threading.Thread(target=self._poll, name="workspace-index", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+        self._thread = None
+
+    def _poll(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.rescan()
+            except OSError as e:
+                print(f"Workspace index rescan failed: {e}")
+
+    # -- queries ---------------------------------------------------------
+
+    @property
+    def etag(self) -> str:
+        return f'"ws-{self.version}"'
+
+    def entries(self) -> List[Dict[str, Any]]:
+        self._ensure_scanned()
+        with self._lock:
+            return [self._entries[path] for path in sorted(self._entries)]
+
+    def snapshot(self) -> Tuple[int, List[Dict[str, Any]]]:
+        """(version, entries) of one consistent state. Waits for the first scan, so async code runs it in an executor."""
+        self._ensure_scanned()
+        with self._lock:
+            return self.version, [dict(self._entries[path]) for path in sorted(self._entries)]
+
+    def get(self, rel_path: str) -> Optional[Dict[str, Any]]:
+        self._ensure_scanned()
+        return self._entries.get(rel_path)
+
+    def listing_json(self) -> bytes:
+        """Serialized /api/files body, cached until the next change."""
+        self._ensure_scanned()
+        with self._lock:
+            if self._listing_cache is None:
+                entries = self.entries()
+                self._listing_cache = json.dumps({
+                    "files": [entry["path"] for entry in entries],
+                    "entries": entries,
+                    "version": self.version,
+                }, ensure_ascii=False).encode("utf-8")
+            return self._listing_cache
+
+    def diffs_since(self, version: int) -> Optional[List[Dict[str, Any]]]:
+        """Diffs after version, or None if they were dropped from history (resync needed)."""
+        with self._lock:
+            if version == self.version:
+                return []
+            if not self._diffs or self._diffs[0]["version"] > version + 1:
+                return None
+            return [diff for diff in self._diffs if diff["version"] > version]
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        """Register a callback invoked (from the changing thread) with every diff."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    # -- updates ---------------------------------------------------------
+
+    def rescan(self, path=None):
+        """
+        Walk the tree, or only the directory path (absolute or workspace-relative);
+        only files whose size/mtime changed are re-hashed.
+        """
+        subtree = None
+        if path is not None:
+            subtree = self._relative(path)
+            if subtree is None:
+                return
+        with self._scan_lock:
+            # The first scan always covers the whole tree
+            self._rescan(subtree if self._scanned and subtree != "." else None)
+
+    def _rescan(self, subtree: Optional[str] = None):
+        found: Dict[str, os.stat_result] = {}
+        top = self.root / subtree if subtree else self.root
+        if top.is_dir():
+            stack = [top]
+            while stack:
+                directory = stack.pop()
+                try:
+                    with os.scandir(directory) as it:
+                        for entry in it:
+                            if entry.name.startswith(".") or entry.name in IGNORED_DIRS:
+                                continue
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(Path(entry.path))
+                            elif entry.is_file():
+                                rel = Path(entry.path).relative_to(self.root).as_posix()
+                                found[rel] = entry.stat()
+                except OSError:
+                    continue
+
+        with self._lock:
+            current = dict(self._entries)
+        updates = {rel: self._entry_for(rel, stat, current.get(rel)) for rel, stat in found.items()}
+        with self._lock:
+            # Skip paths that refresh_path() updated meanwhile; its result is newer
+            changes = {}
+            for rel, update in updates.items():
+                if update is not None and self._entries.get(rel) is current.get(rel):
+                    changes[rel] = self._merge(rel, update)
+            removed = [
+                rel for rel, entry in current.items()
+                if (subtree is None or rel.startswith(subtree + "/"))
+                and rel not in found and self._entries.get(rel) is entry
+            ]
+            self._scanned = True
+            self._apply({rel: entry for rel, entry in changes.items() if entry is not None}, removed)
+
+    def refresh_path(self, path) -> bool:
+        """Re-stat one file (absolute or workspace-relative). Returns False if outside the root."""
+        rel = self._relative(path)
+        if rel is None:
+            return False
+        self._ensure_scanned()
+        abs_path = self.root / rel
+        try:
+            stat = abs_path.stat()
+        except OSError:
+            stat = None
+        if stat is None or not abs_path.is_file():
+            with self._lock:
+                if rel in self._entries:
+                    self._apply({}, [rel])
+            return True
+        update = self._entry_for(rel, stat, self._entries.get(rel))
+        if update is not None:
+            with self._lock:
+                entry = self._merge(rel, update)
+                if entry is not None:
+                    self._apply({rel: entry}, [])
+        return True
+
+    def _entry_for(self, rel: str, stat: os.stat_result, current: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Stat and hash of rel if it differs from current, else None. Reads the disk,
+        so it is called without the lock; _merge applies the result.
+        """
+        if current and current["size"] == stat.st_size and current["mtime"] == stat.st_mtime:
+            return None
+        try:
+            digest = file_hash(self.root / rel)
+        except OSError:
+            return None
+        return {"path": rel, "size": stat.st_size, "mtime": stat.st_mtime, "hash": digest}
+
+    def _merge(self, rel: str, update: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The entry to store for an _entry_for() result, or None if the content is unchanged. Needs the lock."""
+        current = self._entries.get(rel)
+        if current and current["hash"] == update["hash"] and current["size"] == update["size"]:
+            # Touched but identical: keep the entry, just remember the new mtime
+            current["mtime"] = update["mtime"]
+            self._listing_cache = None
+            return None
+        return update
+
+    def _apply(self, changes: Dict[str, Dict[str, Any]], removed: List[str]):
+        if not changes and not removed:
+            return
+        added = [entry for rel, entry in changes.items() if rel not in self._entries]
+        changed = [entry for rel, entry in changes.items() if rel in self._entries]
+        self._entries.update(changes)
+        for rel in removed:
+            self._entries.pop(rel, None)
+        self.version += 1
+        self._listing_cache = None
+        diff = {"version": self.version, "added": added, "changed": changed, "removed": removed}
+        self._diffs.append(diff)
+        for listener in list(self._listeners):
+            try:
+                listener(diff)
+            except Exception as e:
+                print(f"Workspace index listener failed: {e}")
+
+    def _relative(self, path) -> Optional[str]:
+        path = Path(path)
+        if not path.is_absolute():
+            path = self.root / path
+        try:
+            rel = Path(canonical_path(path)).relative_to(self.root)
+        except ValueError:
+            return None
+        if any(part.startswith(".") or part in IGNORED_DIRS for part in rel.parts):
+            return None
+        return rel.as_posix()
+
+    def _ensure_scanned(self):
+        if not self._scanned:
+            with self._scan_lock:
+                # Another thread may have finished the scan while we waited
+                if not self._scanned:
+                    self._rescan()
+
+
+# Indexes by root, so writers can report changes without knowing who indexes what
+_indexes: List[WorkspaceIndex] = []
+# Other caches of workspace content (see workspace_reader), called with every changed path
+_change_hooks: List[Callable[[str], None]] = []
+
+
+def register_index(index: WorkspaceIndex) -> WorkspaceIndex:
+    _indexes.append(index)
+    return index
+
+
+def index_for(root) -> Optional[WorkspaceIndex]:
+    """The registered index of exactly this root, if any."""
+    root = Path(root).resolve()
+    for index in _indexes:
+        if index.root == root:
+            return index
+    return None
+
+
+def add_change_hook(hook: Callable[[str], None]):
+    _change_hooks.append(hook)
+
+
+def notify_changed(path):
+    """Tell any index or cache covering path that it was written or deleted. No-op elsewhere."""
+    path = canonical_path(path)
+    for hook in _change_hooks:
+        hook(path)
+    for index in _indexes:
+        if index.refresh_path(path):
+            return
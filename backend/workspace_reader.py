@@ -0,0 +1,320 @@
+"""
+Cached reads and listings of a workspace for the agent file tools.
+
+Agents in one crew keep re-reading the same files, so there is one
+WorkspaceReader per workspace root (see reader_for), shared by every tool bound
+to that root. It caches:
+- file contents by (mtime, size), bounded by READ_CACHE_CHARS
+- the file tree; for the indexed shared workspace the WorkspaceIndex is used,
+  elsewhere a scandir walk is kept until a directory's mtime changes or one of
+  our writers reports a change through notify_changed
+
+Reads can be narrowed to a line range, the head or tail of a file, or an outline
+(top-level definitions), and are capped at a byte limit so a large file does not
+end up in the prompt whole.
+"""
+import ast
+import fnmatch
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from workspace_index import IGNORED_DIRS, add_change_hook, canonical_path, index_for
+
+# Characters of file content cached per workspace
+READ_CACHE_CHARS = int(os.getenv("READ_CACHE_CHARS", str(16 * 1024 * 1024)))
+# Default cap on what one read returns
+DEFAULT_MAX_BYTES = int(os.getenv("READ_MAX_BYTES", str(100 * 1024)))
+# Lines returned by head/tail when no count is given
+DEFAULT_LINES = 50
+MAX_LIST_ENTRIES = 500
+# Workspaces whose readers are kept (the shared one plus recent jobs)
+MAX_READERS = 16
+
+MODES = ("full", "head", "tail", "outline")
+
+# Definition lines for the outline of non-Python files
+_JS_DEFINITION = re.compile(
+    r"^\s*(export\s+)?(default\s+)?(async\s+)?(function|class)\b"
+    r"|^\s*(export\s+)?(const|let)\s+\w+\s*=\s*(async\s*)?\("
+)
+_OUTLINE_PATTERNS = {
+    ".js": _JS_DEFINITION,
+    ".jsx": _JS_DEFINITION,
+    ".ts": _JS_DEFINITION,
+    ".tsx": _JS_DEFINITION,
+    ".md": re.compile(r"^#{1,6}\s"),
+    ".html": re.compile(r"^\s*<(h[1-6]|section|form|script|style)\b"),
+    ".css": re.compile(r"^[^\s{][^{]*\{"),
+}
+
+
+class WorkspaceReader:
+    def __init__(self, root, cache_chars: int = READ_CACHE_CHARS):
+        self.root = Path(root).resolve()
+        self.cache_chars = cache_chars
+        # rel path -> ((mtime_ns, size), text, line offsets)
+        self._files: "OrderedDict[str, Tuple[Tuple[int, int], str, List[int]]]" = OrderedDict()
+        self._cached_chars = 0
+        self._tree: Optional[Dict[str, int]] = None
+        self._dir_mtimes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    # -- listing ---------------------------------------------------------
+
+    def tree(self) -> Dict[str, int]:
+        """Workspace-relative posix path -> size for every file, sorted by path."""
+        index = index_for(self.root)
+        if index is not None:
+            return {entry["path"]: entry["size"] for entry in index.entries()}
+        with self._lock:
+            if self._tree is None or self._dirs_changed():
+                self._scan()
+            return self._tree
+
+    def list(self, pattern: Optional[str] = None, directory: Optional[str] = None) -> List[Tuple[str, int]]:
+        """
+        Files under directory matching a glob pattern ("*.py", "src/**/*.js").
+        A pattern without "/" is matched against file names as well as paths.
+        """
+        prefix = directory.strip("/\\").replace("\\", "/") + "/" if directory and directory.strip("/\\") else ""
+        result = []
+        for path, size in self.tree().items():
+            if prefix and not path.startswith(prefix):
+                continue
+            if pattern and not _glob_match(path[len(prefix):], pattern):
+                continue
+            result.append((path, size))
+        return result
+
+    def _scan(self):
+        tree: Dict[str, int] = {}
+        dir_mtimes: Dict[str, int] = {}
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            try:
+                dir_mtimes[str(directory)] = directory.stat().st_mtime_ns
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.name.startswith(".") or entry.name in IGNORED_DIRS:
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(Path(entry.path))
+                        elif entry.is_file():
+                            rel = Path(entry.path).relative_to(self.root).as_posix()
+                            tree[rel] = entry.stat().st_size
+            except OSError:
+                continue
+        self._tree = dict(sorted(tree.items()))
+        self._dir_mtimes = dir_mtimes
+
+    def _dirs_changed(self) -> bool:
+        # Creating, deleting or renaming a file touches its directory's mtime
+        for directory, mtime in self._dir_mtimes.items():
+            try:
+                if os.stat(directory).st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def relative(self, path) -> Optional[str]:
+        """rel path of an absolute path under the root (reached through symlinks or not), else None."""
+        try:
+            return Path(canonical_path(path)).relative_to(self.root).as_posix()
+        except ValueError:
+            return None
+
+    def invalidate(self, path: Path):
+        """Forget the tree and any cached content of path after a write or delete."""
+        rel = self.relative(path)
+        if rel is None:
+            return
+        with self._lock:
+            self._tree = None
+            entry = self._files.pop(rel, None)
+            if entry is not None:
+                self._cached_chars -= len(entry[1])
+
+    # -- reading ---------------------------------------------------------
+
+    def read_text(self, rel_path: str) -> str:
+        """Whole file as text, from the cache while its mtime and size are unchanged."""
+        text, _ = self._load(rel_path)
+        return text
+
+    def read(
+        self,
+        rel_path: str,
+        start_line: Optional[int] = None,
+        end_line: Optional[int] = None,
+        mode: str = "full",
+        lines: Optional[int] = None,
+        max_bytes: Optional[int] = DEFAULT_MAX_BYTES,
+    ) -> str:
+        """
+        Content of rel_path for an agent. start_line/end_line are 1-based and
+        inclusive. Partial reads start with a "[lines a-b of n]" header, and output
+        cut at max_bytes ends with a note on how to read the rest.
+        """
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        text, offsets = self._load(rel_path)
+        if mode == "outline":
+            return _cap(self._outline(rel_path, text), max_bytes, None)
+
+        total = len(offsets) - 1 if offsets[-1] == len(text) and len(offsets) > 1 else len(offsets)
+        if not text:
+            total = 0
+        if mode == "head":
+            start, end = 1, lines or DEFAULT_LINES
+        elif mode == "tail":
+            start, end = total - (lines or DEFAULT_LINES) + 1, total
+        else:
+            start, end = start_line or 1, end_line or total
+        start, end = max(start, 1), min(end, total)
+        if (start, end) == (1, total):
+            return _cap(text, max_bytes, 1)
+        if start > end:
+            return f"[no lines in range; the file has {total} lines]"
+        body = text[offsets[start - 1]:offsets[end] if end < len(offsets) else len(text)]
+        return _cap(f"[lines {start}-{end} of {total}]\n{body}", max_bytes, start)
+
+    def _load(self, rel_path: str) -> Tuple[str, List[int]]:
+        path = self.root / rel_path
+        stat = path.stat()
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._files.get(rel_path)
+            if cached is not None and cached[0] == key:
+                self._files.move_to_end(rel_path)
+                return cached[1], cached[2]
+        text = path.read_text(encoding="utf-8", errors="replace")
+        offsets = _line_offsets(text)
+        with self._lock:
+            previous = self._files.pop(rel_path, None)
+            if previous is not None:
+                self._cached_chars -= len(previous[1])
+            if len(text) <= self.cache_chars:
+                self._files[rel_path] = (key, text, offsets)
+                self._cached_chars += len(text)
+                while self._cached_chars > self.cache_chars:
+                    _, (_, evicted, _) = self._files.popitem(last=False)
+                    self._cached_chars -= len(evicted)
+        return text, offsets
+
+    def _outline(self, rel_path: str, text: str) -> str:
+        suffix = Path(rel_path).suffix.lower()
+        if suffix == ".py":
+            try:
+                return _python_outline(text)
+            except SyntaxError as e:
+                return f"[cannot outline: {e.msg} at line {e.lineno}]"
+        pattern = _OUTLINE_PATTERNS.get(suffix)
+        if pattern is None:
+            return "[no outline for this file type; use mode head or a line range]"
+        lines = [
+            f"{number}: {line.strip()}"
+            for number, line in enumerate(text.splitlines(), 1)
+            if pattern.search(line)
+        ]
+        return "\n".join(lines) or "[no definitions found]"
+
+
+def _line_offsets(text: str) -> List[int]:
+    """Start offset of every line, plus len(text) if the text ends with a newline."""
+    offsets = [0]
+    pos = text.find("\n")
+    while pos != -1:
+        offsets.append(pos + 1)
+        pos = text.find("\n", pos + 1)
+    return offsets
+
+
+def _python_outline(text: str) -> str:
+    lines = []
+
+    def signature(node) -> str:
+        if isinstance(node, ast.ClassDef):
+            bases = ", ".join(ast.unparse(base) for base in node.bases)
+            return f"class {node.name}({bases})" if bases else f"class {node.name}"
+        prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+        returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+        return f"{prefix} {node.name}({ast.unparse(node.args)}){returns}"
+
+    tree = ast.parse(text)
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            lines.append(f"{node.lineno}: {signature(node)}")
+            if isinstance(node, ast.ClassDef):
+                for child in node.body:
+                    if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                        lines.append(f"{child.lineno}:     {signature(child)}")
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            names = [target.id for target in targets if isinstance(target, ast.Name)]
+            if names:
+                lines.append(f"{node.lineno}: {', '.join(names)} = ...")
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            lines.append(f"{node.lineno}: {ast.unparse(node)}")
+    return "\n".join(lines) or "[no top-level definitions]"
+
+
+def _cap(text: str, max_bytes: Optional[int], first_line: Optional[int]) -> str:
+    if not max_bytes:
+        return text
+    data = text.encode("utf-8")
+    if len(data) <= max_bytes:
+        return text
+    cut = data[:max_bytes].decode("utf-8", errors="ignore")
+    # End on a whole line so the continuation point is exact
+    if "\n" in cut:
+        cut = cut[:cut.rindex("\n") + 1]
+    note = f"[truncated at {max_bytes} bytes"
+    if first_line is not None:
+        shown = cut.count("\n") - (1 if cut.startswith("[lines ") else 0)
+        note += f"; continue with start_line={first_line + shown}"
+    return cut + note + "]"
+
+
+def _glob_match(path: str, pattern: str) -> bool:
+    pattern = pattern.replace("\\", "/").lstrip("/")
+    if "/" not in pattern:
+        return fnmatch.fnmatchcase(path.rsplit("/", 1)[-1], pattern)
+    # "**/" also matches zero directories
+    return fnmatch.fnmatchcase(path, pattern) or (
+        pattern.startswith("**/") and fnmatch.fnmatchcase(path, pattern[3:])
+    )
+
+
+_readers: "OrderedDict[str, WorkspaceReader]" = OrderedDict()
+_readers_lock = threading.Lock()
+
+
+def reader_for(workspace_path) -> WorkspaceReader:
+    """The shared reader of a workspace, so all agents of a job hit one cache."""
+    root = os.path.abspath(workspace_path)
+    with _readers_lock:
+        reader = _readers.get(root)
+        if reader is None:
+            reader = _readers[root] = WorkspaceReader(root)
+            if len(_readers) > MAX_READERS:
+                _readers.popitem(last=False)
+        else:
+            _readers.move_to_end(root)
+        return reader
+
+
+def _on_change(path: str):
+    with _readers_lock:
+        readers = list(_readers.values())
+    for reader in readers:
+        if path.startswith(str(reader.root) + os.sep):
+            reader.invalidate(Path(path))
+
+
+add_change_hook(_on_change)
@@ -14,78 +14,151 @@ function App() {
   const [activityLogs, setActivityLogs] = useState([])
   const [isProcessing, setIsProcessing] = useState(false)
 
-  // Use a Ref to store the latest timestamp to avoid re-creating the interval
-  const lastTimestampRef = useRef(null);
+  // Use a Ref to store the latest sequence id so reconnects resume where we left off
+  const lastSeqRef = useRef(null);
+  // Epoch of the backend process that issued lastSeqRef (seqs restart with the process)
+  const epochRef = useRef(null);
 
-  // Poll for activity logs
+  const fetchPayload = async (id) => {
+    const res = await axios.get(`http://localhost:8000/api/payloads/${id}`, { responseType: 'text', transformResponse: r => r });
+    return res.data;
+  };
+
+  // Replace a truncated activity entry with its full text
+  const expandLog = async (seq, id) => {
+    try {
+      const full = await fetchPayload(id);
+      setActivityLogs(prev => prev.map(l => (l.seq === seq ? { ...l, message: full, payload: undefined } : l)));
+    } catch (error) {
+      console.error('Failed to load full message', error);
+    }
+  };
+
+  // Stream activity logs over WebSocket (server pushes batched frames)
   useEffect(() => {
-    const interval = setInterval(async () => {
-      try {
-        const timestamp = lastTimestampRef.current;
-        const url = timestamp ? `http://localhost:8000/api/activity?after=${timestamp}` : 'http://localhost:8000/api/activity';
-
-        const response = await axios.get(url);
-        if (response.data.logs && response.data.logs.length > 0) {
-          const newLogs = response.data.logs;
-
-          let hasNew = false;
-          // De-duplicate in place if needed, but timestamp filtering should handle it.
-          // Still good to update the ref.
-          const lastLog = newLogs[newLogs.length - 1];
-          if (lastLog) {
-            lastTimestampRef.current = lastLog.timestamp;
-            hasNew = true;
+    let socket = null;
+    let reconnectTimer = null;
+    let closed = false;
+
+    const handleNewLogs = (newLogs) => {
+      lastSeqRef.current = newLogs[newLogs.length - 1].seq;
+
+      setActivityLogs(prev => {
+        // Double check for duplicates (e.g. replay after reconnect)
+        const existingIds = new Set(prev.map(l => l.seq));
+        const uniqueNew = newLogs.filter(l => !existingIds.has(l.seq));
+        if (uniqueNew.length === 0) return prev;
+
+        // Streamed tokens ("delta") extend the previous delta entry of the same agent
+        const combined = [...prev];
+        for (const log of uniqueNew) {
+          const last = combined[combined.length - 1];
+          if (log.type === 'delta' && last && last.type === 'delta' && last.role === log.role && last.job === log.job) {
+            combined[combined.length - 1] = { ...last, message: last.message + log.message, seq: log.seq };
+          } else {
+            combined.push(log);
           }
+        }
+
+        // Check completion logic
+        const completionLog = uniqueNew.find(log =>
+          (log.role === 'System' && (log.message.includes('Workflow complete!') || log.message.includes('Error during execution'))) ||
+          log.message.includes('All tasks completed (Demo)')
+        );
+        if (completionLog) {
+          setIsProcessing(false);
+        }
 
-          if (hasNew) {
-            setActivityLogs(prev => {
-              // Double check for duplicates
-              const existingIds = new Set(prev.map(l => l.timestamp));
-              const uniqueNew = newLogs.filter(l => !existingIds.has(l.timestamp));
-              if (uniqueNew.length === 0) return prev;
-
-              // Helper to check for completion within the update
-              const combined = [...prev, ...uniqueNew];
-
-              // Check completion logic
-              const completionLog = uniqueNew.find(log =>
-                (log.role === 'System' && (log.message.includes('Workflow complete!') || log.message.includes('Error during execution'))) ||
-                log.message.includes('All tasks completed (Demo)')
-              );
-              if (completionLog) {
-                setIsProcessing(false);
-              }
-
-              // Check code updates
-              const codeLog = uniqueNew.find(log => log.type === 'code');
-              if (codeLog) {
-                setCode(codeLog.message);
-              }
-
-              return combined;
-            });
+        // Check code updates; large code is sent as a preview with a payload reference
+        const codeLog = uniqueNew.find(log => log.type === 'code');
+        if (codeLog) {
+          if (codeLog.payload) {
+            fetchPayload(codeLog.payload.id).then(setCode).catch(() => setCode(codeLog.message));
+          } else {
+            setCode(codeLog.message);
           }
         }
-      } catch (error) {
-        console.error("Failed to fetch activity logs", error);
-      }
-    }, 1000);
 
-    return () => clearInterval(interval);
+        return combined;
+      });
+    };
+
+    const connect = () => {
+      const seq = lastSeqRef.current;
+      const epoch = epochRef.current;
+      const url = seq !== null
+        ? `ws://localhost:8000/api/ws/activity?after_seq=${seq}${epoch ? `&epoch=${epoch}` : ''}`
+        : 'ws://localhost:8000/api/ws/activity';
+      socket = new WebSocket(url);
+
+      socket.onmessage = (event) => {
+        const frame = JSON.parse(event.data);
+        if (frame.epoch) epochRef.current = frame.epoch;
+        if (frame.reset) {
+          // The backend restarted and numbers entries from 1 again; it replays its log next
+          lastSeqRef.current = null;
+          setActivityLogs([]);
+        }
+        if (frame.logs && frame.logs.length > 0) {
+          handleNewLogs(frame.logs);
+        }
+      };
+
+      socket.onclose = () => {
+        // Reconnect and resume from the last sequence id we saw
+        if (!closed) {
+          reconnectTimer = setTimeout(connect, 1000);
+        }
+      };
+
+      socket.onerror = (error) => {
+        console.error("Activity stream error", error);
+      };
+    };
+
+    connect();
+
+    return () => {
+      closed = true;
+      clearTimeout(reconnectTimer);
+      if (socket) socket.close();
+    };
   }, []); // Empty dependency!
 
 
   const handleRunCode = async () => {
     setOutput("Running...");
     try {
-      const response = await axios.post('http://localhost:8000/api/run', {
-        code: code,
-        input: inputVal
+      // Stream NDJSON frames so output shows up while the program is still running
+      const response = await fetch('http://localhost:8000/api/run/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ code: code, input: inputVal })
       });
-      if (response.data.status === 'success') {
-        setOutput(response.data.output);
-      } else {
-        setOutput(`Error:\n${response.data.output}`);
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let text = '';
+      let finished = false;
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        for (const line of lines) {
+          if (!line) continue;
+          const frame = JSON.parse(line);
+          if (frame.type === 'exit') {
+            if (frame.error) text += frame.error;
+            setOutput(frame.status === 'success' ? text : `Error:\n${text}`);
+            finished = true;
+            continue;
+          }
+          text += frame.data;
+        }
+        if (!finished && text) setOutput(text);
       }
     } catch (error) {
       setOutput(`Failed to execute code: ${error.message}`);
@@ -94,9 +167,11 @@ function App() {
 
   const handleFileSelect = async (filename) => {
     try {
-      const response = await axios.get(`http://localhost:8000/api/files/${filename}`);
-      if (response.data.content) {
-        setCode(response.data.content);
+      // Raw bytes; the browser revalidates with the ETag and reuses its cached copy on 304
+      const path = filename.split('/').map(encodeURIComponent).join('/');
+      const response = await axios.get(`http://localhost:8000/api/raw/${path}`, { responseType: 'text', transformResponse: [data => data] });
+      if (response.data) {
+        setCode(response.data);
       }
     } catch (error) {
       console.error("Error reading file:", error);
@@ -206,12 +281,17 @@ function App() {
           {isProcessing && <span style={{ marginLeft: '10px', fontSize: '0.9em', color: '#4ec9b0', display: 'flex', alignItems: 'center' }}><span className="spinner"></span> Thinking...</span>}
         </h4>
         {activityLogs.map((log, index) => (
-          <div key={index} style={{ marginBottom: '2px' }}>
+          <div key={log.seq ?? index} style={{ marginBottom: '2px' }}>
             <span style={{ color: '#569cd6' }}>[{log.timestamp.split('T')[1].split('.')[0]}]</span>{' '}
             <span style={{ color: '#4ec9b0', fontWeight: 'bold' }}>{log.role}</span>:{' '}
-            <span style={{ color: log.type === 'error' ? '#f48771' : log.type === 'thought' ? '#ce9178' : '#d4d4d4' }}>
+            <span style={{ color: log.type === 'error' ? '#f48771' : log.type === 'thought' ? '#ce9178' : log.type === 'delta' ? '#9cdcfe' : '#d4d4d4', whiteSpace: log.type === 'delta' ? 'pre-wrap' : undefined }}>
               {log.message}
             </span>
+            {log.payload && (
+              <button onClick={() => expandLog(log.seq, log.payload.id)} style={{ marginLeft: '6px', background: 'none', border: 'none', color: '#569cd6', cursor: 'pointer', fontFamily: 'monospace', fontSize: '12px', padding: 0 }}>
+                [show full, {(log.payload.bytes / 1024).toFixed(1)} KB]
+              </button>
+            )}
           </div>
         ))}
       </div>
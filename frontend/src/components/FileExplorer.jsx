@@ -1,22 +1,68 @@
 // frontend/src/components/FileExplorer.jsx
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 import './FileExplorer.css';
 
 function FileExplorer({ onFileSelect }) {
     const [files, setFiles] = useState([]);
     const [error, setError] = useState(null);
+    // Index version we are up to date with, so reconnects only receive missed diffs
+    const versionRef = useRef(null);
+    const socketRef = useRef(null);
 
+    // Workspace changes are pushed by the server instead of polled
     useEffect(() => {
-        fetchFiles();
-        const interval = setInterval(fetchFiles, 5000); // Poll every 5 seconds
-        return () => clearInterval(interval);
+        let reconnectTimer = null;
+        let closed = false;
+
+        const applyFrame = (frame) => {
+            if (frame.type === 'snapshot') {
+                setFiles(frame.entries.map(entry => entry.path));
+            } else if (frame.type === 'diff') {
+                setFiles(prev => {
+                    const next = new Set(prev);
+                    frame.removed.forEach(path => next.delete(path));
+                    frame.added.forEach(entry => next.add(entry.path));
+                    return [...next].sort();
+                });
+            }
+            versionRef.current = frame.version;
+        };
+
+        const connect = () => {
+            const version = versionRef.current;
+            const url = version !== null ? `ws://localhost:8000/api/ws/files?version=${version}` : 'ws://localhost:8000/api/ws/files';
+            const socket = new WebSocket(url);
+            socketRef.current = socket;
+
+            socket.onopen = () => setError(null);
+            socket.onmessage = (event) => applyFrame(JSON.parse(event.data));
+            socket.onclose = () => {
+                if (!closed) {
+                    reconnectTimer = setTimeout(connect, 1000);
+                }
+            };
+            socket.onerror = (err) => {
+                console.error("File stream error", err);
+                setError("Failed to load files");
+            };
+        };
+
+        connect();
+
+        return () => {
+            closed = true;
+            clearTimeout(reconnectTimer);
+            if (socketRef.current) socketRef.current.close();
+        };
     }, []);
 
     const fetchFiles = async () => {
         try {
             const response = await axios.get('http://localhost:8000/api/files');
             setFiles(response.data.files);
+            versionRef.current = response.data.version;
+            setError(null);
         } catch (err) {
             console.error("Error fetching files:", err);
             setError("Failed to load files");
@@ -28,8 +74,8 @@ function FileExplorer({ onFileSelect }) {
         if (!window.confirm(`Are you sure you want to delete ${filename}?`)) return;
 
         try {
-            await axios.delete(`http://localhost:8000/api/files/${filename}`);
-            fetchFiles(); // Refresh list immediately
+            // The list updates through the file stream
+            await axios.delete(`http://localhost:8000/api/files/${filename.split('/').map(encodeURIComponent).join('/')}`);
         } catch (err) {
             console.error("Error deleting file:", err);
             alert("Failed to delete file");
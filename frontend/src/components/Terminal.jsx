@@ -1,4 +1,4 @@
-import React, { useEffect, useRef } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { Terminal } from 'xterm';
 import { FitAddon } from 'xterm-addon-fit';
 import 'xterm/css/xterm.css';
@@ -9,6 +9,9 @@ const TerminalComponent = () => {
     const xtermRef = useRef(null);
     const socketRef = useRef(null);
     const fitAddonRef = useRef(null);
+    const [query, setQuery] = useState('');
+    const [matches, setMatches] = useState(null);
+    const [context, setContext] = useState(null);
 
     useEffect(() => {
         // Initialize xterm
@@ -51,32 +54,69 @@ const TerminalComponent = () => {
         xtermRef.current = term;
         fitAddonRef.current = fitAddon;
 
-        // Connect to WebSocket
-        const socket = new WebSocket('ws://localhost:8000/api/ws/terminal');
-        socketRef.current = socket;
+        let socket = null;
+        let reconnectTimer = null;
+        let closed = false;
 
-        socket.onopen = () => {
-            term.write('\r\n\x1b[32mConnected to Multi-Agent IDE Terminal\x1b[0m\r\n');
-            // Sending an enter key to provoke a prompt
-            socket.send('\r');
+        // Control messages go in binary frames so they never mix with keystrokes
+        const sendResize = () => {
+            if (socket && socket.readyState === WebSocket.OPEN) {
+                const control = { type: 'resize', cols: term.cols, rows: term.rows };
+                socket.send(new TextEncoder().encode(JSON.stringify(control)));
+            }
         };
 
-        socket.onmessage = (event) => {
-            term.write(event.data);
-        };
+        // The shell outlives the socket: reconnects (and reloads of this tab) reattach to it
+        const connect = () => {
+            const sessionId = sessionStorage.getItem('terminalSession');
+            const url = sessionId
+                ? `ws://localhost:8000/api/ws/terminal?session=${sessionId}`
+                : 'ws://localhost:8000/api/ws/terminal';
+            socket = new WebSocket(url);
+            socket.binaryType = 'arraybuffer';
+            socketRef.current = socket;
 
-        socket.onclose = () => {
-            term.write('\r\n\x1b[31mConnection closed\x1b[0m\r\n');
-        };
+            socket.onopen = () => {
+                // The shell runs on a pty sized from these dimensions
+                sendResize();
+            };
+
+            socket.onmessage = (event) => {
+                if (typeof event.data !== 'string') {
+                    const control = JSON.parse(new TextDecoder().decode(event.data));
+                    if (control.type === 'session') {
+                        sessionStorage.setItem('terminalSession', control.id);
+                        // The server replays the session's scrollback next
+                        term.reset();
+                        if (!control.resumed) {
+                            term.write('\x1b[32mConnected to Multi-Agent IDE Terminal\x1b[0m\r\n');
+                        }
+                    }
+                    return;
+                }
+                term.write(event.data);
+            };
+
+            socket.onclose = (event) => {
+                if (closed) return;
+                if (event.code === 1008) {
+                    term.write(`\r\n\x1b[31m${event.reason}\x1b[0m\r\n`);
+                    return;
+                }
+                term.write('\r\n\x1b[31mConnection closed, reconnecting...\x1b[0m\r\n');
+                reconnectTimer = setTimeout(connect, 1000);
+            };
 
-        socket.onerror = (error) => {
-            console.error('WebSocket error:', error);
-            term.write('\r\n\x1b[31mConnection error\x1b[0m\r\n');
+            socket.onerror = (error) => {
+                console.error('WebSocket error:', error);
+            };
         };
 
+        connect();
+
         // Send input to WebSocket
         term.onData((data) => {
-            if (socket.readyState === WebSocket.OPEN) {
+            if (socket && socket.readyState === WebSocket.OPEN) {
                 socket.send(data);
             }
         });
@@ -84,18 +124,68 @@ const TerminalComponent = () => {
         // Handle resize
         const handleResize = () => {
             fitAddon.fit();
+            sendResize();
         };
         window.addEventListener('resize', handleResize);
 
         return () => {
+            closed = true;
+            clearTimeout(reconnectTimer);
             window.removeEventListener('resize', handleResize);
-            socket.close();
+            if (socket) socket.close();
             term.dispose();
         };
     }, []);
 
+    // Search runs on the server over the session's whole output log, not just xterm's buffer
+    const search = async (event) => {
+        event.preventDefault();
+        const sessionId = sessionStorage.getItem('terminalSession');
+        if (!sessionId || !query) {
+            setMatches(null);
+            return;
+        }
+        const params = new URLSearchParams({ q: query, ignore_case: 'true' });
+        const response = await fetch(`http://localhost:8000/api/terminal/${sessionId}/search?${params}`);
+        const result = await response.json();
+        setMatches(response.ok ? result.matches : []);
+        setContext(null);
+    };
+
+    // Older output is fetched a few lines at a time around the selected match
+    const showContext = async (line) => {
+        const sessionId = sessionStorage.getItem('terminalSession');
+        const params = new URLSearchParams({ start: Math.max(0, line - 10), end: line + 11 });
+        const response = await fetch(`http://localhost:8000/api/terminal/${sessionId}/lines?${params}`);
+        if (response.ok) {
+            const page = await response.json();
+            // Escape sequences are for xterm; strip them for the plain-text view
+            setContext(page.text.replace(/\x1b\[[0-?]*[ -\/]*[@-~]/g, '').replace(/\r/g, ''));
+        }
+    };
+
     return (
-        <div className="terminal-container" ref={terminalRef} />
+        <div className="terminal-wrapper">
+            <form className="terminal-search" onSubmit={search}>
+                <input
+                    value={query}
+                    onChange={(e) => setQuery(e.target.value)}
+                    placeholder="Search terminal output"
+                />
+                {matches && <span>{matches.length} matches</span>}
+            </form>
+            {matches && matches.length > 0 && (
+                <ul className="terminal-search-results">
+                    {matches.map((match) => (
+                        <li key={match.line} onClick={() => showContext(match.line)}>
+                            <span className="line-number">{match.line + 1}</span> {match.text}
+                        </li>
+                    ))}
+                </ul>
+            )}
+            {context !== null && <pre className="terminal-search-context">{context}</pre>}
+            <div className="terminal-container" ref={terminalRef} />
+        </div>
     );
 };
 